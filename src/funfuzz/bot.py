@@ -8,27 +8,40 @@
 
 """
 
+import gc
 import io
 import multiprocessing
 from optparse import OptionParser  # pylint: disable=deprecated-module
+import os
 from pathlib import Path
 import platform
 import shutil
+import statistics
 import subprocess
 import sys
 import tempfile
 import time
 
+from .js import async_loop
 from .js import build_options
 from .js import compile_shell
+from .js import inspect_shell
 from .js import loop
+from .js import regression_catalog
+from .js import shell_flags
 from .util import create_collector
-from .util import fork_join
 from .util import hg_helpers
+from .util import shell_metadata
 from .util import sm_compile_helpers
+from .util import stats_aggregator
+from .util import supervisor
+from .util import worker_sizing
+from .util import worker_tuner
 from .util.lock_dir import LockDir
 
 JS_SHELL_DEFAULT_TIMEOUT = 24  # see comments in loop for tradeoffs
+STATS_SNAPSHOT_FILENAME = "fuzz-stats.json"
+PRELOAD_MEMORY_METADATA = "preload-memory"
 
 
 class BuildInfo:  # pylint: disable=missing-param-doc,missing-type-doc,too-few-public-methods
@@ -75,6 +88,35 @@ def parseOpts():  # pylint: disable=invalid-name,missing-docstring,missing-retur
                       help="Sets the timeout for loop. "
                            "Defaults to taking into account the speed of the computer and debugger (if any).")
 
+    parser.add_option("--adaptive-timeout", dest="adaptive_timeout", action="store_true", default=False,
+                      help="Let loop tune the timeout per build and flag set, starting from the --timeout value.")
+
+    parser.add_option("--flag-scheduler", dest="flag_scheduler", action="store_true", default=False,
+                      help="Let loop bias the random shell flags towards those that found bugs quickly before.")
+
+    parser.add_option("--tune-workers", dest="tune_workers", action="store_true", default=False,
+                      help="Vary the number of workers to find the one that runs the most executions per second.")
+
+    parser.add_option("--engine", dest="engine", type="choice", choices=["process", "async"], default="process",
+                      help='Run each js shell from its own loop process ("process"), or many js shells at once from '
+                           'a few event loops ("async"), which uses less memory and fewer context switches on hosts '
+                           'with many cores. Defaults to "%default".')
+
+    parser.add_option("--event-loops", dest="event_loops", type="int", default=1,
+                      help="Number of event loops running js shells with --engine=async. Defaults to %default.")
+
+    parser.add_option("--no-preload", dest="preload", action="store_false", default=True,
+                      help="Let each worker load the signature cache, shell capabilities and jsfunfuzz on its own, "
+                           "instead of sharing those loaded once by bot. Useful to compare their memory usage, which "
+                           "bot logs with and without preloading after each round.")
+
+    parser.add_option("--stats-port", dest="stats_port", type="int",
+                      help="Serve live statistics of all workers in Prometheus text format on this local port, "
+                           "at /metrics. 0 picks a free port.")
+
+    parser.add_option("--ring-buffer-size", dest="ring_buffer_size", type="int", default=0,
+                      help="Let jsfunfuzz only print this many of the last lines it generated, when it stops.")
+
     options, args = parser.parse_args()
     if args:
         print("Warning: bot does not use positional arguments")
@@ -90,13 +132,15 @@ def parseOpts():  # pylint: disable=invalid-name,missing-docstring,missing-retur
 
     if options.build_options is None:
         options.build_options = ""
+    if options.engine == "async" and options.tune_workers:
+        parser.error("--tune-workers cannot be used with --engine=async")
     if options.useTreeherderBuilds and options.build_options != "":
         raise Exception("Do not use treeherder builds if one specifies build parameters")
 
     return options
 
 
-def main():  # pylint: disable=missing-docstring
+def main():  # pylint: disable=missing-docstring,too-complex
     print_machine_info()
 
     options = parseOpts()
@@ -111,19 +155,99 @@ def main():  # pylint: disable=missing-docstring
     options.tempDir = tempfile.mkdtemp("fuzzbot")
     print(options.tempDir)
 
-    build_info = ensureBuild(options)
-    assert build_info.buildDir.is_dir()
+    aggregator = None
+    if options.stats_port is not None:
+        # In a process of its own, as the workers forked later must not inherit its threads and sockets
+        aggregator = stats_aggregator.AggregatorProcess(options.stats_port)
+        options.stats_port = aggregator.port
 
-    number_of_processes = multiprocessing.cpu_count()
-    if "-asan" in str(build_info.buildDir):
-        # This should really be based on the amount of RAM available, but I don't know how to compute that in Python.
-        # I could guess 1 GB RAM per core, but that wanders into sketchyville.
-        number_of_processes = max(number_of_processes // 2, 1)
+    build_info = ensureBuild(options, aggregator)
+    assert build_info.buildDir.is_dir()
+    if aggregator:
+        aggregator.set_snapshot_file(Path(build_info.buildDir) / STATS_SNAPSHOT_FILENAME)
+    if options.engine == "async" and "--compare-jit" in build_info.mtrArgs:
+        # async_loop does not run compare_jit, which would silently stop looking for differences between JIT tiers
+        print("Falling back to --engine=process, as --engine=async does not run compare_jit")
+        options.engine = "process"
+    if options.preload:
+        preload(build_info, collector)
+
+    # Size the number of workers from the memory available and the peak RSS of the shells, as ASan and valgrind builds
+    # need much more memory than others
+    sizer = worker_sizing.WorkerSizer(Path(build_info.mtrArgs[-1]),
+                                      "-asan" in str(build_info.buildDir) or "--valgrind" in build_info.mtrArgs)
+    target_count = sizer.target
+    if options.tune_workers:
+        # Hill-climb on the number of workers, without going over the memory-based count
+        tuner = worker_tuner.WorkerTuner(
+            sm_compile_helpers.ensure_cache_dir(None) / worker_tuner.WORKER_TUNING_FILENAME, build_info.buildType,
+            Path(build_info.mtrArgs[-1]).stem, sizer.target)
+        target_count = tuner.target
+    if options.engine == "async":
+        # As many js shells run at once as there would be workers, spread over a fixed number of event loops
+        options.async_concurrency = max(sizer.target(0) // options.event_loops, 1)
+    # Workers restarted or added later in the round stop at the same time as the first ones
+    options.deadline = time.time() + options.targetTime if options.targetTime else None
+    with supervisor.Supervisor(options.tempDir, loopFuzzingAndReduction, (options, build_info, collector),
+                               deadline=options.deadline) as pool:
+        if options.engine == "async":
+            pool.run(lambda _active: options.event_loops)
+        else:
+            pool.run(target_count)
+    report_worker_memory(Path(build_info.mtrArgs[-1]), options.preload, pool.memory_samples)
+
+    if aggregator:
+        aggregator.close()
+    shutil.rmtree(options.tempDir)
 
-    fork_join.forkJoin(options.tempDir, number_of_processes, loopFuzzingAndReduction, options, build_info,
-                       collector)
 
-    shutil.rmtree(options.tempDir)
+def preload(build_info, collector):
+    """Load what the workers need once, before they are forked, so that they share it copy-on-write.
+
+    Args:
+        build_info (BuildInfo): Information about the build being fuzzed
+        collector (object): Collector object for FuzzManager submission
+    """
+    uss_before = worker_sizing.unique_memory(os.getpid())
+    start_time = time.time()
+    loop_options = loop.parseOpts(build_info.mtrArgs)
+    collector.load_signatures()
+    inspect_shell.get_build_configuration(loop_options.jsEngine)
+    for flag in shell_flags.CANDIDATE_FLAGS:
+        shell_flags.shell_supports_flag(loop_options.jsEngine, flag)
+    loop.linked_fuzzer(loop_options.repo)
+
+    if hasattr(gc, "freeze"):  # Python 3.7+
+        # Reference counting still writes to the shared pages, but collections by the workers no longer do
+        gc.collect()
+        gc.freeze()
+    uss_after = worker_sizing.unique_memory(os.getpid())
+    message = f"Preloaded the signature cache, shell capabilities and jsfunfuzz in {time.time() - start_time:.1f}s"
+    if uss_before is not None and uss_after is not None:
+        message += f", bot went from {uss_before / 2 ** 20:.1f} MB to {uss_after / 2 ** 20:.1f} MB of unique memory"
+    print(message)
+
+
+def report_worker_memory(js_shell, preloaded, memory_samples):
+    """Remember the unique memory of the workers next to the shell, then log it with and without preloading.
+
+    Args:
+        js_shell (Path): Path to the js shell that was fuzzed
+        preloaded (bool): Whether bot preloaded what the workers need before forking them
+        memory_samples (dict): Unique memory of each worker in bytes, keyed by point in its life, see supervisor
+    """
+    results = shell_metadata.load_metadata(js_shell, PRELOAD_MEMORY_METADATA) or {}
+    measured = {name: round(statistics.median(uss) / 2 ** 20, 1) for name, uss in memory_samples.items() if uss}
+    if measured:
+        results["preload" if preloaded else "no-preload"] = measured
+        shell_metadata.save_metadata(js_shell, PRELOAD_MEMORY_METADATA, results)
+    labels = {"preload": f"{'with gc.freeze ' if hasattr(gc, 'freeze') else ''}when preloaded",
+              "no-preload": "with --no-preload"}
+    for name, _ in supervisor.MEMORY_SAMPLES:
+        medians = [f"{results[mode][name]} MB {label}" for mode, label in labels.items()
+                   if name in results.get(mode, {})]
+        if medians:
+            print(f"Median unique memory of the workers {name}: {', '.join(medians)}")
 
 
 def print_machine_info():
@@ -167,7 +291,8 @@ def print_machine_info():
         print("Not checking corefile size as resource module is unavailable")
 
 
-def ensureBuild(options):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc,missing-return-type-doc
+def ensureBuild(options, aggregator=None):
+    # pylint: disable=invalid-name,missing-docstring,missing-return-doc,missing-return-type-doc
     if options.existingBuildDir:
         # Pre-downloaded treeherder builds
         bDir = options.existingBuildDir  # pylint: disable=invalid-name
@@ -183,7 +308,16 @@ def ensureBuild(options):  # pylint: disable=invalid-name,missing-docstring,miss
             bRev = hg_helpers.get_repo_hash_and_id(options.build_options.repo_dir)[0]  # pylint: disable=invalid-name
             cshell = compile_shell.CompiledShell(options.build_options, bRev)
             updateLatestTxt = (options.build_options.repo_dir == "mozilla-central")  # pylint: disable=invalid-name
+            cache_hit = cshell.get_shell_cache_js_bin_path().is_file()
+            obtain_start_time = time.time()
             compile_shell.obtainShell(cshell, updateLatestTxt=updateLatestTxt)
+            if aggregator:
+                aggregator.record_build(time.time() - obtain_start_time, cache_hit)
+            # Probe flag support once here, so forked workers only read the stored matrix
+            shell_flags.flag_support_matrix(cshell.get_shell_cache_js_bin_path())
+            # Likewise, bring the regression test catalog up to date before the workers read it
+            if options.build_options.repo_dir.is_dir():
+                regression_catalog.RegressionCatalog.for_repo(options.build_options.repo_dir)
 
             bDir = cshell.get_shell_cache_dir()  # pylint: disable=invalid-name
             # Strip out first 3 chars or else the dir name in fuzzing jobs becomes:
@@ -213,7 +347,15 @@ def ensureBuild(options):  # pylint: disable=invalid-name,missing-docstring,miss
 
 def loopFuzzingAndReduction(options, buildInfo, collector, i):  # pylint: disable=invalid-name,missing-docstring
     tempDir = Path(tempfile.mkdtemp(f"loop{i}"))  # pylint: disable=invalid-name
-    loop.many_timed_runs(options.targetTime, tempDir, buildInfo.mtrArgs, collector, False)
+    drain_file = Path(supervisor.drain_name(options.tempDir, i))
+    heartbeat_file = Path(supervisor.heartbeat_name(options.tempDir, i))
+    if options.engine == "async":
+        async_loop.many_timed_runs(options.targetTime, tempDir, buildInfo.mtrArgs, collector,
+                                   options.async_concurrency, drain_file=drain_file, heartbeat_file=heartbeat_file,
+                                   deadline=options.deadline)
+    else:
+        loop.many_timed_runs(options.targetTime, tempDir, buildInfo.mtrArgs, collector, False,
+                             drain_file=drain_file, heartbeat_file=heartbeat_file, deadline=options.deadline)
 
 
 def mtrArgsCreation(options, cshell):  # pylint: disable=invalid-name,missing-param-doc,missing-return-doc
@@ -229,6 +371,14 @@ def mtrArgsCreation(options, cshell):  # pylint: disable=invalid-name,missing-pa
         #   They are not built with --enable-more-deterministic - bug 751700
         manyTimedRunArgs.append("--compare-jit")
     manyTimedRunArgs.append("--random-flags")
+    if options.flag_scheduler:
+        manyTimedRunArgs.append("--flag-scheduler")
+    if options.stats_port is not None:
+        manyTimedRunArgs.append(f"--stats-port={options.stats_port}")
+    if options.ring_buffer_size:
+        manyTimedRunArgs.append(f"--ring-buffer-size={options.ring_buffer_size}")
+    if options.adaptive_timeout:
+        manyTimedRunArgs.append("--adaptive-timeout")
 
     # Ordering of elements in manyTimedRunArgs is important.
     manyTimedRunArgs.append(str(options.timeout))
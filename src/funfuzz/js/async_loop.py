@@ -0,0 +1,456 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Runs jsfunfuzz in many js shells at once from a single asyncio event loop, as an alternative to loop.
+
+With loop, each fuzzing slot costs a Python process that mostly waits for its js shell. Here, one process starts the
+js shells of all its slots with asyncio and waits for them at once, and hands their output to a small pool of processes
+that classify it and search FuzzManager for it. Interesting runs are then reduced and submitted by a separate process,
+exactly as loop does, so that Lithium does not hold up the classification of the other runs. compare_jit and binaryen
+runs are not done here, so loop remains the engine of choice for builds that use them.
+
+Output is handed to the pool in memory, unless it grows beyond the same size limit as with shell_runner, in which case
+it spills over to a file in the iteration directory and only the path of the file is handed over.
+"""
+
+import asyncio
+import concurrent.futures
+import io
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from . import js_interesting
+from . import loop
+from . import ring_buffer
+from . import seed_replay
+from . import shell_flags
+from ..util import create_collector
+from ..util import file_system_helpers
+from ..util import scratch_space
+from ..util import shell_runner
+from ..util import supervisor
+from ..util import worker_stats
+
+CLASSIFY_JOBS = 2  # Number of processes classifying the runs of an event loop
+REDUCE_JOBS = 1  # Number of processes reducing and submitting the interesting runs of an event loop
+MAX_PENDING_PER_SLOT = 2  # Runs waiting to be classified, per slot, before the slots wait for the pool to catch up
+
+# Set up once per process of the pool, from the arguments of loop.py and the path to the jsfunfuzz file. With the fork
+# start method, the processes of the pool inherit the state set up by the event loop process.
+_POOL_STATE = {}
+
+
+def pool_state(args, fuzzjs):
+    """Retrieve the options of loop.py, the iteration context and the collector of a process of the pool.
+
+    Args:
+        args (tuple): Arguments of loop.py
+        fuzzjs (Path): Path to the jsfunfuzz file
+
+    Returns:
+        tuple: Options of loop.py, loop.IterationContext and collector
+    """
+    key = (tuple(args), str(fuzzjs))
+    if key not in _POOL_STATE:
+        options = loop.parseOpts(list(args))
+        collector = create_collector.make_collector()
+        _POOL_STATE[key] = (options, loop.IterationContext(options, fuzzjs, collector), collector)
+    return _POOL_STATE[key]
+
+
+def captured_output(data):
+    """Capture the output of a stream read by run_shell, as shell_runner does.
+
+    Args:
+        data (object): Output in bytes, or Path to the file it spilled over to
+
+    Returns:
+        CapturedOutput: The output
+    """
+    captured = shell_runner.CapturedOutput()
+    if isinstance(data, bytes):
+        captured.write(data)
+        return captured
+    with io.open(str(data), "rb") as f:
+        for chunk in iter(lambda: f.read(shell_runner.READ_CHUNK_SIZE), b""):
+            captured.write(chunk)
+    return captured
+
+
+def job_runinfo(job):
+    """Turn a run made by run_shell back into the results of shell_runner.
+
+    Args:
+        job (dict): The run, see run_shell
+
+    Returns:
+        RunResult: Results of the run, with its output captured in memory
+    """
+    out = captured_output(job["out"])
+    err = captured_output(job["err"])
+    return shell_runner.RunResult(job["sta"], job["return_code"], job["msg"], job["elapsedtime"], job["pid"],
+                                  out, err, job["spawn_time"])
+
+
+def classify_run(args, fuzzjs, job):
+    """Classify a run of the js shell and search FuzzManager for it, in a process of the pool.
+
+    The -out and -err logs of the run are written to its iteration directory if it is interesting.
+
+    Args:
+        args (tuple): Arguments of loop.py
+        fuzzjs (Path): Path to the jsfunfuzz file
+        job (dict): The run, as returned by run_shell, with the flags, timeouts and log prefix of its iteration
+
+    Returns:
+        dict: Level reached by the run, whether it ran out of memory or hit the soft timeout of the ring buffer, the
+              number of iterations of jsfunfuzz, and the seconds spent in each stage
+    """
+    options, iteration_context, _collector = pool_state(args, fuzzjs)
+    js_interesting_opts = iteration_context.js_interesting_opts_for(job["engine_flags"], job["timeout"],
+                                                                    job["max_run_time"])
+    # pylint: disable=no-member
+    res = js_interesting.ShellResult(js_interesting_opts, js_interesting_opts.jsengineWithArgs, job["log_prefix"],
+                                     False, in_memory=True, runinfo=job_runinfo(job))
+    return {
+        "lev": res.lev,
+        "oomed": js_interesting.oomed(res.err),
+        "soft_timed_out": bool(options.ring_buffer_size) and ring_buffer.soft_timed_out(res.out),
+        "iterations": seed_replay.count_iterations(res.out),
+        "timings": dict(res.timings),
+    }
+
+
+def reduce_run(args, fuzzjs, target_time, job):
+    """Reduce and submit an interesting run in the reducing process, as loop does.
+
+    Args:
+        args (tuple): Arguments of loop.py
+        fuzzjs (Path): Path to the jsfunfuzz file
+        target_time (int): Target time the harness runs before restarting
+        job (dict): The run, see classify_run
+
+    Returns:
+        dict: Seconds spent in each stage after the classification, e.g. Lithium
+    """
+    options, iteration_context, collector = pool_state(args, fuzzjs)
+    js_interesting_opts = iteration_context.js_interesting_opts_for(job["engine_flags"], job["timeout"],
+                                                                    job["max_run_time"])
+    stats = worker_stats.WorkerStats(None)  # Only collects the time taken by the stages
+    loop.run_to_report(options, js_interesting_opts, {}, job["log_prefix"], fuzzjs, False, collector, target_time,
+                       stats, runinfo=job_runinfo(job))
+    return {stage: latency.total for stage, latency in stats.stages.items() if latency.count}
+
+
+async def read_stream(stream, spill_dir, max_in_memory_size):
+    """Read a pipe until it is closed, spilling over to a file once the output grows beyond a size limit.
+
+    Args:
+        stream (asyncio.StreamReader): Pipe to be read
+        spill_dir (Path): Directory of the file the output spills over to, the system temporary directory if None
+        max_in_memory_size (int): Size in bytes after which the output is spilled to a file
+
+    Returns:
+        object: Output in bytes, or Path to the file it spilled over to
+    """
+    data = bytearray()
+    while len(data) <= max_in_memory_size:
+        chunk = await stream.read(shell_runner.READ_CHUNK_SIZE)
+        if not chunk:
+            return bytes(data)
+        data.extend(chunk)
+    fd, spill_path = tempfile.mkstemp(suffix=".spill", dir=None if spill_dir is None else str(spill_dir))
+    with io.open(fd, "wb") as spill:
+        spill.write(data)
+        while True:
+            chunk = await stream.read(shell_runner.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            spill.write(chunk)
+    return Path(spill_path)
+
+
+async def run_shell(cmd_with_args, timeout, rlimits=None, cpu_timeout=None, spill_dir=None,
+                    max_in_memory_size=shell_runner.MAX_IN_MEMORY_SIZE):
+    """Run a command with a timeout from the event loop, capturing its output in memory up to a size limit.
+
+    Args:
+        cmd_with_args (list): Command and its arguments
+        timeout (int): Timeout in seconds, after which the process is killed
+        rlimits (dict): Resource limits of the command, see shell_runner.spawn
+        cpu_timeout (int): CPU time in seconds after which the kernel kills the process, on POSIX
+        spill_dir (Path): Directory of the files that large output spills over to, see read_stream
+        max_in_memory_size (int): Size in bytes after which each stream is spilled to a file
+
+    Returns:
+        dict: Status, return code, status description, time taken, PID, time taken to start, and stdout and stderr,
+              each in bytes or as the Path to the file it spilled over to
+    """
+    # pylint: disable=too-many-arguments
+    cmd_with_args, preexec_fn = shell_runner.limit_command([str(x) for x in cmd_with_args],
+                                                           shell_runner.cpu_time_rlimits(rlimits, cpu_timeout))
+
+    start_time = time.time()
+    child = await asyncio.create_subprocess_exec(*cmd_with_args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                                 stderr=subprocess.PIPE, preexec_fn=preexec_fn)
+    spawn_time = time.time() - start_time
+    readers = [asyncio.ensure_future(read_stream(x, spill_dir, max_in_memory_size))
+               for x in (child.stdout, child.stderr)]
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(child.wait(), timeout)
+    except asyncio.TimeoutError:
+        child.kill()
+        await child.wait()
+        timed_out = True
+    outputs = await asyncio.gather(*readers)
+
+    sta, msg = shell_runner.run_status(child.returncode, timed_out, cpu_timeout=cpu_timeout)
+    return {
+        "sta": sta,
+        "return_code": child.returncode if sta != shell_runner.TIMED_OUT else None,
+        "msg": msg,
+        "elapsedtime": time.time() - start_time,
+        "pid": child.pid,
+        "spawn_time": spawn_time,
+        "out": outputs[0],
+        "err": outputs[1],
+    }
+
+
+def rusage_since(previous):
+    """Compute the resource usage of the js shells reaped since a previous reading.
+
+    Shells run concurrently, so the CPU time of each of them cannot be told apart: it is credited to whichever run is
+    recorded next, which keeps the total right. The peak RSS is that of the largest shell so far.
+
+    Args:
+        previous (dict): Resource usage of all child processes at the previous reading, see shell_runner.children_rusage
+
+    Returns:
+        tuple: Resource usage since the previous reading, and the reading to pass next time, both None if unavailable
+    """
+    current = shell_runner.children_rusage()
+    if current is None or previous is None:
+        return None, current
+    delta = {key: value - previous[key] for key, value in current.items()}
+    delta["max_rss"] = current["max_rss"]
+    return delta, current
+
+
+class AsyncFuzzer:  # pylint: disable=too-many-instance-attributes
+    """Runs the slots of an event loop, each running jsfunfuzz in a js shell over and over.
+
+    Args:
+        options (object): Options for loop.py
+        args (list): Arguments of loop.py
+        fuzzjs (Path): Path to the jsfunfuzz file
+        collector (object): Collector object for FuzzManager submission
+        wtmp_dir (Path): Path to the wtmp directory
+        executor (concurrent.futures.Executor): Pool of processes classifying the runs
+        reducer (concurrent.futures.Executor): Process reducing and submitting the interesting runs
+        target_time (int): Target time the harness runs before restarting
+        drain_file (Path): File whose existence asks the slots to stop after their current run, if specified
+        heartbeat_file (Path): File touched after every run, to show the event loop is not hung, if specified
+        deadline (float): Time at which the slots stop, instead of target_time after they start, if specified
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, options, args, fuzzjs, collector, wtmp_dir, executor, reducer, target_time, drain_file=None,
+                 heartbeat_file=None, deadline=None):
+        self.options = options
+        self.args = tuple(args)
+        self.fuzzjs = fuzzjs
+        self.wtmp_dir = wtmp_dir
+        self.executor = executor
+        self.reducer = reducer
+        self.target_time = target_time
+        self.deadline = deadline
+        if deadline is None and target_time:
+            self.deadline = time.time() + target_time
+        self.drain_file = drain_file
+        self.heartbeat_file = heartbeat_file
+        self.iteration_context = loop.IterationContext(options, fuzzjs, collector)
+        self.scratch = scratch_space.ScratchSpace(wtmp_dir)
+        self.tuner, self.stats, self.scheduler = loop.make_trackers(options, wtmp_dir)
+        self.rlimits = None
+        if js_interesting.uses_rlimits(self.iteration_context.js_interesting_opts):
+            self.rlimits = js_interesting.shell_rlimits()
+        self.rusage_reading = shell_runner.children_rusage()
+        self.iteration = 0
+        self.classifications = set()  # Runs being classified or reduced
+        self.failure = None
+        self.pending = None
+
+    def should_stop(self):
+        """Check if the slots should stop starting new runs.
+
+        Returns:
+            bool: True once the deadline is passed or the drain file exists, False otherwise
+        """
+        if self.failure is not None or (self.drain_file is not None and self.drain_file.exists()):
+            return True
+        return self.deadline is not None and time.time() > self.deadline
+
+    async def slot(self):
+        """Run jsfunfuzz over and over, handing each run to the pool to be classified."""
+        while not self.should_stop():
+            engine_flags = []
+            if self.options.randomFlags:
+                engine_flags = shell_flags.random_flag_set(self.options.jsEngine, self.scheduler)
+            timeout, max_run_time = self.tuner.values_for(engine_flags) if self.tuner else (None, None)
+            js_interesting_opts = self.iteration_context.js_interesting_opts_for(engine_flags, timeout, max_run_time)
+
+            self.iteration += 1
+            iteration = self.iteration  # Other slots move self.iteration on while this one waits for its shell
+            iteration_dir = self.scratch.iteration_dir(iteration)
+            # pylint: disable=no-member
+            cmd_with_args = js_interesting.shell_command(js_interesting_opts, js_interesting_opts.jsengineWithArgs)
+            job = await run_shell(cmd_with_args, js_interesting_opts.timeout, self.rlimits,
+                                  js_interesting_opts.cpu_timeout, spill_dir=iteration_dir)
+            job.update({
+                "engine_flags": list(engine_flags),
+                "timeout": timeout,
+                "max_run_time": max_run_time,
+                "log_prefix": iteration_dir / f"w{iteration}",
+            })
+            await self.pending.acquire()
+            classification = asyncio.ensure_future(self.classify(engine_flags, iteration_dir, job))
+            self.classifications.add(classification)
+            classification.add_done_callback(self.classified)
+            if self.heartbeat_file is not None:
+                self.heartbeat_file.touch()
+
+    def classified(self, classification):
+        """Forget a run once it was classified, and log the failure of its classification as soon as it happens.
+
+        The first failure stops the slots, and is raised again once the other runs were classified, see run.
+
+        Args:
+            classification (asyncio.Future): Task classifying the run
+        """
+        self.classifications.discard(classification)
+        if classification.cancelled() or classification.exception() is None:
+            return
+        error = classification.exception()
+        print("Classifying a run failed:")
+        traceback.print_exception(type(error), error, error.__traceback__)
+        if self.failure is None:
+            self.failure = error
+
+    async def classify(self, engine_flags, iteration_dir, job):
+        """Have a run classified by the pool, then record its outcome, and have it reduced if it is interesting.
+
+        Args:
+            engine_flags (list): Flags the js shell ran with
+            iteration_dir (Path): Scratch directory of the iteration
+            job (dict): The run, see classify_run
+        """
+        event_loop = asyncio.get_event_loop()
+        try:
+            result = await event_loop.run_in_executor(self.executor, classify_run, self.args, self.fuzzjs, job)
+        finally:
+            self.pending.release()
+        is_interesting = result["lev"] != js_interesting.JS_FINE
+        if is_interesting:
+            # The slot is already free, so the other runs keep being classified while this one is reduced
+            result["timings"].update(await event_loop.run_in_executor(self.reducer, reduce_run, self.args,
+                                                                      self.fuzzjs, self.target_time, job))
+
+        for stage, seconds in result["timings"].items():
+            self.stats.add_time(stage, seconds)
+        timed_out = job["sta"] == shell_runner.TIMED_OUT or result["soft_timed_out"]
+        if self.tuner:
+            self.tuner.record(engine_flags, job["elapsedtime"], timed_out, result["oomed"], result["iterations"])
+        if self.scheduler:
+            self.scheduler.record(engine_flags, result["lev"], job["elapsedtime"], timed_out, result["oomed"],
+                                  result["iterations"])
+        rusage, self.rusage_reading = rusage_since(self.rusage_reading)
+        self.stats.record_run(result["lev"], timed_out, result["oomed"], is_interesting, rusage)
+
+        with self.stats.stage("cleanup"):
+            for spilled in (job["out"], job["err"]):
+                if isinstance(spilled, Path):
+                    os.remove(str(spilled))
+            if is_interesting:
+                file_system_helpers.delete_logs(job["log_prefix"])
+                self.scratch.persist(iteration_dir)
+            self.scratch.clear(iteration_dir)
+
+    async def run(self, concurrency):
+        """Run slots until they stop, then wait for their last runs to be classified.
+
+        Args:
+            concurrency (int): Number of js shells running at once
+        """
+        self.pending = asyncio.Semaphore(concurrency * MAX_PENDING_PER_SLOT)
+        await asyncio.gather(*[self.slot() for _ in range(concurrency)])
+        # The slots no longer touch the heartbeat file, while the last reductions may take longer than its timeout
+        with supervisor.keep_beating(self.heartbeat_file):
+            # Failures were already logged as they happened
+            await asyncio.gather(*self.classifications, return_exceptions=True)
+        if self.failure is not None:
+            raise self.failure
+
+
+def new_event_loop():
+    """Create an event loop able to run subprocesses on this platform and Python version.
+
+    Returns:
+        asyncio.AbstractEventLoop: The event loop, set as the current one
+    """
+    if platform.system() == "Windows" and sys.version_info < (3, 8):
+        event_loop = asyncio.ProactorEventLoop()  # pylint: disable=no-member
+    else:
+        event_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(event_loop)
+    if platform.system() != "Windows" and sys.version_info < (3, 8):
+        # Before Python 3.8, the child watcher has to be attached to the loop to be notified of exiting shells
+        asyncio.get_child_watcher().attach_loop(event_loop)
+    return event_loop
+
+
+def many_timed_runs(target_time, wtmp_dir, args, collector, concurrency, classify_jobs=CLASSIFY_JOBS,
+                    drain_file=None, heartbeat_file=None, deadline=None):
+    """Run jsfunfuzz in a number of js shells at once until target_time, from a single event loop.
+
+    Args:
+        target_time (int): Target time the harness runs before restarting
+        wtmp_dir (Path): Path to the wtmp directory
+        args (list): Arguments of loop.py
+        collector (object): Collector object for FuzzManager submission
+        concurrency (int): Number of js shells running at once
+        classify_jobs (int): Number of processes classifying the runs
+        drain_file (Path): File whose existence asks the harness to stop after the current runs, if specified
+        heartbeat_file (Path): File touched after every run, to show the harness is not hung, if specified
+        deadline (float): Time at which the harness stops, instead of target_time after it starts, if specified
+    """
+    # pylint: disable=too-many-arguments
+    options = loop.parseOpts(args)
+    fuzzjs = loop.prepare_fuzzer(options, wtmp_dir)
+    fuzzer = AsyncFuzzer(options, args, fuzzjs, collector, wtmp_dir, None, None, target_time, drain_file,
+                         heartbeat_file, deadline)
+    # Processes of the pool forked from here reuse the iteration context instead of setting up their own
+    _POOL_STATE[(tuple(args), str(fuzzjs))] = (options, fuzzer.iteration_context, collector)
+
+    print(f"Running {concurrency} js shells at once, classified by {classify_jobs} processes...")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=classify_jobs) as executor, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=REDUCE_JOBS) as reducer:
+        fuzzer.executor = executor
+        fuzzer.reducer = reducer
+        event_loop = new_event_loop()
+        try:
+            event_loop.run_until_complete(fuzzer.run(concurrency))
+        finally:
+            event_loop.close()
+    print("Retired to free up memory!" if drain_file is not None and drain_file.exists() else "Out of time!")
+    loop.wrap_up(wtmp_dir, fuzzer.scratch, fuzzer.stats, fuzzer.scheduler)
@@ -0,0 +1,124 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Measures how much startup time a js shell would save by loading jsfunfuzz as bytecode rather than from source.
+
+Nothing is cached across launches: the js shell only keeps the bytecode of a cache entry in memory, and cannot write
+it to a file for later launches to load. This only reports whether doing so would be worth it, as part of
+loop --measure-startup.
+
+The source and bytecode loads are timed in separate shell processes, so neither benefits from the other. Both
+processes first evaluate the jsfunfuzz definitions from source with saveIncrementalBytecode, untimed. They then time a
+second evaluation in a fresh global, from source in one process and with loadBytecode in the other, so both are
+measured in the same state. Results are kept once per jsfunfuzz hash, next to the shell in its shell-cache directory.
+Shells without cacheEntry are recorded as unsupported.
+"""
+
+import io
+import json
+from pathlib import Path
+import statistics
+import tempfile
+
+from . import link_fuzzer
+from ..util import shell_metadata
+from ..util import shell_runner
+
+BYTECODE_CACHE_METADATA = "bytecode-startup"  # Measurements made before the loads were timed in separate processes
+PROBE_MARKER = "BYTECODE-CACHE"
+PROBE_RUNS = 3
+PROBE_TIMEOUT = 60  # seconds
+PROBE_OPTIONS = {  # Options of the timed evaluation, for each kind of load
+    "source": "{}",
+    "bytecode": "{ loadBytecode: true }",
+}
+PROBE_SCRIPT = """
+if (typeof cacheEntry != "function") {
+  print("%(marker)s unsupported");
+} else {
+  var entry = cacheEntry(read(%(defs_file)s));
+  var timeEvaluate = function (options) {
+    options.global = newGlobal();
+    var start = dateNow();
+    evaluate(entry, options);
+    return dateNow() - start;
+  };
+  try {
+    timeEvaluate({ saveIncrementalBytecode: true });
+    print("%(marker)s " + timeEvaluate(%(options)s));
+  } catch (e) {
+    print("%(marker)s unsupported");
+  }
+}
+"""
+
+
+def parse_probe_output(lines):
+    """Retrieve the time reported by the probe script.
+
+    Args:
+        lines (list): Lines printed by the js shell
+
+    Returns:
+        float: Time taken by the timed evaluation in milliseconds, or None if bytecode caching is unsupported
+    """
+    for line in lines:
+        if line.startswith(f"{PROBE_MARKER} "):
+            try:
+                return float(line.split()[1])
+            except ValueError:
+                return None
+    return None
+
+
+def measure_startup_savings(js_engine, fuzzjs, runs=PROBE_RUNS):
+    """Run the probe script on the definitions of jsfunfuzz in separate js shells for each load, without fuzzing.
+
+    Args:
+        js_engine (Path): Path to the js shell
+        fuzzjs (Path): Path to the linked jsfunfuzz file
+        runs (int): Number of times the probe is run
+
+    Returns:
+        dict: Whether bytecode caching is supported and, if so, the median times taken from source and from bytecode
+    """
+    [before, after] = link_fuzzer.fuzz_splice(fuzzjs)
+    times = {load: [] for load in PROBE_OPTIONS}
+    with tempfile.TemporaryDirectory(suffix="bytecode_cache") as tmp_dir:
+        defs_file = Path(tmp_dir) / "jsfunfuzz-defs.js"
+        with io.open(str(defs_file), "w", encoding="utf-8", errors="replace") as f:
+            f.writelines(before + after)
+        for _ in range(runs):
+            for load, options in PROBE_OPTIONS.items():
+                script = PROBE_SCRIPT % {"marker": PROBE_MARKER, "defs_file": json.dumps(str(defs_file)),
+                                         "options": options}
+                runinfo = shell_runner.timed_run([js_engine, "-e", script], PROBE_TIMEOUT)
+                load_time = parse_probe_output(runinfo.out.lines())
+                runinfo.close()
+                if load_time is None:
+                    return {"supported": False}
+                times[load].append(load_time)
+    return {"supported": True,
+            "source_ms": statistics.median(times["source"]),
+            "bytecode_ms": statistics.median(times["bytecode"])}
+
+
+def startup_savings(js_engine, fuzzjs):
+    """Retrieve the startup times of jsfunfuzz with a js shell, measuring them once per shell and jsfunfuzz.
+
+    Args:
+        js_engine (Path): Path to the js shell
+        fuzzjs (Path): Path to the linked jsfunfuzz file
+
+    Returns:
+        dict: Whether bytecode caching is supported and, if so, the median times taken from source and from bytecode
+    """
+    fuzzer_hash = link_fuzzer.fuzzer_hash(fuzzjs)
+    results = shell_metadata.load_metadata(js_engine, BYTECODE_CACHE_METADATA) or {}
+    if fuzzer_hash not in results:
+        results[fuzzer_hash] = measure_startup_savings(js_engine, fuzzjs)
+        shell_metadata.save_metadata(js_engine, BYTECODE_CACHE_METADATA, results)
+    return results[fuzzer_hash]
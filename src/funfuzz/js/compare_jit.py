@@ -7,15 +7,20 @@
 """Test comparing the output of SpiderMonkey using various flags (usually JIT-related).
 """
 
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+import contextlib
+import difflib
+import functools
 import io
 from optparse import OptionParser  # pylint: disable=deprecated-module
-import os
 from pathlib import Path
 from random import random
 from shlex import quote
-import subprocess
 import sys
 import tempfile
+import threading
 
 from FTB.ProgramConfiguration import ProgramConfiguration
 import FTB.Signatures.CrashInfo as Crash_Info
@@ -25,6 +30,7 @@ from . import shell_flags
 from ..util import create_collector
 from ..util import file_system_helpers
 from ..util import lithium_helpers
+from ..util import supervisor
 
 gOptions = ""  # pylint: disable=invalid-name
 lengthLimit = 1000000  # pylint: disable=invalid-name
@@ -54,7 +60,8 @@ def ignore_some_stderr(err_inp):
 
 
 def compare_jit(jsEngine,  # pylint: disable=invalid-name,missing-param-doc,missing-type-doc,too-many-arguments
-                flags, infilename, logPrefix, repo, build_options_str, targetTime, options, ccoverage):
+                flags, infilename, logPrefix, repo, build_options_str, targetTime, options, ccoverage, jobs=1,
+                heartbeat_file=None):
     """For use in loop.py
 
     Returns:
@@ -66,18 +73,19 @@ def compare_jit(jsEngine,  # pylint: disable=invalid-name,missing-param-doc,miss
     initialdir_name = logPrefix.parent / f"{logPrefix.stem}-initial"
     is_quick_mode = random() < 0.5
     # pylint: disable=invalid-name
-    cl = compareLevel(jsEngine, flags, infilename, initialdir_name, options, False, is_quick_mode)
+    cl = compareLevel(jsEngine, flags, infilename, initialdir_name, options, False, is_quick_mode, jobs=jobs)
     lev = cl[0]
 
     if not (ccoverage or lev == js_interesting.JS_FINE):
-        itest = [__name__, f'--flags={" ".join(flags)}',
+        itest = [__name__, f'--flags={" ".join(flags)}', f"--jobs={jobs}",
                  f"--minlevel={lev}", f"--timeout={options.timeout}", options.knownPath]
-        (lithResult, _lithDetails, autoBisectLog) = lithium_helpers.pinpoint(  # pylint: disable=invalid-name
-            itest, logPrefix, jsEngine, [], infilename, repo, build_options_str, targetTime, lev)
+        with supervisor.keep_beating(heartbeat_file):  # Lithium and autobisectjs outlast the heartbeat timeout
+            (lithResult, _lithDetails, autoBisectLog) = lithium_helpers.pinpoint(  # pylint: disable=invalid-name
+                itest, logPrefix, jsEngine, [], infilename, repo, build_options_str, targetTime, lev)
         if lithResult == lithium_helpers.LITH_FINISHED:
             print(f"Retesting {infilename} after running Lithium:")
             finaldir_name = logPrefix.parent / f"{logPrefix.stem}-final"
-            retest_cl = compareLevel(jsEngine, flags, infilename, finaldir_name, options, True, False)
+            retest_cl = compareLevel(jsEngine, flags, infilename, finaldir_name, options, True, False, jobs=jobs)
             if retest_cl[0] != js_interesting.JS_FINE:
                 cl = retest_cl
                 quality = 0
@@ -96,13 +104,16 @@ def compare_jit(jsEngine,  # pylint: disable=invalid-name,missing-param-doc,miss
     return False
 
 
-def compareLevel(jsEngine, flags, infilename, logPrefix, options, showDetailedDiffs, quickMode):
+def compareLevel(jsEngine, flags, infilename, logPrefix, options, showDetailedDiffs, quickMode, jobs=1):
     # pylint: disable=invalid-name,missing-docstring,missing-return-doc,missing-return-type-doc,too-complex
     # pylint: disable=too-many-branches,too-many-arguments,too-many-locals,too-many-statements
 
     # options dict must be one we can pass to js_interesting.ShellResult
     # we also use it directly for knownPath, timeout, and collector
     # Return: (lev, crashInfo) or (js_interesting.JS_FINE, None)
+    # With jobs > 1, up to that many runs execute concurrently, and those still running are killed once a more
+    # serious bug or a mismatch is found. Runs are also killed at their first line of stdout that differs from the
+    # first run.
 
     assert isinstance(infilename, Path)
 
@@ -123,116 +134,270 @@ def compareLevel(jsEngine, flags, infilename, logPrefix, options, showDetailedDi
         combos.insert(0, flags)
 
     commands = [[jsEngine] + combo + [str(infilename)] for combo in combos]
+    prefixes = [logPrefix.parent / f"{logPrefix.stem}-r{i}" for i in range(len(commands))]
 
     r0 = None
     prefix0 = None
-
-    for i, command in enumerate(commands):
-        prefix = logPrefix.parent / f"{logPrefix.stem}-r{i}"
-        command = commands[i]
-        r = js_interesting.ShellResult(options, command, prefix, True)  # pylint: disable=invalid-name
-
-        oom = js_interesting.oomed(r.err)
-        r.err = ignore_some_stderr(r.err)
-
-        if (r.return_code == 1 or r.return_code == 2) and (anyLineContains(r.out, "[[script] scriptArgs*]") or (
-                anyLineContains(r.err, "[scriptfile] [scriptarg...]"))):
-            print("Got usage error from:")
-            print(f'  {" ".join(quote(str(x)) for x in command)}')
-            assert i
-            file_system_helpers.delete_logs(prefix)
-        elif r.lev > js_interesting.JS_OVERALL_MISMATCH:
-            # would be more efficient to run lithium on one or the other, but meh
-            summary_more_serious = js_interesting.summaryString(r.issues + ["compare_jit found a more serious bug"],
-                                                                r.lev,
-                                                                r.runinfo.elapsedtime)
-            print(f"{infilename} | {summary_more_serious}")
-            summary_log = (logPrefix.parent / f"{logPrefix.stem}-summary").with_suffix(".txt")
-            with io.open(str(summary_log), "w", encoding="utf-8", errors="replace") as f:
-                f.write("\n".join(r.issues + [" ".join(quote(str(x)) for x in command),
-                                              "compare_jit found a more serious bug"]) + "\n")
-            print(f'  {" ".join(quote(str(x)) for x in command)}')
-            return r.lev, r.crashInfo
-        elif r.lev != js_interesting.JS_FINE or r.return_code != 0:
-            summary_other = js_interesting.summaryString(
-                r.issues + ["compare_jit is not comparing output, because the shell exited strangely"],
-                r.lev, r.runinfo.elapsedtime)
-            print(f"{infilename} | {summary_other}")
-            print(f'  {" ".join(quote(str(x)) for x in command)}')
-            file_system_helpers.delete_logs(prefix)
-            if not i:
-                return js_interesting.JS_FINE, None
-        elif oom:
-            # If the shell or python hit a memory limit, we consider the rest of the computation
-            # "tainted" for the purpose of correctness comparison.
-            message = "compare_jit is not comparing output: OOM"
-            summary_oom = js_interesting.summaryString(r.issues + [message], r.lev, r.runinfo.elapsedtime)
-            print(f"{infilename} | {summary_oom}")
-            file_system_helpers.delete_logs(prefix)
-            if not i:
-                return js_interesting.JS_FINE, None
-        elif not i:
-            # Stash output from this run (the first one), so for subsequent runs, we can compare against it.
-            (r0, prefix0) = (r, prefix)  # pylint: disable=invalid-name
-        else:
-            # Compare the output of this run (r.out) to the output of the first run (r0.out), etc.
-
-            def optionDisabledAsmOnOneSide():  # pylint: disable=invalid-name
-                asmMsg = "asm.js type error: Disabled by javascript.options.asmjs"  # pylint: disable=invalid-name
-                # pylint: disable=invalid-name
-                # pylint: disable=cell-var-from-loop
-                optionDisabledAsm = anyLineContains(r0.err, asmMsg) or anyLineContains(r.err, asmMsg)
-                # pylint: disable=invalid-name
-                optionDiffers = (("--no-asmjs" in commands[0]) != ("--no-asmjs" in command))
-                return optionDisabledAsm and optionDiffers
-
-            mismatchErr = (r.err != r0.err and not optionDisabledAsmOnOneSide())  # pylint: disable=invalid-name
-            mismatchOut = (r.out != r0.out)  # pylint: disable=invalid-name
-
-            if mismatchErr or mismatchOut:  # pylint: disable=no-else-return
-                # Generate a short summary for stdout and a long summary for a "*-summary.txt" file.
-                # pylint: disable=invalid-name
-                rerunCommand = " ".join(quote(str(x)) for x in [
-                    "python3 -m funfuzz.js.compare_jit",
-                    f'--flags={" ".join(flags)}',
-                    f"--timeout={options.timeout}",
-                    str(options.knownPath),
-                    str(jsEngine),
-                    str(infilename.name)])
-                (summary, issues) = summarizeMismatch(mismatchErr, mismatchOut, prefix0, prefix)
-                summary = (
-                    f'  {" ".join(quote(str(x)) for x in commands[0])}\n'
-                    f'  {" ".join(quote(str(x)) for x in command)}\n'
-                    f"\n"
-                    f"{summary}"
-                )
+    unmatched = []  # With concurrent runs, those that finish before the first run have to wait to be compared to it
+
+    with contextlib.closing(run_commands(options, commands, prefixes, jobs)) as results:
+        for i, r, diverged in results:  # pylint: disable=invalid-name
+            command = commands[i]
+            prefix = prefixes[i]
+            to_compare = []
+
+            oom = js_interesting.oomed(r.err)
+            r.err = ignore_some_stderr(r.err)
+
+            if (r.return_code == 1 or r.return_code == 2) and (anyLineContains(r.out, "[[script] scriptArgs*]") or (
+                    anyLineContains(r.err, "[scriptfile] [scriptarg...]"))):
+                print("Got usage error from:")
+                print(f'  {" ".join(quote(str(x)) for x in command)}')
+                assert i
+                file_system_helpers.delete_logs(prefix)
+            elif r.lev > js_interesting.JS_OVERALL_MISMATCH:
+                # would be more efficient to run lithium on one or the other, but meh
+                summary_more_serious = js_interesting.summaryString(
+                    r.issues + ["compare_jit found a more serious bug"], r.lev, r.runinfo.elapsedtime)
+                print(f"{infilename} | {summary_more_serious}")
                 summary_log = (logPrefix.parent / f"{logPrefix.stem}-summary").with_suffix(".txt")
                 with io.open(str(summary_log), "w", encoding="utf-8", errors="replace") as f:
-                    f.write(f"{rerunCommand}\n\n{summary}")
-                summary_overall_mismatch = js_interesting.summaryString(
-                    issues, js_interesting.JS_OVERALL_MISMATCH, r.runinfo.elapsedtime)
-                print(f"{infilename} | {summary_overall_mismatch}")
-                if quickMode:
-                    print(rerunCommand)
-                if showDetailedDiffs:
-                    print(summary)
-                    print()
-                # Create a crashInfo object with empty stdout, and stderr showing diffs
-                pc = ProgramConfiguration.fromBinary(str(jsEngine))  # pylint: disable=invalid-name
-                pc.addProgramArguments(flags)
-                crashInfo = Crash_Info.CrashInfo.fromRawCrashData([], summary, pc)  # pylint: disable=invalid-name
-                return js_interesting.JS_OVERALL_MISMATCH, crashInfo
-            else:
-                # print "compare_jit: match"
+                    f.write("\n".join(r.issues + [" ".join(quote(str(x)) for x in command),
+                                                  "compare_jit found a more serious bug"]) + "\n")
+                print(f'  {" ".join(quote(str(x)) for x in command)}')
+                return r.lev, r.crashInfo
+            elif r.lev != js_interesting.JS_FINE or (r.return_code != 0 and not diverged):
+                summary_other = js_interesting.summaryString(
+                    r.issues + ["compare_jit is not comparing output, because the shell exited strangely"],
+                    r.lev, r.runinfo.elapsedtime)
+                print(f"{infilename} | {summary_other}")
+                print(f'  {" ".join(quote(str(x)) for x in command)}')
                 file_system_helpers.delete_logs(prefix)
+                if not i:
+                    return js_interesting.JS_FINE, None
+            elif oom:
+                # If the shell or python hit a memory limit, we consider the rest of the computation
+                # "tainted" for the purpose of correctness comparison.
+                message = "compare_jit is not comparing output: OOM"
+                summary_oom = js_interesting.summaryString(r.issues + [message], r.lev, r.runinfo.elapsedtime)
+                print(f"{infilename} | {summary_oom}")
+                file_system_helpers.delete_logs(prefix)
+                if not i:
+                    return js_interesting.JS_FINE, None
+            elif not i:
+                # Stash output from this run (the first one), so for subsequent runs, we can compare against it.
+                (r0, prefix0) = (r, prefix)  # pylint: disable=invalid-name
+                to_compare = unmatched
+            elif r0 is None:
+                unmatched.append((command, prefix, r, diverged))
+            else:
+                to_compare = [(command, prefix, r, diverged)]
+
+            # Compare the output of these runs (r.out) to the output of the first run (r0.out), etc.
+            for command, prefix, r, diverged in to_compare:  # pylint: disable=invalid-name
+
+                def optionDisabledAsmOnOneSide():  # pylint: disable=invalid-name
+                    asmMsg = "asm.js type error: Disabled by javascript.options.asmjs"  # pylint: disable=invalid-name
+                    # pylint: disable=invalid-name
+                    # pylint: disable=cell-var-from-loop
+                    optionDisabledAsm = anyLineContains(r0.err, asmMsg) or anyLineContains(r.err, asmMsg)
+                    # pylint: disable=invalid-name
+                    optionDiffers = (("--no-asmjs" in commands[0]) != ("--no-asmjs" in command))
+                    return optionDisabledAsm and optionDiffers
+
+                # A run killed at its first divergent line of stdout could only write part of its stderr
+                err0 = r0.err[:len(r.err)] if diverged else r0.err
+                mismatchErr = (r.err != err0 and not optionDisabledAsmOnOneSide())  # pylint: disable=invalid-name
+                mismatchOut = (r.out != r0.out)  # pylint: disable=invalid-name
+
+                if mismatchErr or mismatchOut:  # pylint: disable=no-else-return
+                    # Generate a short summary for stdout and a long summary for a "*-summary.txt" file.
+                    # pylint: disable=invalid-name
+                    rerunCommand = " ".join(quote(str(x)) for x in [
+                        "python3 -m funfuzz.js.compare_jit",
+                        f'--flags={" ".join(flags)}',
+                        f"--timeout={options.timeout}",
+                        str(options.knownPath),
+                        str(jsEngine),
+                        str(infilename.name)])
+                    # Runs keep their output in memory, so keep logs of the mismatching runs along with the summary
+                    save_logs(r0, prefix0)
+                    save_logs(r, prefix)
+                    (summary, issues) = summarizeMismatch(mismatchErr, mismatchOut, r0, prefix0, r, prefix)
+                    summary = (
+                        f'  {" ".join(quote(str(x)) for x in commands[0])}\n'
+                        f'  {" ".join(quote(str(x)) for x in command)}\n'
+                        f"\n"
+                        f"{summary}"
+                    )
+                    summary_log = (logPrefix.parent / f"{logPrefix.stem}-summary").with_suffix(".txt")
+                    with io.open(str(summary_log), "w", encoding="utf-8", errors="replace") as f:
+                        f.write(f"{rerunCommand}\n\n{summary}")
+                    summary_overall_mismatch = js_interesting.summaryString(
+                        issues, js_interesting.JS_OVERALL_MISMATCH, r.runinfo.elapsedtime)
+                    print(f"{infilename} | {summary_overall_mismatch}")
+                    if quickMode:
+                        print(rerunCommand)
+                    if showDetailedDiffs:
+                        print(summary)
+                        print()
+                    # Create a crashInfo object with empty stdout, and stderr showing diffs
+                    pc = ProgramConfiguration.fromBinary(str(jsEngine))  # pylint: disable=invalid-name
+                    pc.addProgramArguments(flags)
+                    crashInfo = Crash_Info.CrashInfo.fromRawCrashData([], summary, pc)  # pylint: disable=invalid-name
+                    return js_interesting.JS_OVERALL_MISMATCH, crashInfo
+                else:
+                    # print "compare_jit: match"
+                    file_system_helpers.delete_logs(prefix)
 
     # All matched :)
     file_system_helpers.delete_logs(prefix0)
     return js_interesting.JS_FINE, None
 
 
+class StreamingComparator:
+    """Compares the stdout of compare_jit runs to that of the first run, line by line, while they execute.
+
+    A run is killed as soon as one of its lines differs from the first run. This only saves the time the run would
+    have spent after diverging: compareLevel still keeps the full output of the runs it has yet to compare.
+
+    Args:
+        cancel_events (list): Events that kill each run when set
+    """
+    def __init__(self, cancel_events):
+        self.cancel_events = cancel_events
+        self.lock = threading.Lock()
+        self.first_hashes = []
+        self.line_counts = [0] * len(cancel_events)
+        self.unchecked_hashes = [collections.deque() for _ in cancel_events]  # Lines the first run has yet to reach
+        self.divergent_lines = [None] * len(cancel_events)
+
+    def line_callback(self, i):
+        """Retrieve the function to be called with each stdout line of a run.
+
+        Args:
+            i (int): Index of the run
+
+        Returns:
+            function: Callback taking a line of stdout
+        """
+        return functools.partial(self.add_line, i)
+
+    def add_line(self, i, line):
+        """Compare a new stdout line of a run.
+
+        Args:
+            i (int): Index of the run
+            line (bytes): Line of stdout
+        """
+        line_hash = hash(line)
+        with self.lock:
+            if not i:
+                self.first_hashes.append(line_hash)
+                for j, unchecked in enumerate(self.unchecked_hashes):
+                    if unchecked and self.divergent_lines[j] is None:
+                        self.check(j, len(self.first_hashes) - 1, unchecked.popleft())
+            elif self.divergent_lines[i] is None:
+                line_number = self.line_counts[i]
+                if line_number < len(self.first_hashes):
+                    self.check(i, line_number, line_hash)
+                else:
+                    self.unchecked_hashes[i].append(line_hash)
+            self.line_counts[i] += 1
+
+    def check(self, i, line_number, line_hash):
+        """Kill a run if one of its lines differs from the line of the first run at the same position.
+
+        Args:
+            i (int): Index of the run
+            line_number (int): Zero-based position of the line
+            line_hash (int): Hash of the line
+        """
+        if line_hash != self.first_hashes[line_number]:
+            self.divergent_lines[i] = line_number
+            self.unchecked_hashes[i].clear()
+            self.cancel_events[i].set()
+
+    def has_diverged(self, i):
+        """Check if a run was killed because its stdout differs from that of the first run.
+
+        Args:
+            i (int): Index of the run
+
+        Returns:
+            bool: True if the run was killed at a divergent line
+        """
+        with self.lock:
+            return self.divergent_lines[i] is not None
+
+
+def run_commands(options, commands, prefixes, jobs):
+    """Run the compare_jit commands, yielding their results as they become available.
+
+    With jobs > 1, up to that many commands run concurrently and results are yielded in the order in which the runs
+    finish. Runs are killed at the first line of stdout that differs from the first run, and closing the generator
+    kills the runs that are still in progress.
+
+    Args:
+        options (object): Options that can be passed to js_interesting.ShellResult
+        commands (list): Commands to be run, the first one being the one the others are compared to
+        prefixes (list): Log prefixes of the commands
+        jobs (int): Maximum number of commands to run concurrently
+
+    Yields:
+        tuple: Index of the command, its js_interesting.ShellResult and whether it was killed at a divergent line
+    """
+    cancel_events = [threading.Event() for _ in commands]
+    comparator = StreamingComparator(cancel_events)
+
+    def run(i):  # pylint: disable=missing-return-doc,missing-return-type-doc
+        return js_interesting.ShellResult(options, commands[i], prefixes[i], True, in_memory=True,
+                                          cancel_event=cancel_events[i],
+                                          stdout_line_callback=comparator.line_callback(i))
+
+    if jobs <= 1:
+        try:
+            for i, _ in enumerate(commands):
+                r = run(i)  # pylint: disable=invalid-name
+                yield i, r, comparator.has_diverged(i)
+        finally:
+            for cancel_event in cancel_events:
+                cancel_event.set()
+        return
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    futures = {}
+    try:
+        # The first command is submitted first, so it gets started first
+        for i, _ in enumerate(commands):
+            futures[executor.submit(run, i)] = i
+        for future in as_completed(futures):
+            i = futures[future]
+            yield i, future.result(), comparator.has_diverged(i)
+    finally:
+        for future in futures:
+            future.cancel()
+        for cancel_event in cancel_events:
+            cancel_event.set()
+        executor.shutdown(wait=True)
+
+
+def save_logs(result, log_prefix):
+    """Write the -out and -err logs of a run whose output was kept in memory.
+
+    Args:
+        result (ShellResult): Result of the run
+        log_prefix (Path): Prefix of the log name
+    """
+    for suffix, lines in (("out", result.out), ("err", result.err)):
+        with io.open(str((log_prefix.parent / f"{log_prefix.stem}-{suffix}").with_suffix(".txt")), "w",
+                     encoding="utf-8", errors="replace") as f:
+            f.writelines(lines)
+
+
 # pylint: disable=invalid-name,missing-docstring,missing-return-doc,missing-return-type-doc
-def summarizeMismatch(mismatchErr, mismatchOut, prefix0, prefix1):
+def summarizeMismatch(mismatchErr, mismatchOut, r0, prefix0, r1, prefix1):
+    # pylint: disable=too-many-arguments
     issues = []
     summary = ""
     if mismatchErr:
@@ -240,28 +405,27 @@ def summarizeMismatch(mismatchErr, mismatchOut, prefix0, prefix1):
         summary += "[Non-crash bug] Mismatch on stderr\n"
         err0_log = (prefix0.parent / f"{prefix0.stem}-err").with_suffix(".txt")
         err1_log = (prefix1.parent / f"{prefix1.stem}-err").with_suffix(".txt")
-        summary += diffFiles(err0_log, err1_log)
+        summary += diffLines(r0.err, r1.err, err0_log, err1_log)
     if mismatchOut:
         issues.append("[Non-crash bug] Mismatch on stdout")
         summary += "[Non-crash bug] Mismatch on stdout\n"
         out0_log = (prefix0.parent / f"{prefix0.stem}-out").with_suffix(".txt")
         out1_log = (prefix1.parent / f"{prefix1.stem}-out").with_suffix(".txt")
-        summary += diffFiles(out0_log, out1_log)
+        summary += diffLines(r0.out, r1.out, out0_log, out1_log)
     return summary, issues
 
 
-def diffFiles(f1, f2):  # pylint: disable=invalid-name,missing-param-doc,missing-type-doc
-    """Return a command to diff two files, along with the diff output (if it's short)."""
-    diffcmd = ["diff", "-u", str(f1), str(f2)]
-    s = f'{" ".join(diffcmd)}\n\n'  # pylint: disable=invalid-name
-    diff = subprocess.run(diffcmd,
-                          cwd=os.getcwd(),
-                          stdout=subprocess.PIPE,
-                          timeout=99).stdout.decode("utf-8", errors="replace")
-    if len(diff) < 10000:
-        s += f"{diff}\n\n"  # pylint: disable=invalid-name
-    else:
-        s += f"{diff[:10000]}\n(truncated after 10000 bytes)... \n\n"  # pylint: disable=invalid-name
+def diffLines(lines1, lines2, f1, f2, max_length=10000):  # pylint: disable=invalid-name,missing-param-doc
+    # pylint: disable=missing-type-doc
+    """Return a unified diff of the output of two runs (truncated if it's long), labelled with their log names."""
+    s = f"diff -u {f1} {f2}\n\n"  # pylint: disable=invalid-name
+    diff = ""
+    for diff_line in difflib.unified_diff(lines1, lines2, str(f1), str(f2)):
+        diff += diff_line if diff_line.endswith("\n") else f"{diff_line}\n"
+        if len(diff) >= max_length:
+            s += f"{diff[:max_length]}\n(truncated after {max_length} bytes)... \n\n"  # pylint: disable=invalid-name
+            return s
+    s += f"{diff}\n\n"  # pylint: disable=invalid-name
     return s
 
 
@@ -289,6 +453,10 @@ def parseOptions(args):  # pylint: disable=invalid-name
                       dest="flagsSpaceSep",
                       default="",
                       help="space-separated list of one set of flags")
+    parser.add_option("--jobs",
+                      type="int", dest="jobs",
+                      default=1,
+                      help="number of flag combinations to run concurrently")
     options, args = parser.parse_args(args)
     if len(args) != 3:
         raise Exception("Wrong number of positional arguments. Need 3 (knownPath, jsengine, infilename).")
@@ -317,7 +485,8 @@ def init(args):
 def interesting(_args, cwd_prefix):
     cwd_prefix = Path(cwd_prefix)  # Lithium uses this function and cwd_prefix from Lithium is not a Path
     actualLevel = compareLevel(  # pylint: disable=invalid-name
-        gOptions.jsengine, gOptions.flags, gOptions.infilename, cwd_prefix, gOptions, False, False)[0]
+        gOptions.jsengine, gOptions.flags, gOptions.infilename, cwd_prefix, gOptions, False, False,
+        jobs=gOptions.jobs)[0]
     return actualLevel >= gOptions.minimumInterestingLevel
 
 
@@ -325,7 +494,7 @@ def main():
     options = parseOptions(sys.argv[1:])
     print(compareLevel(
         options.jsengine, options.flags, options.infilename,  # pylint: disable=no-member
-        Path(tempfile.mkdtemp("compare_jitmain")), options, True, False)[0])
+        Path(tempfile.mkdtemp("compare_jitmain")), options, True, False, jobs=options.jobs)[0])
 
 
 if __name__ == "__main__":
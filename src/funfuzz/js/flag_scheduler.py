@@ -0,0 +1,219 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Biases the random choice of js shell flags towards those that find bugs quickly.
+
+Each flag that random_flag_set may add is an arm of a multi-armed bandit. The outcome of every loop iteration is
+credited to the flags it ran with: runs are rewarded for their throughput, i.e. the iterations jsfunfuzz went through
+per second, with a bonus for the level they reach, and runs that time out or run out of memory get nothing. As runs
+mostly last about as long as maxRunTime, rewarding them per run rather than per iteration would barely tell flags
+apart. The default probability of a flag is scaled by how runs with it fare against runs without it, with an upper
+confidence bound so that rarely-seen flags still get tried. Statistics are kept in the shell-cache directory and merged
+into it under a lock every few runs, so they are shared by all workers on a machine and survive restarts.
+"""
+
+import io
+import json
+import math
+
+import fasteners
+
+from ..util import file_system_helpers
+
+FLAG_SCHEDULER_FILENAME = "flag-scheduler-throughput.json"  # Statistics of runs rewarded per iteration
+
+SYNC_INTERVAL = 20  # Number of runs between merges of local statistics into the shared file
+MAX_TOTAL_RUNS = 100000  # Older statistics are decayed beyond this many runs, so the scheduler follows newer builds
+MIN_RUNS = 30  # Number of runs with and without a flag before its probability is adjusted
+LEVEL_REWARD = 1000  # Reward for each level reached by a run, in iterations, on top of those the run went through
+MIN_ELAPSED = 1  # seconds, so very short runs are not rewarded excessively
+EXPLORATION = 0.5  # Weight of the upper confidence bound
+MAX_FACTOR = 4  # Largest factor by which the default probability of a flag is scaled, up or down
+MIN_PROBABILITY = 0.02
+MAX_PROBABILITY = 0.95
+
+
+def arm_for(flag):
+    """Retrieve the arm of the bandit that a flag belongs to, i.e. the flag without its value.
+
+    Args:
+        flag (str): Flag passed to the js shell, e.g. "--ion-gvn=on"
+
+    Returns:
+        str: Arm of the flag, e.g. "--ion-gvn"
+    """
+    if flag.startswith("--execute="):  # Each snippet executed is a flag of its own
+        return flag
+    return flag.split("=", 1)[0]
+
+
+def reward_for(level, elapsed, timed_out, oomed, iterations):
+    """Compute the reward of a run.
+
+    Args:
+        level (int): Level reached by the run, as defined in js_interesting
+        elapsed (float): Time taken by the run, in seconds
+        timed_out (bool): Whether the run had to be killed after the timeout
+        oomed (bool): Whether the shell ran out of memory
+        iterations (int): Number of iterations jsfunfuzz went through, see seed_replay.count_iterations
+
+    Returns:
+        float: Reward of the run
+    """
+    if timed_out or oomed:
+        return 0.0
+    return (iterations + LEVEL_REWARD * level) / max(elapsed, MIN_ELAPSED)
+
+
+def empty_stats():
+    """Create empty statistics.
+
+    Returns:
+        dict: Number of runs and sum of rewards, in total and per arm
+    """
+    return {"runs": 0, "rewards": 0.0, "arms": {}}
+
+
+def merge_stats(base, delta):
+    """Add statistics to others.
+
+    Args:
+        base (dict): Statistics to be updated
+        delta (dict): Statistics to be added
+    """
+    base["runs"] += delta["runs"]
+    base["rewards"] += delta["rewards"]
+    for arm, (runs, rewards) in delta["arms"].items():
+        arm_stats = base["arms"].setdefault(arm, [0, 0.0])
+        arm_stats[0] += runs
+        arm_stats[1] += rewards
+
+
+def decay_stats(stats, max_runs):
+    """Scale down statistics that cover more than a maximum number of runs.
+
+    Args:
+        stats (dict): Statistics to be updated
+        max_runs (int): Maximum number of runs
+    """
+    if stats["runs"] <= max_runs:
+        return
+    factor = max_runs / stats["runs"]
+    stats["runs"] *= factor
+    stats["rewards"] *= factor
+    for arm_stats in stats["arms"].values():
+        arm_stats[0] *= factor
+        arm_stats[1] *= factor
+
+
+class FlagScheduler:
+    """Multi-armed bandit adjusting the probability of each random js shell flag.
+
+    Args:
+        state_file (Path): File holding the statistics shared by all workers
+        sync_interval (int): Number of runs between merges of local statistics into the shared file
+    """
+    def __init__(self, state_file, sync_interval=SYNC_INTERVAL):
+        self.state_file = state_file
+        self.lock_file = state_file.with_suffix(".lock")
+        self.sync_interval = sync_interval
+        self.shared = self.load()
+        self.local = empty_stats()
+
+    def load(self):
+        """Read the shared statistics.
+
+        Returns:
+            dict: Shared statistics, empty if the file does not exist or is corrupted
+        """
+        try:
+            with io.open(str(self.state_file), "r", encoding="utf-8", errors="replace") as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            return empty_stats()
+        if not isinstance(stats, dict) or not {"runs", "rewards", "arms"} <= set(stats):
+            return empty_stats()
+        return stats
+
+    def save(self, stats):
+        """Atomically write the shared statistics, so concurrent readers never see a partially-written file.
+
+        Args:
+            stats (dict): Shared statistics
+        """
+        file_system_helpers.atomic_write(self.state_file, json.dumps(stats, indent=1, sort_keys=True))
+
+    def sync(self):
+        """Merge the local statistics into the shared file, and pick up those recorded by other workers."""
+        try:
+            with fasteners.InterProcessLock(str(self.lock_file)):
+                stats = self.load()
+                merge_stats(stats, self.local)
+                decay_stats(stats, MAX_TOTAL_RUNS)
+                self.save(stats)
+        except OSError as ex:  # Keep the local statistics for the next attempt
+            print(f"Unable to update {self.state_file}: {ex}")
+            return
+        self.shared = stats
+        self.local = empty_stats()
+
+    def stats_for(self, arm):
+        """Retrieve the statistics of runs with and without an arm, including those not merged yet.
+
+        Args:
+            arm (str): Arm of the bandit
+
+        Returns:
+            tuple: Number of runs and sum of rewards with the arm, then without it
+        """
+        runs = self.shared["runs"] + self.local["runs"]
+        rewards = self.shared["rewards"] + self.local["rewards"]
+        arm_runs, arm_rewards = 0, 0.0
+        for stats in (self.shared, self.local):
+            if arm in stats["arms"]:
+                arm_runs += stats["arms"][arm][0]
+                arm_rewards += stats["arms"][arm][1]
+        return arm_runs, arm_rewards, runs - arm_runs, rewards - arm_rewards
+
+    def probability(self, flag, default):
+        """Adjust the probability of adding a flag from the outcomes of past runs.
+
+        Args:
+            flag (str): Flag to be added, without its value
+            default (float): Default probability of the flag
+
+        Returns:
+            float: Adjusted probability
+        """
+        arm_runs, arm_rewards, other_runs, other_rewards = self.stats_for(arm_for(flag))
+        if arm_runs < MIN_RUNS or other_runs < MIN_RUNS or other_rewards <= 0:
+            return default
+
+        ratio = (arm_rewards / arm_runs) / (other_rewards / other_runs)
+        ratio += EXPLORATION * math.sqrt(math.log(arm_runs + other_runs) / arm_runs)
+        factor = min(max(ratio, 1 / MAX_FACTOR), MAX_FACTOR)
+        return min(max(default * factor, MIN_PROBABILITY), MAX_PROBABILITY)
+
+    def record(self, flags, level, elapsed, timed_out, oomed, iterations):  # pylint: disable=too-many-arguments
+        """Record the outcome of a run, and merge statistics into the shared file once enough runs were recorded.
+
+        Args:
+            flags (list): Flags passed to the js shell
+            level (int): Level reached by the run, as defined in js_interesting
+            elapsed (float): Time taken by the run, in seconds
+            timed_out (bool): Whether the run had to be killed after the timeout
+            oomed (bool): Whether the shell ran out of memory
+            iterations (int): Number of iterations jsfunfuzz went through, see seed_replay.count_iterations
+        """
+        reward = reward_for(level, elapsed, timed_out, oomed, iterations)
+        self.local["runs"] += 1
+        self.local["rewards"] += reward
+        for arm in {arm_for(str(x)) for x in flags}:
+            arm_stats = self.local["arms"].setdefault(arm, [0, 0.0])
+            arm_stats[0] += 1
+            arm_stats[1] += reward
+        if self.local["runs"] >= self.sync_interval:
+            self.sync()
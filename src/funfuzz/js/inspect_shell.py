@@ -7,16 +7,21 @@
 """Allows inspection of the SpiderMonkey shell to ensure that it is compiled as intended with specified configurations.
 """
 
+from functools import lru_cache
 import json
 import os
+from pathlib import Path
 import platform
 from shlex import quote
 import subprocess
 
 from lithium.interestingness.utils import env_with_path
 
+from ..util import shell_metadata
 from ..util import subprocesses as sps
 
+BUILD_CONFIGURATION_METADATA = "build-configuration"
+
 RUN_MOZGLUE_LIB = ""
 RUN_NSPR_LIB = ""
 RUN_PLDS_LIB = ""
@@ -168,12 +173,46 @@ def testJsShellOrXpcshell(s):  # pylint: disable=invalid-name,missing-param-doc,
     return "xpcshell" if shellSupports(s, ["-e", "Components"]) else "jsShell"
 
 
+def get_build_configuration(shell_path):
+    """Retrieve the full getBuildConfiguration() object of a shell.
+
+    The object is obtained with a single shell launch and stored next to the shell, keyed by the content hash of the
+    binary, so later callers (including other processes) do not need to launch the shell again.
+
+    Args:
+        shell_path (Path): Path to the shell
+
+    Returns:
+        dict: Build configuration of the shell
+    """
+    shell_path = Path(shell_path).expanduser().resolve()
+    return _build_configuration(shell_path, shell_metadata.binary_hash(shell_path))
+
+
+@lru_cache(maxsize=None)
+def _build_configuration(shell_path, _binary_hash):
+    """Load the build configuration of a shell from disk, probing the shell only if it has not been stored yet.
+
+    Args:
+        shell_path (Path): Resolved path to the shell
+        _binary_hash (str): Content hash of the shell, only used as part of the in-process cache key
+
+    Returns:
+        dict: Build configuration of the shell
+    """
+    build_cfg = shell_metadata.load_metadata(shell_path, BUILD_CONFIGURATION_METADATA)
+    if build_cfg is None:
+        build_cfg = json.loads(testBinary(shell_path,
+                                          ["-e", "print(JSON.stringify(getBuildConfiguration()))"],
+                                          False, stderr=subprocess.DEVNULL)[0].rstrip())
+        shell_metadata.save_metadata(shell_path, BUILD_CONFIGURATION_METADATA, build_cfg)
+    return build_cfg
+
+
 def queryBuildConfiguration(s, parameter):  # pylint: disable=invalid-name,missing-param-doc,missing-return-doc
     # pylint: disable=missing-return-type-doc,missing-type-doc
     """Test if a binary is compiled with specified parameters, in getBuildConfiguration()."""
-    return json.loads(testBinary(s,
-                                 ["-e", f'print(getBuildConfiguration()["{parameter}"])'],
-                                 False, stderr=subprocess.DEVNULL)[0].rstrip().lower())
+    return get_build_configuration(s)[parameter]
 
 
 def verifyBinary(sh):  # pylint: disable=invalid-name,missing-param-doc,missing-type-doc
@@ -7,6 +7,7 @@
 """Check whether a testcase causes an interesting result in a shell.
 """
 
+import copy
 import io
 from optparse import OptionParser  # pylint: disable=deprecated-module
 import os
@@ -16,15 +17,16 @@ from shlex import quote
 import shutil
 import subprocess
 import sys
+import time
 
 from FTB.ProgramConfiguration import ProgramConfiguration
 import FTB.Signatures.CrashInfo as Crash_Info
-import lithium.interestingness.timed_run as timedrun
 
 from . import inspect_shell
 from ..util import create_collector
 from ..util import file_manipulation
 from ..util import os_ops
+from ..util import shell_runner
 
 # Levels of unhappiness.
 # These are in order from "most expected to least expected" rather than "most ok to worst".
@@ -56,7 +58,15 @@ VALGRIND_ERROR_EXIT_CODE = 77
 
 class ShellResult:  # pylint: disable=missing-docstring,too-many-instance-attributes,too-few-public-methods
     # options dict should include: timeout, knownPath, collector, valgrind, shellIsDeterministic
-    def __init__(self, options, runthis, logPrefix, in_compare_jit, env=None):  # pylint: disable=too-complex
+    # stdout and stderr are captured through pipes by shell_runner, and the -out and -err logs are written after the
+    # run, as Lithium expects. With in_memory, they are only written if the run turns out to be interesting. Setting
+    # cancel_event kills the run if its result is no longer needed, and stdout_line_callback is called with each line
+    # of stdout while the shell runs. If runinfo is specified, the shell is not run: the results of a run that the
+    # caller made in memory, e.g. from async_loop, are classified instead.
+    # timings holds the seconds spent in each stage: spawn, wait, classify and fm_search.
+    def __init__(self, options, runthis, logPrefix, in_compare_jit, env=None, in_memory=False, cancel_event=None,
+                 stdout_line_callback=None, runinfo=None):
+        # pylint: disable=too-complex
         # pylint: disable=too-many-arguments,too-many-branches,too-many-locals,too-many-statements
 
         # If Lithium uses this as an interestingness test, logPrefix is likely not a Path object, so make it one.
@@ -66,45 +76,36 @@ class ShellResult:  # pylint: disable=missing-docstring,too-many-instance-attrib
         # Ignore trailing ".exe" in Win, also abspath makes it work w/relative paths like "./js"
         # pylint: disable=invalid-name
         assert pathToBinary.with_suffix(".fuzzmanagerconf").is_file()
-        pc = ProgramConfiguration.fromBinary(str(pathToBinary.parent / pathToBinary.stem))
+        if getattr(options, "program_configuration", None) and pathToBinary == options.jsengine:
+            # Reuse the configuration parsed once in parseOptions, a copy is needed as the arguments get added to it
+            pc = copy.deepcopy(options.program_configuration)
+        else:
+            pc = ProgramConfiguration.fromBinary(str(pathToBinary.parent / pathToBinary.stem))
         pc.addProgramArguments(runthis[1:-1])
 
-        if options.valgrind:
-            runthis = (
-                inspect_shell.constructVgCmdList(errorCode=VALGRIND_ERROR_EXIT_CODE) +
-                [f"--suppressions={filename}" for filename in "valgrind_suppressions.txt"] +
-                runthis)
+        runthis = shell_command(options, runthis)
 
         timed_run_kw = {"env": (env or os.environ)}
-        if not (platform.system() == "Windows" or
-                # We cannot set a limit for RLIMIT_AS for ASan binaries
-                inspect_shell.queryBuildConfiguration(options.jsengine, "asan")):
-            timed_run_kw["preexec_fn"] = set_ulimit
-
-        lithium_logPrefix = str(logPrefix).encode("utf-8")
-        if isinstance(lithium_logPrefix, b"".__class__):
-            lithium_logPrefix = lithium_logPrefix.decode("utf-8", errors="replace")
-
-        # logPrefix should be a string for timed_run in Lithium version 0.2.1 to work properly, apparently
-        runinfo = timedrun.timed_run(
-            [str(x) for x in runthis],  # Convert all Paths/bytes to strings for Lithium
-            options.timeout,
-            lithium_logPrefix,
-            **timed_run_kw)
+        if uses_rlimits(options):
+            # Set before the shell is executed, without a preexec_fn where possible, see shell_runner.limit_command
+            timed_run_kw["rlimits"] = shell_rlimits()
+
+        if runinfo is None:
+            runinfo = shell_runner.timed_run(runthis, options.timeout, cancel_event=cancel_event,
+                                             cpu_timeout=options.cpu_timeout,
+                                             stdout_line_callback=stdout_line_callback, **timed_run_kw)
+        if not in_memory:
+            runinfo.save(logPrefix)
+        # FuzzManager expects a list of strings rather than an iterable, so bite the
+        # bullet and "readlines" everything into memory.
+        out = runinfo.out.lines()
+        err = runinfo.err.lines()
 
+        classify_start_time = time.time()
         lev = JS_FINE
         issues = []
         auxCrashData = []  # pylint: disable=invalid-name
 
-        # FuzzManager expects a list of strings rather than an iterable, so bite the
-        # bullet and "readlines" everything into memory.
-        out_log = (logPrefix.parent / f"{logPrefix.stem}-out").with_suffix(".txt")
-        with io.open(str(out_log), "r", encoding="utf-8", errors="replace") as f:
-            out = f.readlines()
-        err_log = (logPrefix.parent / f"{logPrefix.stem}-err").with_suffix(".txt")
-        with io.open(str(err_log), "r", encoding="utf-8", errors="replace") as f:
-            err = f.readlines()
-
         if options.valgrind and runinfo.return_code == VALGRIND_ERROR_EXIT_CODE:
             issues.append("valgrind reported an error")
             lev = max(lev, JS_VG_AMISS)
@@ -112,12 +113,12 @@ class ShellResult:  # pylint: disable=missing-docstring,too-many-instance-attrib
             for line in err:
                 if valgrindErrorPrefix and line.startswith(valgrindErrorPrefix):
                     issues.append(line.rstrip())
-        elif runinfo.sta == timedrun.CRASHED:
+        elif runinfo.sta == shell_runner.CRASHED:
             if os_ops.grab_crash_log(runthis[0], runinfo.pid, logPrefix, True):
                 crash_log = (logPrefix.parent / f"{logPrefix.stem}-crash").with_suffix(".txt")
                 with io.open(str(crash_log), "r", encoding="utf-8", errors="replace") as f:
                     auxCrashData = [line.strip() for line in f.readlines()]
-        elif file_manipulation.amiss(logPrefix):
+        elif file_manipulation.amiss_lines(err):
             issues.append("malloc error")
             lev = max(lev, JS_NEW_ASSERT_OR_CRASH)
         elif runinfo.return_code == 0 and not in_compare_jit:
@@ -170,6 +171,7 @@ class ShellResult:  # pylint: disable=missing-docstring,too-many-instance-attrib
                 "Bus error" in str(crashInfo.rawStderr):
             lev = max(lev, JS_NEW_ASSERT_OR_CRASH)
 
+        fm_search_start_time = time.time()
         try:
             match = options.collector.search(crashInfo)
             if match[0] is not None:
@@ -178,9 +180,14 @@ class ShellResult:  # pylint: disable=missing-docstring,too-many-instance-attrib
         except UnicodeDecodeError:  # Sometimes FM throws due to unicode issues
             print("Note: FuzzManager is throwing a UnicodeDecodeError, signature matching skipped")
             match = False
+        fm_search_time = time.time() - fm_search_start_time
 
         print(f"{logPrefix} | {summaryString(issues, lev, runinfo.elapsedtime)}")
 
+        if in_memory and lev != JS_FINE:
+            runinfo.save(logPrefix)
+        runinfo.close()
+
         if lev != JS_FINE:
             summary_log = (logPrefix.parent / f"{logPrefix.stem}-summary").with_suffix(".txt")
             with io.open(str(summary_log), "w", encoding="utf-8", errors="replace") as f:
@@ -196,6 +203,44 @@ class ShellResult:  # pylint: disable=missing-docstring,too-many-instance-attrib
         self.match = match
         self.runinfo = runinfo
         self.return_code = runinfo.return_code
+        spawn_time = getattr(runinfo, "spawn_time", 0.0)  # Lithium's timed_run does not measure it
+        # Peak RSS, CPU time and page faults of the shell, if collected
+        self.rusage = getattr(runinfo, "rusage", None)
+        self.timings = {
+            "spawn": spawn_time,
+            "wait": runinfo.elapsedtime - spawn_time,
+            "classify": time.time() - classify_start_time - fm_search_time,
+            "fm_search": fm_search_time,
+        }
+
+
+def shell_command(options, runthis):
+    """Retrieve the command that runs the js shell, under valgrind if requested.
+
+    Args:
+        options (object): Options for js_interesting.py
+        runthis (list): js shell and its arguments
+
+    Returns:
+        list: Command and its arguments
+    """
+    if options.valgrind:
+        return (inspect_shell.constructVgCmdList(errorCode=VALGRIND_ERROR_EXIT_CODE) +
+                [f"--suppressions={filename}" for filename in "valgrind_suppressions.txt"] +
+                runthis)
+    return runthis
+
+
+def uses_rlimits(options):
+    """Check if resource limits are applied to the js shell.
+
+    Args:
+        options (object): Options for js_interesting.py
+
+    Returns:
+        bool: True unless on Windows or with an ASan build, for which RLIMIT_AS cannot be set
+    """
+    return not (platform.system() == "Windows" or inspect_shell.queryBuildConfiguration(options.jsengine, "asan"))
 
 
 def understoodJsfunfuzzExit(out, err):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc
@@ -257,25 +302,32 @@ def truncateFile(fn, maxSize):  # pylint: disable=invalid-name,missing-docstring
             f.truncate(maxSize)
 
 
-def set_ulimit():
-    """Sets appropriate resource limits for the JS shell when on POSIX."""
+def shell_rlimits():
+    """Retrieve appropriate resource limits for the JS shell when on POSIX.
+
+    Returns:
+        dict: Soft and hard limits keyed by resource, empty on non-POSIX platforms
+    """
     try:
         import resource  # pylint: disable=import-error
-
-        # log.debug("Limit address space to 2GB (or 1GB on ARM boards such as ODROID)")
-        # We cannot set a limit for RLIMIT_AS for ASan binaries
-        giga_byte = 2**30
-        resource.setrlimit(resource.RLIMIT_AS, (2 * giga_byte, 2 * giga_byte))  # pylint: disable=no-member
-
-        # log.debug("Limit corefiles to 0.5 GB")
-        half_giga_byte = int(giga_byte // 2)
-        resource.setrlimit(resource.RLIMIT_CORE, (half_giga_byte, half_giga_byte))  # pylint: disable=no-member
     except ImportError:
         # log.debug("Skipping resource import as a non-POSIX platform was detected: %s", platform.system())
-        return
+        return {}
 
+    # log.debug("Limit address space to 2GB (or 1GB on ARM boards such as ODROID)")
+    # We cannot set a limit for RLIMIT_AS for ASan binaries
+    giga_byte = 2**30
+    # log.debug("Limit corefiles to 0.5 GB")
+    half_giga_byte = int(giga_byte // 2)
+    return {
+        resource.RLIMIT_AS: (2 * giga_byte, 2 * giga_byte),  # pylint: disable=no-member
+        resource.RLIMIT_CORE: (half_giga_byte, half_giga_byte),  # pylint: disable=no-member
+    }
 
-def parseOptions(args):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc,missing-return-type-doc
+
+def parseOptions(args, collector=None):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc
+    # pylint: disable=missing-return-type-doc
+    # Callers running many testcases against the same shell can pass in a collector to reuse its signature cache.
     parser = OptionParser()
     parser.disable_interspersed_args()
     parser.add_option("--valgrind",
@@ -294,6 +346,10 @@ def parseOptions(args):  # pylint: disable=invalid-name,missing-docstring,missin
                       type="int", dest="timeout",
                       default=120,
                       help="timeout in seconds")
+    parser.add_option("--cpu-timeout",
+                      type="int", dest="cpu_timeout",
+                      default=None,
+                      help="CPU time in seconds after which the shell is killed, on POSIX")
     options, args = parser.parse_args(args)
     if len(args) < 2:
         raise Exception("Not enough positional arguments")
@@ -302,7 +358,11 @@ def parseOptions(args):  # pylint: disable=invalid-name,missing-docstring,missin
     options.jsengine = options.jsengineWithArgs[0]  # options.jsengine is needed as it is present in compare_jit
     assert options.jsengine.is_file()  # js shell
     assert options.jsengineWithArgs[-1].is_file()  # testcase
-    options.collector = create_collector.make_collector()
+    options.collector = collector or create_collector.make_collector()
+    options.program_configuration = None
+    if options.jsengine.with_suffix(".fuzzmanagerconf").is_file():
+        options.program_configuration = ProgramConfiguration.fromBinary(
+            str(options.jsengine.parent / options.jsengine.stem))
     options.shellIsDeterministic = inspect_shell.queryBuildConfiguration(
         options.jsengine, "more-deterministic")
 
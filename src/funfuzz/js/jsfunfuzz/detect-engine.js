@@ -18,7 +18,7 @@ var dumpln;
 var printImportant;
 if (jsshell) {
   dumpln = print;
-  printImportant = function(s) { dumpln("***"); dumpln(s); };
+  printImportant = function(s) { print("***"); print(s); };
   if (typeof verifyprebarriers == "function") {
     // Run a diff between the help() outputs of different js shells.
     // Make sure the function to look out for is not located only in some
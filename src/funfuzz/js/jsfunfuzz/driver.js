@@ -5,8 +5,11 @@
 
 function start(glob)
 {
-  var fuzzSeed = Math.floor(Math.random() * Math.pow(2,28));
+  // If another script specified a "forcedFuzzSeed" argument, use it to replay an earlier run
+  var fuzzSeed = (typeof glob.forcedFuzzSeed == "number") ? glob.forcedFuzzSeed :
+                 Math.floor(Math.random() * Math.pow(2,28));
   dumpln("fuzzSeed: " + fuzzSeed);
+  initRingBuffer(glob);
   Random.init(fuzzSeed);
 
   // Split this string across two source strings to ensure that if a
@@ -29,6 +32,8 @@ function start(glob)
   if (jsshell) {
     // If another script specified a "maxRunTime" argument, use it; otherwise, run forever
     var MAX_TOTAL_TIME = (glob.maxRunTime) || (Infinity);
+    // Likewise for "maxIterations", so that a replayed run stops where the earlier one did
+    var MAX_ITERATIONS = (glob.maxIterations) || (Infinity);
     var startTime = new Date();
     var lastTime;
 
@@ -39,7 +44,8 @@ function start(glob)
         print("That took " + elapsed1 + "ms!");
       }
       lastTime = new Date();
-    } while(lastTime - startTime < MAX_TOTAL_TIME);
+    } while(lastTime - startTime < MAX_TOTAL_TIME && count < MAX_ITERATIONS);
+    flushRingBuffer("exit");
   } else {
     setTimeout(testStuffForAWhile, 200);
   }
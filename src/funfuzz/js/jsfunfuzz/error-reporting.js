@@ -10,6 +10,7 @@ function confused(s)
     // Currently disabled until its use can be figured out
     // print("jsfunfuzz broke" + " its own scripting environment: " + s);
     // Replaced with the following:
+    flushRingBuffer("confused");
     print("jsfunfuzz got confused: " + s);
     quit();
   }
@@ -24,6 +25,7 @@ function foundABug(summary, details)
     printImportant(details);
   }
   if (jsshell) {
+    flushRingBuffer("bug");
     dumpln("jsfunfuzz stopping due to finding a bug.");
     quit();
   }
@@ -308,15 +308,35 @@ if (typeof oomTest == "function" && engine != ENGINE_JAVASCRIPTCORE) {
 }
 
 
+var regressionTestListCache = null;
+
+function getRegressionTestList()
+{
+  // The list of regression tests is read from regressionTestListFile (one path per line) the first time a test is
+  // chosen, rather than being parsed from a huge literal by every shell launch.
+  if (regressionTestListCache === null) {
+    regressionTestListCache = [];
+    if (typeof regressionTestList == "object") {
+      regressionTestListCache = regressionTestList;
+    } else if (typeof regressionTestListFile == "string" && typeof read == "function") {
+      try {
+        regressionTestListCache = read(regressionTestListFile).split("\n").filter(function(line) { return line != ""; });
+      } catch(e) { }
+    }
+  }
+  return regressionTestListCache;
+}
+
 function makeUseRegressionTest(d, b)
 {
   if (rnd(TOTALLY_RANDOM) == 2) return totallyRandom(d, b);
 
-  if (typeof regressionTestList != "object") {
+  var testList = getRegressionTestList();
+  if (!testList.length) {
     return "/* no regression tests found */";
   }
 
-  var maintest = regressionTestsRoot + Random.index(regressionTestList);
+  var maintest = regressionTestsRoot + Random.index(testList);
   var files = regressionTestDependencies(maintest);
 
   var s = "";
@@ -401,7 +421,7 @@ function regressionTestDependencies(maintest)
     for (var i = regressionTestsRoot.length; i < maintest.length; ++i) {
       if (maintest.charAt(i) == "/" || maintest.charAt(i) == "\\") {
         var shelljs = maintest.substr(0, i + 1) + "shell.js";
-        if (regressionTestList.indexOf(shelljs) != -1) {
+        if (getRegressionTestList().indexOf(shelljs) != -1) {
           files.push(shelljs);
         }
       }
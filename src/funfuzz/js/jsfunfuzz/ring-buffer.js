@@ -0,0 +1,54 @@
+
+// This Source Code Form is subject to the terms of the Mozilla Public
+// License, v. 2.0. If a copy of the MPL was not distributed with this
+// file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+// Low-output mode: if another script specified a "ringBufferSize" argument, dumpln only keeps the last
+// ringBufferSize lines it is given. They are printed when jsfunfuzz stops, after a line that says why and how many
+// lines were dropped. If a "ringBufferTimeout" argument (in seconds) is also specified, they are printed before the
+// shell gets killed by the harness too.
+
+var ringBuffer = null;
+var ringBufferNext = 0;
+var ringBufferDropped = 0;
+var ringBufferPrint;
+
+function initRingBuffer(glob)
+{
+  if (!jsshell || !(glob.ringBufferSize > 0))
+    return;
+
+  var size = glob.ringBufferSize;
+  ringBuffer = [];
+  ringBufferPrint = print;
+  dumpln = function(s) {
+    if (ringBuffer.length < size) {
+      ringBuffer.push(s);
+    } else {
+      ringBuffer[ringBufferNext] = s;
+      ++ringBufferDropped;
+    }
+    ringBufferNext = (ringBufferNext + 1) % size;
+  };
+
+  if (glob.ringBufferTimeout > 0 && typeof timeout == "function") {
+    // Returning false makes the shell stop running the script
+    timeout(glob.ringBufferTimeout, function() { flushRingBuffer("timeout"); return false; });
+  }
+}
+
+function flushRingBuffer(reason)
+{
+  if (!ringBuffer)
+    return;
+
+  var lines = ringBuffer.slice(ringBufferNext).concat(ringBuffer.slice(0, ringBufferNext));
+  ringBuffer = null;
+  dumpln = ringBufferPrint;
+
+  // Split the marker so that it is not found if a generated function outputs the jsfunfuzz source
+  dumpln("/*R" + "ING-" + reason + "-dropped-" + ringBufferDropped + "*/");
+  for (var i = 0; i < lines.length; ++i) {
+    dumpln(lines[i]);
+  }
+}
@@ -5,10 +5,24 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 """Concatenate js files to create jsfunfuzz.
+
+Workers share a linked jsfunfuzz per prologue, named after the hash of its contents and kept read-only in the
+shell-cache directory. The byte offsets of its SPLICE markers are stored in a sidecar file, so that splicing a testcase
+into it does not require scanning it.
 """
 
+import hashlib
 import io
+import json
 from pathlib import Path
+import stat
+
+from ..util import file_manipulation
+from ..util import file_system_helpers
+
+LINKED_FUZZER_DIRNAME = "linked-fuzzers"
+SPLICE_MARKER = "SPLICE"
+SPLICE_SUFFIX = ".splice.json"
 
 
 def link_fuzzer(target_path, prologue=""):
@@ -18,16 +32,145 @@ def link_fuzzer(target_path, prologue=""):
         target_path (Path): Target file with full path, to be created
         prologue (str): Contents to be prepended to the target file
     """
+    with io.open(str(target_path), "w", encoding="utf-8", errors="replace") as f:  # Create the full jsfunfuzz file
+        f.write(linked_contents(prologue))
+
+
+def linked_contents(prologue=""):
+    """Concatenate the files to be linked.
+
+    Args:
+        prologue (str): Contents to be prepended to the linked files
+
+    Returns:
+        str: Contents of the full jsfunfuzz file
+    """
     base_dir = Path(__file__).parent
+    contents = [prologue]
 
-    with io.open(str(target_path), "w", encoding="utf-8", errors="replace") as f:  # Create the full jsfunfuzz file
-        if prologue:
-            f.write(prologue)
-
-        for entry in (base_dir / "files_to_link.txt").read_text().split():
-            entry = entry.rstrip()
-            if entry and not entry.startswith("#"):
-                file_path = base_dir / Path(entry)
-                file_name = f'\n\n// {str(file_path).split("funfuzz", 1)[1][1:]}\n\n'
-                f.write(file_name)
-                f.write(file_path.read_text())
+    for entry in (base_dir / "files_to_link.txt").read_text().split():
+        entry = entry.rstrip()
+        if entry and not entry.startswith("#"):
+            file_path = base_dir / Path(entry)
+            contents.append(f'\n\n// {str(file_path).split("funfuzz", 1)[1][1:]}\n\n')
+            contents.append(file_path.read_text())
+    return "".join(contents)
+
+
+def splice_offsets(contents):
+    """Find where a testcase gets spliced into jsfunfuzz, as fuzzSplice in file_manipulation does.
+
+    Args:
+        contents (str): Contents of the full jsfunfuzz file
+
+    Returns:
+        list: Byte offsets of the end of the line with the first SPLICE marker, and of the start of the line with the
+              second one, or None if the markers are not found
+    """
+    first = contents.find(SPLICE_MARKER)
+    if first == -1:
+        return None
+    before_end = contents.find("\n", first) + 1
+    second = contents.find(SPLICE_MARKER, before_end)
+    if not before_end or second == -1:
+        return None
+    after_start = contents.rfind("\n", 0, second) + 1
+    return [len(contents[:before_end].encode("utf-8")), len(contents[:after_start].encode("utf-8"))]
+
+
+def content_hash(data):
+    """Compute the hash that a linked jsfunfuzz file is named after.
+
+    Args:
+        data (bytes): Contents of the full jsfunfuzz file
+
+    Returns:
+        str: Hexadecimal hash of the contents
+    """
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def fuzzer_hash(fuzzjs):
+    """Compute the hash of a linked jsfunfuzz file, which covers its prologue.
+
+    Args:
+        fuzzjs (Path): Path to the jsfunfuzz file
+
+    Returns:
+        str: Hexadecimal hash of the contents
+    """
+    return content_hash(fuzzjs.read_bytes())
+
+
+def splice_file_for(fuzzjs):
+    """Retrieve the sidecar file holding the SPLICE offsets of a linked jsfunfuzz.
+
+    Args:
+        fuzzjs (Path): Path to the jsfunfuzz file
+
+    Returns:
+        Path: Path to the sidecar file
+    """
+    return fuzzjs.with_suffix(SPLICE_SUFFIX)
+
+
+def cached_link_fuzzer(cache_dir, prologue=""):
+    """Retrieve the shared jsfunfuzz file for a prologue, linking it first if no worker has done so yet.
+
+    Args:
+        cache_dir (Path): Directory holding the linked files, e.g. in the shell-cache directory
+        prologue (str): Contents to be prepended to the linked files
+
+    Returns:
+        Path: Path to the read-only jsfunfuzz file
+    """
+    contents = linked_contents(prologue)
+    fuzzjs = cache_dir / f"jsfunfuzz-{content_hash(contents.encode('utf-8'))}.js"
+    if fuzzjs.is_file():
+        return fuzzjs
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # The sidecar file is written first, so it is always present along with the jsfunfuzz file
+    file_system_helpers.atomic_write(splice_file_for(fuzzjs), json.dumps(splice_offsets(contents)))
+    file_system_helpers.atomic_write(fuzzjs, contents)
+    fuzzjs.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return fuzzjs
+
+
+def fuzz_splice(fuzzjs):
+    """Return the lines of a linked jsfunfuzz file, minus the ones between the two lines containing SPLICE.
+
+    Args:
+        fuzzjs (Path): Path to the jsfunfuzz file
+
+    Returns:
+        list: Lines before the splice point, then lines after it
+    """
+    try:
+        with io.open(str(splice_file_for(fuzzjs)), "r", encoding="utf-8", errors="replace") as f:
+            offsets = json.load(f)
+    except (OSError, ValueError):
+        offsets = None
+    if not offsets:  # Not linked by cached_link_fuzzer
+        return file_manipulation.fuzzSplice(fuzzjs)
+
+    with io.open(str(fuzzjs), "rb") as f:
+        before = f.read(offsets[0]).decode("utf-8", errors="replace")
+        f.seek(offsets[1])
+        after = f.read().decode("utf-8", errors="replace")
+    return [before.splitlines(keepends=True), after.splitlines(keepends=True)]
+
+
+def splice_testcase(fuzzjs, out_lines):
+    """Create a testcase from the FRC lines printed by jsfunfuzz, spliced in where it would otherwise start fuzzing.
+
+    Args:
+        fuzzjs (Path): Path to the jsfunfuzz file
+        out_lines (iterable): Lines printed by jsfunfuzz
+
+    Returns:
+        list: Lines of the testcase
+    """
+    [before, after] = fuzz_splice(fuzzjs)
+    return before + [
+        x.replace("/*FRC-", "/*") for x in file_manipulation.linesStartingWith(out_lines, "/*FRC-")] + after
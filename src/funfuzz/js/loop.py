@@ -7,28 +7,44 @@
 """Allows the funfuzz harness to run continuously.
 """
 
+import copy
+from functools import lru_cache
 import io
 import json
 from optparse import OptionParser  # pylint: disable=deprecated-module
 import os
 from pathlib import Path
 import platform
+import statistics
 import subprocess
 import sys
 from textwrap import dedent
 import time
 import zipfile
 
+from . import bytecode_cache
 from . import compare_jit
+from . import flag_scheduler
 from . import js_interesting
 from . import link_fuzzer
+from . import regression_catalog
+from . import ring_buffer
+from . import seed_replay
 from . import shell_flags
+from . import timeout_tuner
 from . import with_binaryen
 from ..util import create_collector
-from ..util import file_manipulation
 from ..util import file_system_helpers
 from ..util import lithium_helpers
 from ..util import os_ops
+from ..util import scratch_space
+from ..util import shell_runner
+from ..util import sm_compile_helpers
+from ..util import stats_aggregator
+from ..util import supervisor
+from ..util import worker_stats
+
+STARTUP_MEASUREMENT_RUNS = 5
 
 
 def parseOpts(args):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc,missing-return-type-doc
@@ -39,10 +55,51 @@ def parseOpts(args):  # pylint: disable=invalid-name,missing-docstring,missing-r
                       default=False,
                       help="After running the fuzzer, run the FCM lines against the engine "
                            "in two configurations and compare the output.")
+    parser.add_option("--compare-jit-jobs",
+                      type="int", dest="compare_jit_jobs",
+                      default=1,
+                      help='Number of compare_jit flag combinations to run concurrently. Defaults to "%default".')
+    parser.add_option("--adaptive-timeout",
+                      action="store_true", dest="adaptive_timeout",
+                      default=False,
+                      help="Tune the timeout and jsfunfuzz's maxRunTime per build and flag set from past runs")
+    parser.add_option("--min-timeout",
+                      type="int", dest="min_timeout",
+                      help="Lowest timeout the adaptive timeout may choose. Defaults to half the timeout.")
+    parser.add_option("--max-timeout",
+                      type="int", dest="max_timeout",
+                      help="Highest timeout the adaptive timeout may choose. Defaults to four times the timeout.")
     parser.add_option("--random-flags",
                       action="store_true", dest="randomFlags",
                       default=False,
                       help="Pass a random set of flags (e.g. --ion-eager) to the js engine")
+    parser.add_option("--flag-scheduler",
+                      action="store_true", dest="flag_scheduler",
+                      default=False,
+                      help="Bias the random flags towards those that found bugs quickly in past runs of all workers")
+    parser.add_option("--stats-port",
+                      type="int", dest="stats_port",
+                      help="Local port of the stats aggregator of the bot to send statistics to")
+    parser.add_option("--measure-startup",
+                      action="store_true", dest="measure_startup",
+                      default=False,
+                      help="Report how long jsfunfuzz takes to start up, with the regression test list inlined or not, "
+                           "and how much time loading it as bytecode would save")
+    parser.add_option("--ring-buffer-size",
+                      type="int", dest="ring_buffer_size",
+                      default=0,
+                      help="Let jsfunfuzz only print this many of the last lines it generated, when it stops. "
+                           "Defaults to %default, which prints all of them as they are generated")
+    parser.add_option("--record-seeds",
+                      action="store_true", dest="record_seeds",
+                      default=False,
+                      help="Keep the seed of interesting runs instead of their full testcase, "
+                           "which python -m funfuzz.js.seed_replay rebuilds on demand")
+    parser.add_option("--seed-bisect",
+                      action="store_true", dest="seed_bisect",
+                      default=False,
+                      help="Before running Lithium, replay the seed of interesting runs with fewer iterations "
+                           "to find the shortest testcase that still reproduces")
     parser.add_option("--repo",
                       action="store",
                       dest="repo",
@@ -71,6 +128,8 @@ def parseOpts(args):  # pylint: disable=invalid-name,missing-docstring,missing-r
     # higher = more complex mixing, especially with regression tests.
     # lower = less time wasted in timeouts and in compare_jit testcases that are thrown away due to OOMs.
     options.timeout = int(args[0])
+    options.min_timeout = min(options.min_timeout or options.timeout // 2, options.timeout)
+    options.max_timeout = max(options.max_timeout or options.timeout * 4, options.timeout)
 
     # FIXME: We can probably remove args[1]  # pylint: disable=fixme
     options.knownPath = "mozilla-central"
@@ -93,9 +152,24 @@ def showtail(filename):  # pylint: disable=missing-docstring
     print()
 
 
-def makeRegressionTestPrologue(repo):  # pylint: disable=invalid-name,missing-param-doc
-    # pylint: disable=missing-return-doc,missing-return-type-doc,missing-type-doc
-    """Generate a JS string to tell jsfunfuzz where to find SpiderMonkey's regression tests."""
+def makeRegressionTestPrologue(repo, inline_test_list=False):  # pylint: disable=invalid-name
+    """Generate a JS string to tell jsfunfuzz where to find SpiderMonkey's regression tests.
+
+    jsfunfuzz reads the list of tests from the list file of the regression test catalog once it picks one, instead of
+    every shell launch parsing it, unless the list is inlined.
+
+    Args:
+        repo (Path): Path to the repository
+        inline_test_list (bool): Whether to inline the list of tests as a JSON literal, as was previously done
+
+    Returns:
+        str: JS prologue for jsfunfuzz
+    """
+    catalog = regression_catalog.RegressionCatalog.for_repo(repo)
+    if inline_test_list:
+        test_list = f"const regressionTestList = {json.dumps(catalog.paths())};"
+    else:
+        test_list = f"const regressionTestListFile = {json.dumps(str(catalog.list_file))};"
     libdir = Path("js") / "src" / "jit-test" / "lib"
     js_src_tests_dir = Path("js") / "src" / "tests"
     w_pltfrm_res_dir = Path("testing") / "web-platform" / "tests" / "resources"
@@ -104,29 +178,171 @@ def makeRegressionTestPrologue(repo):  # pylint: disable=invalid-name,missing-pa
         const libdir = regressionTestsRoot + {json.dumps(str(libdir) + os.sep)}; // needed by jit-tests
         const js_src_tests_dir = regressionTestsRoot + {json.dumps(str(js_src_tests_dir) + os.sep)}; // streams tests
         const w_pltfrm_res_dir = regressionTestsRoot + {json.dumps(str(w_pltfrm_res_dir) + os.sep)}; // streams tests
-        const regressionTestList = {json.dumps(inTreeRegressionTests(repo))};
+        {test_list}
     """)
 
 
-def inTreeRegressionTests(repo):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc
-    # pylint: disable=missing-return-type-doc
-    jit_tests = jsFilesIn(len(str(repo)), repo / "js" / "src" / "jit-test" / "tests")
-    js_tests = jsFilesIn(len(str(repo)), repo / "js" / "src" / "tests")
-    non262_tests = jsFilesIn(len(str(repo)), repo / "js" / "src" / "tests" / "non262")
-    test262_tests = jsFilesIn(len(str(repo)), repo / "js" / "src" / "tests" / "test262")
-    streams_tests = jsFilesIn(len(str(repo)), repo / "testing" / "web-platform" / "tests" / "streams")
-    return jit_tests + js_tests + non262_tests + test262_tests + streams_tests
+def measure_startup_time(js_engine, fuzzjs, runs=STARTUP_MEASUREMENT_RUNS):
+    """Measure the time a js shell takes to start jsfunfuzz, i.e. to parse it and run a single iteration.
+
+    Args:
+        js_engine (Path): Path to the js shell
+        fuzzjs (Path): Path to the jsfunfuzz file
+        runs (int): Number of launches to measure
+
+    Returns:
+        float: Median time taken by a launch, in seconds
+    """
+    times = []
+    for _ in range(runs):
+        runinfo = shell_runner.timed_run([js_engine, "-e", "maxRunTime=1", "-f", fuzzjs], 60)
+        runinfo.close()
+        times.append(runinfo.elapsedtime)
+    return statistics.median(times)
+
+
+def report_startup_times(js_engine, repo, wtmp_dir):
+    """Report the startup time of jsfunfuzz, and the time taken to spawn the js shell.
+
+    The startup time is measured with the list of regression tests inlined, then read from a file. The spawn latency is
+    measured with resource limits set by prlimit, then from a preexec_fn.
+
+    Args:
+        js_engine (Path): Path to the js shell
+        repo (Path): Path to the repository
+        wtmp_dir (Path): Path to the wtmp directory
+    """
+    fuzzjs = wtmp_dir / "jsfunfuzz-startup.js"
+    for inline_test_list, mode in ((True, "inlined"), (False, "read from a file")):
+        link_fuzzer.link_fuzzer(fuzzjs, makeRegressionTestPrologue(repo, inline_test_list=inline_test_list))
+        print(f"jsfunfuzz startup time with the regression test list {mode}: "
+              f"{measure_startup_time(js_engine, fuzzjs) * 1000:.0f}ms per launch")
+    fuzzjs.unlink()
+
+    latency = shell_runner.measure_spawn_latency([js_engine, "-e", "quit()"], js_interesting.shell_rlimits())
+    print(f"js shell spawn latency: {latency['prlimit'] * 1000:.2f}ms with resource limits set by prlimit, "
+          f"{latency['preexec_fn'] * 1000:.2f}ms with a preexec_fn")
+
+
+class IterationContext:  # pylint: disable=too-few-public-methods
+    """State built once per many_timed_runs worker and reused by all of its iterations.
 
+    Only the engine flags and the log prefix change from one iteration to the next, so the js_interesting options
+    (including the resolved shell path, its build configuration, its ProgramConfiguration and the collector with its
+    loaded signature cache) are only set up once.
 
-def jsFilesIn(repoPathLength, root):  # pylint: disable=invalid-name,missing-docstring,missing-return-doc
-    # pylint: disable=missing-return-type-doc
-    return [os.path.join(path, filename)[repoPathLength + 1:]
-            for path, _dirs, files in os.walk(str(root))
-            for filename in files
-            if filename.endswith(".js")]
+    Args:
+        options (object): Options for loop.py
+        fuzzjs (Path): Path to the jsfunfuzz file
+        collector (object): Collector object for FuzzManager submission
+    """
+    def __init__(self, options, fuzzjs, collector):
+        self.options = options
+        self.fuzzjs = fuzzjs
+
+        js_interesting_args = []
+        js_interesting_args.append(f"--timeout={options.timeout}")
+        if options.valgrind:
+            js_interesting_args.append("--valgrind")
+        js_interesting_args.append(str(options.knownPath))
+        js_interesting_args.append(str(options.jsEngine))
+        js_interesting_args.extend(["-f", fuzzjs])
+        self.js_interesting_opts = js_interesting.parseOptions(js_interesting_args, collector=collector)
+
+    def js_interesting_opts_for(self, engine_flags, timeout=None, max_run_time=None):
+        """Retrieve the js_interesting options to run jsfunfuzz with a set of engine flags.
+
+        Args:
+            engine_flags (list): Flags to pass to the js shell
+            timeout (int): Timeout in seconds, defaults to the one of loop.py
+            max_run_time (int): Time in milliseconds after which jsfunfuzz stops, defaults to half the timeout
+
+        Returns:
+            object: A shallow copy of the js_interesting options with the command line of this iteration
+        """
+        timeout = timeout or self.options.timeout
+        max_run_time = max_run_time or timeout * (1000 // 2)
+        js_interesting_opts = copy.copy(self.js_interesting_opts)
+        js_interesting_opts.timeout = timeout
+        # pylint: disable=no-member
+        prologue = f"maxRunTime={max_run_time}"
+        if self.options.ring_buffer_size:
+            prologue += f"; {ring_buffer.shell_args(self.options.ring_buffer_size, timeout)}"
+        js_interesting_opts.jsengineWithArgs = ([self.js_interesting_opts.jsengine] + list(engine_flags) +
+                                                ["-e", prologue,
+                                                 "-f", self.js_interesting_opts.jsengineWithArgs[-1]])
+        return js_interesting_opts
+
+
+@lru_cache(maxsize=None)
+def linked_fuzzer(repo):
+    """Retrieve the linked jsfunfuzz file for a repository, linking it only once per process.
 
+    bot calls this before forking its workers, so they find the file without linking jsfunfuzz again.
+
+    Args:
+        repo (Path): Path to the repository, whose regression tests jsfunfuzz loads if it exists
+
+    Returns:
+        Path: Path to the jsfunfuzz file
+    """
+    regressionTestPrologue = makeRegressionTestPrologue(repo) if repo.is_dir() else ""  # pylint: disable=invalid-name
+    return link_fuzzer.cached_link_fuzzer(
+        sm_compile_helpers.ensure_cache_dir(None) / link_fuzzer.LINKED_FUZZER_DIRNAME, regressionTestPrologue)
+
+
+def prepare_fuzzer(options, wtmp_dir):
+    """Retrieve the linked jsfunfuzz file of the worker, reporting startup measurements first if requested.
+
+    Args:
+        options (object): Options for loop.py
+        wtmp_dir (Path): Path to the wtmp directory
+
+    Returns:
+        Path: Path to the jsfunfuzz file
+    """
+    if options.repo.is_dir() and options.measure_startup:
+        report_startup_times(options.jsEngine, options.repo, wtmp_dir)
+
+    fuzzjs = linked_fuzzer(options.repo)
+    assert fuzzjs.is_file()
+    if options.measure_startup:
+        savings = bytecode_cache.startup_savings(options.jsEngine, fuzzjs)
+        if savings["supported"]:
+            print(f"Loading jsfunfuzz as bytecode takes {savings['bytecode_ms']:.1f}ms instead of "
+                  f"{savings['source_ms']:.1f}ms from source, per launch")
+        else:
+            print("This js shell does not support bytecode caching, jsfunfuzz is loaded from source")
+    return fuzzjs
 
-def many_timed_runs(target_time, wtmp_dir, args, collector, ccoverage):
+
+def make_trackers(options, wtmp_dir):
+    """Create what keeps track of the outcome of runs: the timeout tuner, the statistics and the flag scheduler.
+
+    Args:
+        options (object): Options for loop.py
+        wtmp_dir (Path): Path to the wtmp directory, where the stats file is written
+
+    Returns:
+        tuple: TimeoutTuner or None, started WorkerStats, and FlagScheduler or None
+    """
+    tuner = None
+    if options.adaptive_timeout:
+        tuner = timeout_tuner.TimeoutTuner(options.jsEngine, options.timeout, options.min_timeout, options.max_timeout)
+    stats = worker_stats.WorkerStats(
+        wtmp_dir / worker_stats.STATS_FILENAME, level_names=js_interesting.JS_LEVEL_NAMES,
+        report_address=(stats_aggregator.STATS_HOST, options.stats_port) if options.stats_port else None,
+        build=options.jsEngine.stem)
+    stats.start()
+    scheduler = None
+    if options.randomFlags and options.flag_scheduler:
+        scheduler = flag_scheduler.FlagScheduler(
+            sm_compile_helpers.ensure_cache_dir(None) / flag_scheduler.FLAG_SCHEDULER_FILENAME)
+    return tuner, stats, scheduler
+
+
+def many_timed_runs(target_time, wtmp_dir, args, collector, ccoverage, drain_file=None, heartbeat_file=None,
+                    deadline=None):
     """As long as the run length duration is less than target_time, the harness will run the fuzzers in a loop.
 
     Args:
@@ -135,46 +351,41 @@ def many_timed_runs(target_time, wtmp_dir, args, collector, ccoverage):
         args (list): Extra arguments
         collector (object): Collector object for FuzzManager submission
         ccoverage (bool): Whether we are running in coverage gathering mode
+        drain_file (Path): File whose existence asks the harness to stop after the current iteration, if specified
+        heartbeat_file (Path): File touched at every iteration, to show the harness is not hung, if specified
+        deadline (float): Time at which the harness stops, instead of target_time after it starts, if specified
     """
-    # pylint: disable=too-complex,too-many-branches,too-many-locals,too-many-statements
+    # pylint: disable=too-complex,too-many-arguments,too-many-branches,too-many-locals,too-many-statements
     options = parseOpts(args)
-    startTime = time.time()  # pylint: disable=invalid-name
-
-    if options.repo.is_dir():
-        regressionTestPrologue = makeRegressionTestPrologue(options.repo)  # pylint: disable=invalid-name
-    else:
-        regressionTestPrologue = ""  # pylint: disable=invalid-name
+    if deadline is None and target_time:
+        deadline = time.time() + target_time
 
-    fuzzjs = wtmp_dir / "jsfunfuzz.js"
-
-    link_fuzzer.link_fuzzer(fuzzjs, regressionTestPrologue)
-    assert fuzzjs.is_file()
+    fuzzjs = prepare_fuzzer(options, wtmp_dir)
+    iteration_context = IterationContext(options, fuzzjs, collector)
+    scratch = scratch_space.ScratchSpace(wtmp_dir)
+    tuner, stats, scheduler = make_trackers(options, wtmp_dir)
 
     iteration = 0
     while True:
-        if target_time and time.time() > startTime + target_time:
-            print("Out of time!")
-            fuzzjs.unlink()
-            if not os.listdir(str(wtmp_dir)):
-                wtmp_dir.rmdir()
+        if heartbeat_file is not None:
+            heartbeat_file.touch()
+        retired = drain_file is not None and drain_file.exists()
+        if retired or (deadline is not None and time.time() > deadline):
+            print("Retired to free up memory!" if retired else "Out of time!")
+            wrap_up(wtmp_dir, scratch, stats, scheduler)
             break
 
         # Construct command needed to loop jsfunfuzz fuzzing.
-        js_interesting_args = []
-        js_interesting_args.append(f"--timeout={options.timeout}")
-        if options.valgrind:
-            js_interesting_args.append("--valgrind")
-        js_interesting_args.append(str(options.knownPath))
-        js_interesting_args.append(str(options.jsEngine))
         if options.randomFlags:
-            options.engineFlags = shell_flags.random_flag_set(options.jsEngine)  # pylint: disable=invalid-name
-            js_interesting_args.extend(options.engineFlags)
-        js_interesting_args.extend(["-e", f"maxRunTime={options.timeout * (1000 // 2)}"])
-        js_interesting_args.extend(["-f", fuzzjs])
-        js_interesting_opts = js_interesting.parseOptions(js_interesting_args)
+            options.engineFlags = shell_flags.random_flag_set(  # pylint: disable=invalid-name
+                options.jsEngine, scheduler)
+        engine_flags = options.engineFlags if options.randomFlags else []
+        timeout, max_run_time = tuner.values_for(engine_flags) if tuner else (None, None)
+        js_interesting_opts = iteration_context.js_interesting_opts_for(engine_flags, timeout, max_run_time)
 
         iteration += 1
-        log_prefix = wtmp_dir / f"w{iteration}"  # pylint: disable=invalid-name
+        iteration_dir = scratch.iteration_dir(iteration)
+        log_prefix = iteration_dir / f"w{iteration}"  # pylint: disable=invalid-name
 
         env = {}  # default environment will be used
         if ccoverage:
@@ -183,35 +394,80 @@ def many_timed_runs(target_time, wtmp_dir, args, collector, ccoverage):
             assert "cov-build" in str(cov_build_path)
             env["GCOV_PREFIX"] = str(cov_build_path)
 
-        res, out_log = run_to_report(options, js_interesting_opts, env, log_prefix,
-                                     fuzzjs, ccoverage, collector, target_time)
+        res, _out_log = run_to_report(options, js_interesting_opts, env, log_prefix,
+                                      fuzzjs, ccoverage, collector, target_time, stats, heartbeat_file=heartbeat_file)
+        for stage, seconds in res.timings.items():
+            stats.add_time(stage, seconds)
+        is_interesting = res.lev != js_interesting.JS_FINE
+        timed_out = res.runinfo.sta == shell_runner.TIMED_OUT or (
+            bool(options.ring_buffer_size) and ring_buffer.soft_timed_out(res.out))
+        oomed = js_interesting.oomed(res.err)
+        iterations = seed_replay.count_iterations(res.out)
+        if tuner:
+            tuner.record(engine_flags, res.runinfo.elapsedtime, timed_out, oomed, iterations)
+        if scheduler:
+            scheduler.record(engine_flags, res.lev, res.runinfo.elapsedtime, timed_out, oomed, iterations)
 
         # funbind - integrate with binaryen wasm project but only on Linux
-        if platform.system() == "Linux" and out_log.is_file():
-            run_to_report_wasm(options, js_interesting_opts, env, log_prefix,
-                               out_log, ccoverage, collector, target_time)
+        if platform.system() == "Linux":
+            with stats.stage("wasm"):
+                is_interesting = run_to_report_wasm(options, js_interesting_opts, env, log_prefix,
+                                                    res.out, ccoverage, collector, target_time) or is_interesting
 
         # compare_jit integration
         are_flags_deterministic = "--dump-bytecode" not in options.engineFlags and "-D" not in options.engineFlags
         # pylint: disable=no-member
         if options.use_compare_jit and res.lev == js_interesting.JS_FINE and \
                 js_interesting_opts.shellIsDeterministic and are_flags_deterministic:
-            cj_out_log = (log_prefix.parent / f"{log_prefix.stem}-out").with_suffix(".txt")
-            linesToCompare = jitCompareLines(cj_out_log, "/*FCM*/")  # pylint: disable=invalid-name
+            linesToCompare = jitCompareLines(res.out, "/*FCM*/")  # pylint: disable=invalid-name
             cj_testcase = (log_prefix.parent / f"{log_prefix.stem}-cj-in").with_suffix(".js")
             with io.open(str(cj_testcase), "w", encoding="utf-8", errors="replace") as f:
                 f.writelines(linesToCompare)
-            compare_jit.compare_jit(options.jsEngine, options.engineFlags, cj_testcase,
-                                    log_prefix.parent / f"{log_prefix.stem}-cj", options.repo,
-                                    options.build_options_str, target_time, js_interesting_opts, ccoverage)
+            with stats.stage("compare_jit"):
+                is_interesting = compare_jit.compare_jit(
+                    options.jsEngine, options.engineFlags, cj_testcase,
+                    log_prefix.parent / f"{log_prefix.stem}-cj", options.repo, options.build_options_str, target_time,
+                    js_interesting_opts, ccoverage, jobs=options.compare_jit_jobs,
+                    heartbeat_file=heartbeat_file) or is_interesting
 
             if cj_testcase.is_file():
                 cj_testcase.unlink()
 
-        file_system_helpers.delete_logs(log_prefix)
+        stats.record_run(res.lev, timed_out, oomed, is_interesting, res.rusage)
+
+        # Only interesting iterations leave anything behind in the wtmp directory
+        with stats.stage("cleanup"):
+            if is_interesting:
+                file_system_helpers.delete_logs(log_prefix)
+                scratch.persist(iteration_dir)
+            scratch.clear(iteration_dir)
+
 
+def wrap_up(wtmp_dir, scratch, stats, scheduler):
+    """Clean up after a worker once it stops fuzzing.
 
-def run_to_report(options, js_interesting_opts, env, log_prefix, fuzzjs, ccoverage, collector, target_time):
+    Args:
+        wtmp_dir (Path): Path to the wtmp directory, removed if nothing interesting was left in it
+        scratch (ScratchSpace): Scratch space of the iterations
+        stats (WorkerStats): Statistics of the worker
+        scheduler (FlagScheduler): Scheduler of the random flags, if any
+    """
+    scratch.cleanup()
+    # The stats file is only meant to be watched while the worker runs, so report it in the log instead
+    stats.close()
+    for key, value in stats.snapshot().items():
+        print(f"{key:<24}: {value}")
+    stats_file = wtmp_dir / worker_stats.STATS_FILENAME
+    if stats_file.is_file():  # Absent if it could not be written
+        stats_file.unlink()
+    if scheduler:
+        scheduler.sync()
+    if not os.listdir(str(wtmp_dir)):
+        wtmp_dir.rmdir()
+
+
+def run_to_report(options, js_interesting_opts, env, log_prefix, fuzzjs, ccoverage, collector, target_time, stats,
+                  runinfo=None, heartbeat_file=None):
     """Runs the js shell with testcases and report them to FuzzManager if they are interesting.
 
     Args:
@@ -223,15 +479,20 @@ def run_to_report(options, js_interesting_opts, env, log_prefix, fuzzjs, ccovera
         ccoverage (bool): Whether we are running in coverage gathering mode
         collector (object): Collector object for FuzzManager submission
         target_time (int): Target time the harness runs before restarting
+        stats (WorkerStats): Statistics of the worker
+        runinfo (RunResult): Results of a run of the js shell made by the caller, to be classified instead of running it
+        heartbeat_file (Path): File kept touched while Lithium and autobisectjs run, if specified
 
     Returns:
         Tuple: Returns a tuple of the results object, Path to the stdout and stderr logs, and Path to the
                reduced testcase
     """
-    # pylint: disable=too-many-arguments,too-many-locals
+    # pylint: disable=too-complex,too-many-arguments,too-many-locals,too-many-statements
+    # The -out and -err logs are only written if the run is interesting
     res = js_interesting.ShellResult(js_interesting_opts,
                                      # pylint: disable=no-member
-                                     js_interesting_opts.jsengineWithArgs, log_prefix, False, env=env)
+                                     js_interesting_opts.jsengineWithArgs, log_prefix, False, env=env,
+                                     in_memory=True, runinfo=runinfo)
 
     out_log = (log_prefix.parent / f"{log_prefix.stem}-out").with_suffix(".txt")
     err_log = (log_prefix.parent / f"{log_prefix.stem}-err").with_suffix(".txt")
@@ -241,17 +502,27 @@ def run_to_report(options, js_interesting_opts, env, log_prefix, fuzzjs, ccovera
         showtail(out_log)
         showtail(err_log)
 
-        # splice jsfunfuzz.js with `grep "/*FRC-" wN-out`
-        [before, after] = file_manipulation.fuzzSplice(fuzzjs)
+        out_lines = full_out_lines(options, js_interesting_opts, env, log_prefix, res)
+        if out_lines is None:
+            print(f"Not reporting {log_prefix}, as its testcase could not be regenerated")
+            return res, out_log
 
-        with io.open(str(out_log), "r", encoding="utf-8", errors="replace") as f:
-            newfileLines = before + [  # pylint: disable=invalid-name
-                l.replace("/*FRC-", "/*") for l in file_manipulation.linesStartingWith(f, "/*FRC-")] + after
+        # splice jsfunfuzz.js with `grep "/*FRC-" wN-out`
+        newfileLines = link_fuzzer.splice_testcase(fuzzjs, out_lines)  # pylint: disable=invalid-name
         orig_log = (log_prefix.parent / f"{log_prefix.stem}-orig").with_suffix(".js")
         with io.open(str(orig_log), "w", encoding="utf-8", errors="replace") as f:
             f.writelines(newfileLines)
         with io.open(str(reduced_log), "w", encoding="utf-8", errors="replace") as f:
             f.writelines(newfileLines)
+        record = None
+        if options.record_seeds or options.seed_bisect:
+            # Drop the js shell, then the -e and -f arguments added by IterationContext
+            # pylint: disable=no-member
+            record = seed_replay.make_record(options.jsEngine, js_interesting_opts.jsengineWithArgs[1:-4], fuzzjs,
+                                             out_lines, res.lev)
+        if options.record_seeds and record:
+            seed_replay.write_record((log_prefix.parent / f"{log_prefix.stem}-seed").with_suffix(".json"), record)
+            orig_log.unlink()
 
         if not ccoverage:
             # Run Lithium and autobisectjs (make a reduced testcase and find a regression window)
@@ -262,9 +533,13 @@ def run_to_report(options, js_interesting_opts, env, log_prefix, fuzzjs, ccovera
             itest.append(f"--minlevel={res.lev}")
             itest.append(f"--timeout={options.timeout}")
             itest.append(options.knownPath)
-            (lith_result, _lith_details, autobisect_log) = lithium_helpers.pinpoint(
-                itest, log_prefix, options.jsEngine, options.engineFlags, reduced_log, options.repo,
-                options.build_options_str, target_time, res.lev)
+            if options.seed_bisect and record:
+                with stats.stage("seed_bisect"):
+                    seed_bisect(js_interesting_opts, env, log_prefix, fuzzjs, record, res.lev, reduced_log)
+            with stats.stage("lithium"), supervisor.keep_beating(heartbeat_file):
+                (lith_result, _lith_details, autobisect_log) = lithium_helpers.pinpoint(
+                    itest, log_prefix, options.jsEngine, options.engineFlags, reduced_log, options.repo,
+                    options.build_options_str, target_time, res.lev)
 
             # Upload with final output
             if lith_result == lithium_helpers.LITH_FINISHED:
@@ -293,44 +568,120 @@ def run_to_report(options, js_interesting_opts, env, log_prefix, fuzzjs, ccovera
     return res, out_log
 
 
-def run_to_report_wasm(_options, js_interesting_opts, env, log_prefix, out_log, ccoverage, collector, _target_time):
+def full_out_lines(options, js_interesting_opts, env, log_prefix, res):
+    """Retrieve the lines printed by jsfunfuzz in an interesting run, to splice its testcase from.
+
+    In low-output mode, a run that crashed or asserted could not print its ring buffer, so it is replayed from its seed
+    without the ring buffer to regenerate the lines.
+
+    Args:
+        options (object): Options for loop.py
+        js_interesting_opts (function): Options for js_interesting.py
+        env (dict): Environment to be run in
+        log_prefix (Path): Prefix of the logs of the run
+        res (ShellResult): Result of the run
+
+    Returns:
+        list: Lines printed by jsfunfuzz, or None if they were lost and the replay does not reach the level of the run
+    """
+    if not options.ring_buffer_size:
+        return res.out
+    replay_cmd = ring_buffer.replay_cmd(js_interesting_opts.jsengineWithArgs, res.out)  # pylint: disable=no-member
+    if not replay_cmd:
+        return res.out
+    replay_prefix = log_prefix.parent / f"{log_prefix.stem}-replay"
+    replay_res = js_interesting.ShellResult(js_interesting_opts, replay_cmd, replay_prefix, False, env=env,
+                                            in_memory=True)
+    file_system_helpers.delete_logs(replay_prefix)
+    print(f"Replaying {log_prefix} without the ring buffer reached level {replay_res.lev} instead of {res.lev}")
+    return replay_res.out if replay_res.lev >= res.lev else None
+
+
+def seed_bisect(js_interesting_opts, env, log_prefix, fuzzjs, record, level, reduced_log):
+    """Shorten the testcase of an interesting run by replaying its seed with as few iterations as possible.
+
+    Args:
+        js_interesting_opts (function): Options for js_interesting.py
+        env (dict): Environment to be run in
+        log_prefix (Path): Prefix of the logs of the run
+        fuzzjs (Path): Path to the jsfunfuzz file
+        record (dict): Record of the run, as created by seed_replay
+        level (int): Level reached by the run
+        reduced_log (Path): Path to the testcase to be handed to Lithium, overwritten if it could be shortened
+    """
+    # pylint: disable=too-many-arguments
+    bisect_prefix = log_prefix.parent / f"{log_prefix.stem}-bisect"
+
+    def reproduces(cmd):
+        """Check if a replay reaches the level of the run.
+
+        Args:
+            cmd (list): Replay command
+
+        Returns:
+            tuple: Whether the replay reproduces the issue, and the lines it printed
+        """
+        step_res = js_interesting.ShellResult(js_interesting_opts, cmd, bisect_prefix, False, env=env, in_memory=True)
+        file_system_helpers.delete_logs(bisect_prefix)
+        return step_res.lev >= level, step_res.out
+
+    iterations, out_lines, step_times = seed_replay.bisect_iterations(record, reproduces)
+    print(f"Seed bisection: {record['iterations']} -> {iterations} iterations in {len(step_times)} replays "
+          f"({', '.join(f'{x:.1f}s' for x in step_times)})")
+    if out_lines:
+        with io.open(str(reduced_log), "w", encoding="utf-8", errors="replace") as f:
+            f.writelines(link_fuzzer.splice_testcase(fuzzjs, out_lines))
+
+
+def run_to_report_wasm(_options, js_interesting_opts, env, log_prefix, out_lines, ccoverage, collector, _target_time):
     """Runs the js shell with wasm testcases and report them to FuzzManager if they are interesting.
 
+    The output of the jsfunfuzz run is only written to the iteration directory, as the seed file binaryen needs, once it
+    is known that the wasm testcase can be run.
+
     Args:
         _options (function): Options for loop.py
         js_interesting_opts (function): Options for js_interesting.py
         env (dict): Environment to be run in
         log_prefix (str): log_prefix'es
-        out_log (Path): Path to the jsfunfuzz w*-out log file to act as the seed
+        out_lines (list): Lines printed by jsfunfuzz, to act as the seed
         ccoverage (bool): Whether we are running in coverage gathering mode
         collector (object): Collector object for FuzzManager submission
         _target_time (int): Target time the harness runs before restarting
+
+    Returns:
+        bool: True if the wasm testcase is interesting, False otherwise
     """
-    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments,too-many-locals
+    seed_file = (log_prefix.parent / f"{log_prefix.stem}-out").with_suffix(".binaryen-seed")
     log_prefix = (log_prefix.parent / f"{log_prefix.stem}-wasm")
 
-    # Use the generated out_log as the seed for binaryen
-    wrapper_file, wasm_file = with_binaryen.wasmopt_run(out_log)
-    # pylint: disable=no-member
-    # We remove the last two entries of jsengineWithArgs (-f and the original filename)
-    # wasm files need to have -f absent
-    js_interesting_opts.jsengineWithArgs = js_interesting_opts.jsengineWithArgs[:-2] + [str(wrapper_file),
-                                                                                        str(wasm_file)]
     # Ensure ion flags such as --execute="setJitCompilerOption(\"ion.forceinlineCaches\",1)" are not executed
     # for wasm files
     execute_ion_flags_in_shell = False
+    # pylint: disable=no-member
     for runtime_flag in js_interesting_opts.jsengineWithArgs:
         if "--execute=" in str(runtime_flag) and "ion." in str(runtime_flag):
             execute_ion_flags_in_shell = True
-    if ("--no-wasm-ion" in js_interesting_opts.jsengineWithArgs and
-            "--no-wasm-baseline" in js_interesting_opts.jsengineWithArgs):
-        # WebAssembly object will not be present if either of these flags are not removed
-        js_interesting_opts.jsengineWithArgs.remove("--no-wasm-ion")
 
     if not execute_ion_flags_in_shell:
+        # Use the output of jsfunfuzz as the seed for binaryen
+        with io.open(str(seed_file), "w", encoding="utf-8", errors="replace") as f:
+            f.writelines(out_lines)
+        wrapper_file, wasm_file = with_binaryen.wasmopt_run(seed_file)
+        # We remove the last two entries of jsengineWithArgs (-f and the original filename)
+        # wasm files need to have -f absent
+        js_interesting_opts.jsengineWithArgs = js_interesting_opts.jsengineWithArgs[:-2] + [str(wrapper_file),
+                                                                                            str(wasm_file)]
+        if ("--no-wasm-ion" in js_interesting_opts.jsengineWithArgs and
+                "--no-wasm-baseline" in js_interesting_opts.jsengineWithArgs):
+            # WebAssembly object will not be present if either of these flags are not removed
+            js_interesting_opts.jsengineWithArgs.remove("--no-wasm-ion")
+
         res = js_interesting.ShellResult(js_interesting_opts,
                                          # pylint: disable=no-member
-                                         js_interesting_opts.jsengineWithArgs, log_prefix, False, env=env)
+                                         js_interesting_opts.jsengineWithArgs, log_prefix, False, env=env,
+                                         in_memory=True)
 
         if res.lev >= js_interesting.JS_OVERALL_MISMATCH:
             wasm_out_log = (log_prefix.parent / f"{log_prefix.stem}-out").with_suffix(".txt")
@@ -342,7 +693,7 @@ def run_to_report_wasm(_options, js_interesting_opts, env, log_prefix, out_log,
             assert wrapper_file.is_file()
             result_zip = log_prefix.parent / "reduced.zip"
             with zipfile.ZipFile(result_zip, "w") as f:
-                f.write(out_log, f"{out_log.name}-binaryen-v{with_binaryen.BINARYEN_VERSION}-seed",
+                f.write(seed_file, f"{seed_file.stem}.txt-binaryen-v{with_binaryen.BINARYEN_VERSION}-seed",
                         compress_type=zipfile.ZIP_DEFLATED)
                 f.write(wrapper_file, wrapper_file.name, compress_type=zipfile.ZIP_DEFLATED)
                 f.write(wasm_file, wasm_file.name, compress_type=zipfile.ZIP_DEFLATED)
@@ -351,10 +702,17 @@ def run_to_report_wasm(_options, js_interesting_opts, env, log_prefix, out_log,
                 collector.submit(res.crashInfo, str(result_zip), 10, metaData={})  # Quality is 10, metaData {}
                 print(f"Submitted {result_zip}")
 
+        return res.lev != js_interesting.JS_FINE
+
+    return False
+
 
-def jitCompareLines(jsfunfuzzOutputFilename, marker):  # pylint: disable=invalid-name,missing-param-doc
+def jitCompareLines(jsfunfuzzOutput, marker):  # pylint: disable=invalid-name,missing-param-doc
     # pylint: disable=missing-return-doc,missing-return-type-doc,missing-type-doc
-    """Create a compare_jit file, using the lines marked by jsfunfuzz as valid for comparison."""
+    """Create a compare_jit file, using the lines marked by jsfunfuzz as valid for comparison.
+
+    jsfunfuzzOutput is either the path to the jsfunfuzz output log or its lines, if they are already in memory.
+    """
     lines = [
         "addMarkObservers = function() { };\n",
         "backtrace = function() { };\n",
@@ -377,15 +735,19 @@ def jitCompareLines(jsfunfuzzOutputFilename, marker):  # pylint: disable=invalid
         "wasmIsSupported = function() { return true; };\n",
         "// DDBEGIN\n",
     ]
-    with io.open(str(jsfunfuzzOutputFilename), "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            if line.startswith(marker):
-                sline = line[len(marker):]
-                # We only override wasmIsSupported above for the main global.
-                # Hopefully, any imported tests that try to use wasmIsSupported within a newGlobal
-                # will do so in a straightforward way where everything is on one line.
-                if not ("newGlobal" in sline and "wasmIsSupported" in sline):
-                    lines.append(sline)
+    if isinstance(jsfunfuzzOutput, Path):
+        with io.open(str(jsfunfuzzOutput), "r", encoding="utf-8", errors="replace") as f:
+            output_lines = f.readlines()
+    else:
+        output_lines = jsfunfuzzOutput
+    for line in output_lines:
+        if line.startswith(marker):
+            sline = line[len(marker):]
+            # We only override wasmIsSupported above for the main global.
+            # Hopefully, any imported tests that try to use wasmIsSupported within a newGlobal
+            # will do so in a straightforward way where everything is on one line.
+            if not ("newGlobal" in sline and "wasmIsSupported" in sline):
+                lines.append(sline)
     lines += [
         "\ntry{print(uneval(this));}catch(e){}\n",
         "// DDEND\n",
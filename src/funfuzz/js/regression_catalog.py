@@ -0,0 +1,168 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Keeps a catalog of the in-tree regression tests that jsfunfuzz may use, so workers do not walk the repository.
+
+The catalog of a repository is stored in the shell-cache directory along with the revision it describes. When the
+repository moves to another revision, only the paths that Mercurial reports as changed since then are updated. Each
+test is listed once, with its size. The paths are also written one per line to a list
+file next to the catalog, which jsfunfuzz reads only once it picks a regression test. The list file is named after a
+hash of its contents and never rewritten, so a run replayed from its seed picks the same tests as the original run did,
+even after the repository moved to another revision.
+"""
+
+import io
+import json
+import os
+from pathlib import Path
+
+from . import link_fuzzer
+from ..util import file_system_helpers
+from ..util import hg_helpers
+from ..util import sm_compile_helpers
+
+CATALOG_DIRNAME = "regression-catalogs"
+REGRESSION_TEST_DIRS = [
+    Path("js") / "src" / "jit-test" / "tests",
+    Path("js") / "src" / "tests",  # Also holds the non262 and test262 tests
+    Path("testing") / "web-platform" / "tests" / "streams",
+]
+
+
+def is_regression_test(rel_path):
+    """Check if a path is one of the regression tests jsfunfuzz may use.
+
+    Args:
+        rel_path (str): Path relative to the root of the repository, with forward slashes
+
+    Returns:
+        bool: True if the path is a js file in one of the regression test directories, False otherwise
+    """
+    return rel_path.endswith(".js") and any(rel_path.startswith(f"{x.as_posix()}/") for x in REGRESSION_TEST_DIRS)
+
+
+class RegressionCatalog:
+    """Catalog of the regression tests of a repository.
+
+    Args:
+        repo (Path): Path to the repository
+        catalog_file (Path): Path to the file the catalog is stored in
+    """
+    def __init__(self, repo, catalog_file):
+        self.repo = repo
+        self.catalog_file = catalog_file
+        self.revision = None
+        self.tests = {}
+        try:
+            with io.open(str(catalog_file), "r", encoding="utf-8", errors="replace") as f:
+                contents = json.load(f)
+            self.revision = contents["revision"]
+            self.tests = contents["tests"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    @classmethod
+    def for_repo(cls, repo):
+        """Retrieve the up-to-date catalog of a repository.
+
+        Args:
+            repo (Path): Path to the repository
+
+        Returns:
+            RegressionCatalog: Catalog of the regression tests of the repository
+        """
+        catalog_dir = sm_compile_helpers.ensure_cache_dir(None) / CATALOG_DIRNAME
+        catalog_dir.mkdir(exist_ok=True)
+        catalog = cls(repo, catalog_dir / f"{repo.name}.json")
+        catalog.update(hg_helpers.get_working_dir_hash(repo))
+        return catalog
+
+    @property
+    def list_file(self):
+        """Path: Path to the list file holding the current paths, named after the hash of its contents."""
+        contents = self.list_contents().encode("utf-8")
+        return self.catalog_file.parent / f"{self.catalog_file.stem}-{link_fuzzer.content_hash(contents)}.txt"
+
+    def entry_for(self, rel_path):
+        """Create the catalog entry of a test from the file in the repository.
+
+        Args:
+            rel_path (str): Path of the test relative to the root of the repository, with forward slashes
+
+        Returns:
+            dict: Size of the test
+        """
+        return {"size": (self.repo / rel_path).stat().st_size}
+
+    def scan(self):
+        """Rebuild the catalog by walking the regression test directories."""
+        tests = {}
+        for test_dir in REGRESSION_TEST_DIRS:
+            for path, _dirs, files in os.walk(str(self.repo / test_dir)):
+                for filename in files:
+                    rel_path = Path(path, filename).relative_to(self.repo).as_posix()
+                    if is_regression_test(rel_path):
+                        tests[rel_path] = self.entry_for(rel_path)
+        self.tests = tests
+
+    def apply_changes(self, changed_paths):
+        """Update the catalog with the paths that changed in the repository.
+
+        Args:
+            changed_paths (dict): Paths relative to the root of the repository, with forward slashes, mapped to True if
+                                  they were added or modified and False if they were removed
+        """
+        for rel_path, exists in changed_paths.items():
+            if not is_regression_test(rel_path):
+                continue
+            if exists and (self.repo / rel_path).is_file():
+                self.tests[rel_path] = self.entry_for(rel_path)
+            else:
+                self.tests.pop(rel_path, None)
+
+    def update(self, revision):
+        """Bring the catalog up to date with a revision of the repository, incrementally if possible.
+
+        Args:
+            revision (str): Changeset hash the repository is at, or None if unknown
+        """
+        if revision and revision == self.revision and self.list_file.is_file():
+            return
+        changed_paths = None
+        if revision and self.revision:
+            changed_paths = hg_helpers.get_changed_paths(self.repo, self.revision, REGRESSION_TEST_DIRS)
+        if changed_paths is None:
+            self.scan()
+        else:
+            self.apply_changes(changed_paths)
+        self.revision = revision
+        self.save()
+
+    def save(self):
+        """Store the catalog and the list file, unless the shell-cache directory is not writable."""
+        try:
+            if not self.list_file.is_file():  # Content-addressed, so an existing file already has these contents
+                file_system_helpers.atomic_write(self.list_file, self.list_contents())
+            file_system_helpers.atomic_write(
+                self.catalog_file, json.dumps({"revision": self.revision, "tests": self.tests}, sort_keys=True))
+        except OSError as ex:
+            print(f"Unable to store the regression test catalog in {self.catalog_file}: {ex}")
+
+    def list_contents(self):
+        """Retrieve the contents of the list file.
+
+        Returns:
+            str: Paths of all regression tests, one per line
+        """
+        return "".join(f"{x}\n" for x in self.paths())
+
+    def paths(self):
+        """Retrieve the paths of all regression tests.
+
+        Returns:
+            list: Paths relative to the root of the repository, with the separators of the platform
+        """
+        return sorted(str(Path(x)) for x in self.tests)
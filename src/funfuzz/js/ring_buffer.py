@@ -0,0 +1,86 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Understands the output of jsfunfuzz in its low-output mode, see jsfunfuzz/ring-buffer.js.
+
+In this mode, jsfunfuzz only prints the last lines it generated when it stops, so the FRC and FCM lines that loop uses
+are the same as usual, but there are far fewer of them. They follow a marker line saying why jsfunfuzz stopped and how
+many lines it dropped. jsfunfuzz also stops by itself shortly before the timeout, so the lines are not lost when the
+shell would otherwise have been killed. They are still lost when the shell crashes or asserts, in which case the run is
+replayed from its seed without the ring buffer to regenerate them.
+"""
+
+import re
+
+from . import seed_replay
+
+MARKER_RE = re.compile(r"^/\*RING-(?P<reason>[a-z]+)-dropped-(?P<dropped>\d+)\*/$")
+SOFT_TIMEOUT_MARGIN = 2  # seconds before the timeout at which jsfunfuzz stops by itself
+TIMEOUT_REASON = "timeout"
+SHELL_ARGS_RE = re.compile(r"(; )?ringBufferSize=\d+; ringBufferTimeout=\d+;")
+
+
+def shell_args(size, timeout):
+    """Retrieve the arguments that turn on the low-output mode of jsfunfuzz.
+
+    Args:
+        size (int): Number of lines kept by jsfunfuzz
+        timeout (int): Timeout in seconds after which the harness kills the js shell
+
+    Returns:
+        str: Statements to be run by the js shell before jsfunfuzz, e.g. with -e
+    """
+    return f"ringBufferSize={size}; ringBufferTimeout={max(timeout - SOFT_TIMEOUT_MARGIN, 1)};"
+
+
+def parse_marker(lines):
+    """Find the marker printed by jsfunfuzz when it stops in low-output mode.
+
+    Args:
+        lines (list): Lines printed by jsfunfuzz
+
+    Returns:
+        tuple: Reason why jsfunfuzz stopped, e.g. "exit", "bug", "confused" or "timeout", and number of lines dropped,
+               or None if the marker is not found
+    """
+    for line in lines:
+        match = MARKER_RE.match(line.rstrip())
+        if match:
+            return match.group("reason"), int(match.group("dropped"))
+    return None
+
+
+def soft_timed_out(lines):
+    """Check if jsfunfuzz stopped because of the soft timeout of the low-output mode.
+
+    Args:
+        lines (list): Lines printed by jsfunfuzz
+
+    Returns:
+        bool: True if jsfunfuzz stopped shortly before the shell would have been killed, False otherwise
+    """
+    marker = parse_marker(lines)
+    return bool(marker) and marker[0] == TIMEOUT_REASON
+
+
+def replay_cmd(cmd_with_args, lines):
+    """Retrieve the command that replays a run in low-output mode without the ring buffer, if its lines were lost.
+
+    The replay uses the seed of the run, and the same flags and maxRunTime.
+
+    Args:
+        cmd_with_args (list): js shell and its arguments, ending with -e, the statements run before jsfunfuzz, -f and
+                              the jsfunfuzz file
+        lines (list): Lines printed by jsfunfuzz
+
+    Returns:
+        list: Replay command, or None if jsfunfuzz printed its marker or did not even print its seed
+    """
+    seed = seed_replay.parse_seed(lines)
+    if parse_marker(lines) or not seed:
+        return None
+    prologue = SHELL_ARGS_RE.sub("", cmd_with_args[-3]).rstrip(";")
+    return list(cmd_with_args[:-3]) + [f"{prologue}; forcedFuzzSeed={seed[0]};"] + list(cmd_with_args[-2:])
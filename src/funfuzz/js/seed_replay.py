@@ -0,0 +1,251 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Records interesting jsfunfuzz runs by their seed, and regenerates their testcases on demand.
+
+jsfunfuzz draws everything it generates from a Mersenne Twister seeded with the fuzzSeed it prints, so a run can be
+replayed by passing the same seed as forcedFuzzSeed to the same jsfunfuzz, and stopping it after as many iterations
+with maxIterations. A record thus only holds the seed, the number of iterations, the shell flags, and the hashes of the
+js shell and of the linked jsfunfuzz (which covers its prologue), instead of the full output of the run.
+
+Replaying a run with fewer iterations is also a quick way to shorten its testcase before Lithium reduces it: a binary
+search finds the fewest iterations that still reproduce the issue in a logarithmic number of runs.
+"""
+
+import argparse
+import io
+import json
+from pathlib import Path
+import re
+import time
+
+from . import link_fuzzer
+from ..util import file_system_helpers
+from ..util import shell_metadata
+from ..util import shell_runner
+
+SEED_RE = re.compile(r"^fuzzSeed: (?P<seed>\d+)$")
+COUNT_RE = re.compile(r"^/\*FRC-fuzzSeed-\d+\*/count=(?P<count>\d+);")
+REPLAY_TIMEOUT = 600  # seconds
+
+
+def parse_seed(out_lines):
+    """Find the seed of a jsfunfuzz run, and the number of iterations it went through.
+
+    Args:
+        out_lines (iterable): Lines printed by jsfunfuzz
+
+    Returns:
+        tuple: Seed and number of iterations, or None if jsfunfuzz did not print its seed
+    """
+    seed = None
+    iterations = 0
+    for line in out_lines:
+        line = line.rstrip()
+        if seed is None:
+            match = SEED_RE.match(line)
+            if match:
+                seed = int(match.group("seed"))
+            continue
+        match = COUNT_RE.match(line)
+        if match:
+            iterations = max(iterations, int(match.group("count")))
+    if seed is None:
+        return None
+    return seed, iterations
+
+
+def count_iterations(out_lines):
+    """Count the iterations a jsfunfuzz run went through, e.g. to measure its throughput.
+
+    Args:
+        out_lines (iterable): Lines printed by jsfunfuzz
+
+    Returns:
+        int: Number of iterations, 0 if jsfunfuzz did not print its seed
+    """
+    seed = parse_seed(out_lines)
+    return seed[1] if seed else 0
+
+
+def make_record(js_engine, engine_flags, fuzzjs, out_lines, level):
+    """Create the record of an interesting jsfunfuzz run.
+
+    Args:
+        js_engine (Path): Path to the js shell
+        engine_flags (list): Flags passed to the js shell
+        fuzzjs (Path): Path to the linked jsfunfuzz file
+        out_lines (iterable): Lines printed by jsfunfuzz
+        level (int): Level reached by the run, as defined in js_interesting
+
+    Returns:
+        dict: Record of the run, or None if jsfunfuzz did not print its seed or any iteration, as replaying it with
+              maxIterations=0 would not stop
+    """
+    # pylint: disable=too-many-arguments
+    seed = parse_seed(out_lines)
+    if not seed or not seed[1]:
+        return None
+    return {
+        "seed": seed[0],
+        "iterations": seed[1],
+        "flags": [str(x) for x in engine_flags],
+        "level": level,
+        "shell": str(js_engine),
+        "shell_hash": shell_metadata.binary_hash(js_engine),
+        "fuzzer": str(fuzzjs),
+        "fuzzer_hash": link_fuzzer.fuzzer_hash(fuzzjs),
+    }
+
+
+def write_record(record_file, record):
+    """Store the record of a run.
+
+    Args:
+        record_file (Path): Path to the record file
+        record (dict): Record of the run
+    """
+    file_system_helpers.atomic_write(record_file, json.dumps(record, indent=1, sort_keys=True))
+
+
+def load_record(record_file):
+    """Read the record of a run.
+
+    Args:
+        record_file (Path): Path to the record file
+
+    Returns:
+        dict: Record of the run
+    """
+    with io.open(str(record_file), "r", encoding="utf-8", errors="replace") as f:
+        return json.load(f)
+
+
+def replay_cmd(record, js_engine=None):
+    """Retrieve the command that replays a run.
+
+    Args:
+        record (dict): Record of the run
+        js_engine (Path): Path to the js shell, defaults to the one of the record
+
+    Returns:
+        list: js shell and its arguments
+    """
+    return ([js_engine or record["shell"]] + record["flags"] +
+            ["-e", f"forcedFuzzSeed={record['seed']}; maxIterations={record['iterations']};",
+             "-f", record["fuzzer"]])
+
+
+def bisect_iterations(record, reproduces):
+    """Find the fewest iterations after which a replayed run still reproduces its issue, with a binary search.
+
+    Args:
+        record (dict): Record of the run
+        reproduces (function): Called with a replay command, returns whether the replay reproduces the issue and the
+                               lines it printed
+
+    Returns:
+        tuple: Fewest number of iterations found, lines printed by the replay with that many iterations or None if even
+               the full replay does not reproduce the issue, and time taken by each replay in seconds
+    """
+    step_times = []
+
+    def replay(iterations):
+        """Replay the run with a number of iterations, timing it.
+
+        Args:
+            iterations (int): Number of iterations
+
+        Returns:
+            tuple: Whether the replay reproduces the issue, and the lines it printed
+        """
+        start_time = time.time()
+        result = reproduces(replay_cmd(dict(record, iterations=iterations)))
+        step_times.append(time.time() - start_time)
+        return result
+
+    low, high = 1, record["iterations"]
+    if high < 2:  # maxIterations=0 would not stop jsfunfuzz at all
+        return high, None, step_times
+    reproduced, best_out = replay(high)
+    if not reproduced:
+        return high, None, step_times
+    while low < high:
+        middle = (low + high) // 2
+        reproduced, out_lines = replay(middle)
+        if reproduced:
+            high, best_out = middle, out_lines
+        else:
+            low = middle + 1
+    return high, best_out, step_times
+
+
+def regenerate(record, testcase_file, js_engine=None, timeout=REPLAY_TIMEOUT):
+    """Rebuild the full testcase of a run by replaying it.
+
+    Args:
+        record (dict): Record of the run
+        testcase_file (Path): Path to the testcase to be created
+        js_engine (Path): Path to the js shell, defaults to the one of the record
+        timeout (int): Timeout in seconds for the replay
+
+    Raises:
+        ValueError: Raised if the linked jsfunfuzz of the record is missing or has changed
+
+    Returns:
+        bool: True if the replay went through as many iterations as the recorded run, False otherwise
+    """
+    fuzzjs = Path(record["fuzzer"])
+    if not fuzzjs.is_file() or link_fuzzer.fuzzer_hash(fuzzjs) != record["fuzzer_hash"]:
+        raise ValueError(f"{fuzzjs} is not the jsfunfuzz that the run was recorded with")
+    js_engine = Path(js_engine or record["shell"])
+    if shell_metadata.binary_hash(js_engine) != record["shell_hash"]:
+        print(f"Warning: {js_engine} is not the js shell that the run was recorded with, it may not replay the same")
+
+    runinfo = shell_runner.timed_run(replay_cmd(record, js_engine), timeout)
+    try:
+        out_lines = runinfo.out.lines()
+    finally:
+        runinfo.close()
+    with io.open(str(testcase_file), "w", encoding="utf-8", errors="replace") as f:
+        f.writelines(link_fuzzer.splice_testcase(fuzzjs, out_lines))
+    return parse_seed(out_lines) == (record["seed"], record["iterations"])
+
+
+def parse_args(args=None):
+    """Parses arguments from the command line.
+
+    Args:
+        args (None): Argument parameters, defaults to None.
+
+    Returns:
+        class: Namespace of argparse parameters.
+    """
+    arg_parser = argparse.ArgumentParser(description="Rebuild the testcase of a run recorded by loop --record-seeds")
+    arg_parser.add_argument("record", type=Path, help="Path to the record of the run")
+    arg_parser.add_argument("testcase", type=Path, help="Path to the testcase to be created")
+    arg_parser.add_argument("--js-engine", type=Path,
+                            help="js shell to replay the run with, defaults to the recorded one")
+    arg_parser.add_argument("--timeout", type=int, default=REPLAY_TIMEOUT,
+                            help='Timeout in seconds for the replay. Defaults to "%(default)s".')
+    return arg_parser.parse_args(args)
+
+
+def main(argparse_args=None):
+    """Rebuild the testcase of a recorded run.
+
+    Args:
+        argparse_args (None): Argument parameters, defaults to None.
+    """
+    args = parse_args(argparse_args)
+    if regenerate(load_record(args.record), args.testcase, args.js_engine, args.timeout):
+        print(f"Rebuilt {args.testcase}")
+    else:
+        print(f"Rebuilt {args.testcase}, but the replay stopped before the recorded number of iterations")
+
+
+if __name__ == "__main__":
+    main()
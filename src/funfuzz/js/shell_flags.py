@@ -13,12 +13,62 @@ import random
 import re
 
 from . import inspect_shell
+from ..util import shell_metadata
+
+FLAG_SUPPORT_METADATA = "flag-support"
+
+FORCEINLINE_CMD = '--execute=\"setJitCompilerOption(\\\"ion.forceinlineCaches\\\",1)\"'
+# The only way I could make nested double quotes work with subprocess. See https://stackoverflow.com/a/35913597
+FORCEINLINE_SHELL_CMD = re.findall(r'(?:[^\s,"]|"(?:\\.|[^"])*")+', FORCEINLINE_CMD)[0]
+
+# Every flag whose support is tested by the functions in this file, so they can all be probed in one batch
+CANDIDATE_FLAGS = [
+    # random_flag_set
+    "--fuzzing-safe",
+    "--no-wasm",
+    "--no-sse3",
+    "--ion",
+    "--no-ion",
+    "--more-compartments",
+    "--no-streams",
+    "--nursery-strings=on",
+    "--spectre-mitigations=on",
+    "--cpu-count=1",
+    "--ion-offthread-compile=on",
+    "--no-unboxed-objects",
+    "--no-cgc",
+    "--gc-zeal=1,1",
+    "--no-incremental-gc",
+    "--no-threads",
+    "--no-native-regexp",
+    "--no-ggc",
+    "--baseline-eager",
+    "--dump-bytecode",
+    # add_random_arch_flags
+    "--enable-avx",
+    "--no-avx",
+    # add_random_ion_flags
+    "--cache-ir-stubs=on",
+    "--ion-pgo=on",
+    "--ion-sincos=on",
+    "--ion-instruction-reordering=on",
+    "--ion-regalloc=testbed",
+    FORCEINLINE_SHELL_CMD,
+    "--ion-extra-checks",
+    # add_random_wasm_flags
+    "--wasm-gc",
+    "--test-wasm-await-tier2",
+    "--no-wasm-ion",
+    "--no-wasm-baseline",
+]
 
 
 @lru_cache(maxsize=None)
 def shell_supports_flag(shell_path, flag):
     """Returns whether a particular flag is supported by a shell.
 
+    Flags in CANDIDATE_FLAGS are looked up in the flag support matrix of the shell, other flags are probed directly.
+
     Args:
         shell_path (str): Path to the required shell.
         flag (str): Intended flag to test.
@@ -26,8 +76,57 @@ def shell_supports_flag(shell_path, flag):
     Returns:
         bool: True if the flag is supported, i.e. does not cause the shell to throw an error, False otherwise.
     """
-    out = inspect_shell.shellSupports(shell_path, [flag, "-e", "42"])
-    return out
+    support_matrix = flag_support_matrix(shell_path)
+    if flag in support_matrix:
+        return support_matrix[flag]
+    return probe_flag(shell_path, flag)
+
+
+def probe_flag(shell_path, flag):
+    """Launches the shell to test whether it supports a flag.
+
+    Args:
+        shell_path (str): Path to the required shell.
+        flag (str): Intended flag to test.
+
+    Returns:
+        bool: True if the flag is supported, False otherwise.
+    """
+    return inspect_shell.shellSupports(shell_path, [flag, "-e", "42"])
+
+
+def _probe_flag_star(shell_path_and_flag):
+    """Unpacks the argument tuple for probe_flag, as multiprocessing.Pool.map only passes one argument.
+
+    Args:
+        shell_path_and_flag (tuple): Path to the required shell, and the flag to test.
+
+    Returns:
+        bool: True if the flag is supported, False otherwise.
+    """
+    return probe_flag(*shell_path_and_flag)
+
+
+@lru_cache(maxsize=None)
+def flag_support_matrix(shell_path):
+    """Returns which of the CANDIDATE_FLAGS a shell supports.
+
+    The matrix is probed once per shell build, in parallel, and then stored next to the shell so that all workers
+    and later bot runs can read it instead of launching the shell once per flag.
+
+    Args:
+        shell_path (str): Path to the required shell.
+
+    Returns:
+        dict: Mapping of each candidate flag to whether it is supported
+    """
+    support_matrix = shell_metadata.load_metadata(shell_path, FLAG_SUPPORT_METADATA)
+    if support_matrix is None or not set(CANDIDATE_FLAGS).issubset(support_matrix):
+        with multiprocessing.Pool(min(multiprocessing.cpu_count(), len(CANDIDATE_FLAGS))) as pool:
+            results = pool.map(_probe_flag_star, [(shell_path, flag) for flag in CANDIDATE_FLAGS])
+        support_matrix = dict(zip(CANDIDATE_FLAGS, results))
+        shell_metadata.save_metadata(shell_path, FLAG_SUPPORT_METADATA, support_matrix)
+    return support_matrix
 
 
 def chance(i):
@@ -42,32 +141,49 @@ def chance(i):
     return random.random() < i
 
 
-def add_random_arch_flags(shell_path, input_list=False):
+def flag_chance(flag, i, scheduler=None):
+    """Returns a random boolean result for adding a flag, based on an input probability adjusted by a scheduler.
+
+    Args:
+        flag (str): Flag to be added, without its value.
+        i (float): Default probability.
+        scheduler (FlagScheduler): Adjusts the probability from past outcomes of the flag, if specified.
+
+    Returns:
+        bool: Result based on the adjusted probability
+    """
+    return chance(scheduler.probability(flag, i) if scheduler else i)
+
+
+def add_random_arch_flags(shell_path, input_list=False, scheduler=None):
     """Returns a list with probably additional architecture-related flags added.
 
     Args:
         shell_path (str): Path to the required shell.
         input_list (list): List of flags to eventually be tested against a shell.
+        scheduler (FlagScheduler): Adjusts the probability of each flag from past outcomes, if specified.
 
     Returns:
         list: List of flags to be tested, with probable architecture-related flags added.
     """
-    if inspect_shell.queryBuildConfiguration(shell_path, "arm-simulator") and chance(.7):
+    if (inspect_shell.queryBuildConfiguration(shell_path, "arm-simulator") and
+            flag_chance("--arm-sim-icache-checks", .7, scheduler)):
         # m-c rev 165993:c450eb3abde4, see bug 965247
         input_list.append("--arm-sim-icache-checks")
-    if inspect_shell.queryBuildConfiguration(shell_path, "arm-simulator") and chance(.7):
+    if (inspect_shell.queryBuildConfiguration(shell_path, "arm-simulator") and
+            flag_chance("--arm-asm-nop-fill", .7, scheduler)):
         # Added due to fuzz-flags.txt addition: m-c rev 418682:5bba65880a66, see bug 1461689
         # m-c rev 192164:f1bacafe789c, see bug 1020834
         input_list.append("--arm-asm-nop-fill=1")
-    if inspect_shell.queryBuildConfiguration(shell_path, "arm-simulator") and chance(.7):
+    if inspect_shell.queryBuildConfiguration(shell_path, "arm-simulator") and flag_chance("--arm-hwcap", .7, scheduler):
         # Added due to fuzz-flags.txt addition: m-c rev 418682:5bba65880a66, see bug 1461689
         # m-c rev 190582:5399dc155c3b, see bug 1028008
         input_list.append("--arm-hwcap=vfp")
 
-    if shell_supports_flag(shell_path, "--enable-avx") and chance(.2):
+    if shell_supports_flag(shell_path, "--enable-avx") and flag_chance("--enable-avx", .2, scheduler):
         # m-c rev 223959:5e6e959f0043, see bug 1118235
         input_list.append("--enable-avx")
-    elif shell_supports_flag(shell_path, "--no-avx") and chance(.2):
+    elif shell_supports_flag(shell_path, "--no-avx") and flag_chance("--no-avx", .2, scheduler):
         # m-c rev 223959:5e6e959f0043, see bug 1118235
         input_list.append("--no-avx")
 
@@ -79,7 +195,7 @@ def add_random_arch_flags(shell_path, input_list=False):
     return input_list
 
 
-def add_random_ion_flags(shell_path, input_list=False):  # pylint: disable=too-complex,too-many-branches
+def add_random_ion_flags(shell_path, input_list=False, scheduler=None):  # pylint: disable=too-complex,too-many-branches
     """Returns a list with probably additional IonMonkey flags added.
 
     The non-default options have a higher chance of being set, e.g. chance(.9)
@@ -87,33 +203,32 @@ def add_random_ion_flags(shell_path, input_list=False):  # pylint: disable=too-c
     Args:
         shell_path (str): Path to the required shell.
         input_list (list): List of flags to eventually be tested against a shell.
+        scheduler (FlagScheduler): Adjusts the probability of each flag from past outcomes, if specified.
 
     Returns:
         list: List of flags to be tested, with probable IonMonkey flags added.
     """
-    if shell_supports_flag(shell_path, "--cache-ir-stubs=on") and chance(.2):
+    if shell_supports_flag(shell_path, "--cache-ir-stubs=on") and flag_chance("--cache-ir-stubs", .2, scheduler):
         # m-c rev 308931:1c5b92144e1e, see bug 1292659
         input_list.append("--cache-ir-stubs=" + ("on" if chance(.1) else "off"))
-    if shell_supports_flag(shell_path, "--ion-pgo=on") and chance(.2):
+    if shell_supports_flag(shell_path, "--ion-pgo=on") and flag_chance("--ion-pgo", .2, scheduler):
         # m-c rev 272274:b0a0ff5fa705, see bug 1209515
         input_list.append("--ion-pgo=" + ("on" if chance(.1) else "off"))
-    if shell_supports_flag(shell_path, "--ion-sincos=on") and chance(.2):
+    if shell_supports_flag(shell_path, "--ion-sincos=on") and flag_chance("--ion-sincos", .2, scheduler):
         # m-c rev 262544:3dec2b935295, see bug 984018
         input_list.append("--ion-sincos=" + ("on" if chance(.5) else "off"))
-    if shell_supports_flag(shell_path, "--ion-instruction-reordering=on") and chance(.2):
+    if (shell_supports_flag(shell_path, "--ion-instruction-reordering=on") and
+            flag_chance("--ion-instruction-reordering", .2, scheduler)):
         # m-c rev 259672:59d2f2e62420, see bug 1195545
         input_list.append("--ion-instruction-reordering=" + ("on" if chance(.9) else "off"))
-    if shell_supports_flag(shell_path, "--ion-regalloc=testbed") and chance(.2):
+    if shell_supports_flag(shell_path, "--ion-regalloc=testbed") and flag_chance("--ion-regalloc", .2, scheduler):
         # m-c rev 248962:47e92bae09fd, see bug 1170840
         input_list.append("--ion-regalloc=testbed")
 
-    forceinline_cmd = '--execute=\"setJitCompilerOption(\\\"ion.forceinlineCaches\\\",1)\"'
-    # The only way I could make nested double quotes work with subprocess. See https://stackoverflow.com/a/35913597
-    forceinline_shell_cmd = re.findall(r'(?:[^\s,"]|"(?:\\.|[^"])*")+', forceinline_cmd)[0]
-    if shell_supports_flag(shell_path, forceinline_shell_cmd) and chance(.2):
+    if shell_supports_flag(shell_path, FORCEINLINE_SHELL_CMD) and flag_chance(FORCEINLINE_SHELL_CMD, .2, scheduler):
         # m-c rev 247709:ea9608e33abe, see bug 923717
-        input_list.append(forceinline_shell_cmd)
-    if shell_supports_flag(shell_path, "--ion-extra-checks") and chance(.2):
+        input_list.append(FORCEINLINE_SHELL_CMD)
+    if shell_supports_flag(shell_path, "--ion-extra-checks") and flag_chance("--ion-extra-checks", .2, scheduler):
         # m-c rev 234228:cdf93416b39a, see bug 1139152
         input_list.append("--ion-extra-checks")
 
@@ -122,72 +237,76 @@ def add_random_ion_flags(shell_path, input_list=False):  # pylint: disable=too-c
     # --ion-sink=on is still not ready to be fuzzed
     # if chance(.2):  # m-c rev 217242:9188c8b7962b, see bug 1093674
     #     input_list.append("--ion-sink=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 204669:891d587c19c4, see bug 1063816
+    if flag_chance("--ion-warmup-threshold", .2, scheduler):  # m-c rev 204669:891d587c19c4, see bug 1063816
         # Added due to fuzz-flags.txt addition: m-c rev 418682:5bba65880a66, see bug 1461689
         input_list.append("--ion-warmup-threshold=100")
-    if chance(.2):  # m-c rev 194672:b2a822934b97, see bug 992845
+    if flag_chance("--ion-scalar-replacement", .2, scheduler):  # m-c rev 194672:b2a822934b97, see bug 992845
         input_list.append("--ion-scalar-replacement=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 142933:f08e4a699011, see bug 894813
+    if flag_chance("--ion-check-range-analysis", .2, scheduler):  # m-c rev 142933:f08e4a699011, see bug 894813
         input_list.append("--ion-check-range-analysis")
     # The stupid allocator isn't used by default and devs prefer not to have to fix fuzzbugs
     # if chance(.2):  # m-c rev 114120:7e97c5392d81, see bug 812945
         # input_list.append("--ion-regalloc=stupid")
-    if chance(.2):  # m-c rev 106493:6688ede89a36, see bug 699883
+    if flag_chance("--ion-range-analysis", .2, scheduler):  # m-c rev 106493:6688ede89a36, see bug 699883
         input_list.append("--ion-range-analysis=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 106491:6c870a497ea4, see bug 699883
+    if flag_chance("--ion-edgecase-analysis", .2, scheduler):  # m-c rev 106491:6c870a497ea4, see bug 699883
         input_list.append("--ion-edgecase-analysis=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 106247:feac7727629c, see bug 755010
+    if flag_chance("--ion-limit-script-size", .2, scheduler):  # m-c rev 106247:feac7727629c, see bug 755010
         input_list.append("--ion-limit-script-size=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 105351:9fb668f0baca, see bug 700108
+    if flag_chance("--ion-osr", .2, scheduler):  # m-c rev 105351:9fb668f0baca, see bug 700108
         input_list.append("--ion-osr=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 105338:01ebfabf29e2, see bug 687901
+    if flag_chance("--ion-inlining", .2, scheduler):  # m-c rev 105338:01ebfabf29e2, see bug 687901
         input_list.append("--ion-inlining=" + ("on" if chance(.1) else "off"))
-    if chance(.7):  # m-c rev 105173:4ceb3e9961e4, see bug 683039
+    if flag_chance("--ion-eager", .7, scheduler):  # m-c rev 105173:4ceb3e9961e4, see bug 683039
         input_list.append("--ion-eager")
-    if chance(.2):  # m-c rev 104923:8db8eef79b8c, see bug 670816
+    if flag_chance("--ion-gvn", .2, scheduler):  # m-c rev 104923:8db8eef79b8c, see bug 670816
         input_list.append("--ion-gvn=" + ("on" if chance(.1) else "off"))
-    if chance(.2):  # m-c rev 104923:8db8eef79b8c, see bug 670816
+    if flag_chance("--ion-licm", .2, scheduler):  # m-c rev 104923:8db8eef79b8c, see bug 670816
         input_list.append("--ion-licm=" + ("on" if chance(.1) else "off"))
 
     return input_list
 
 
-def add_random_wasm_flags(shell_path, input_list=False):
+def add_random_wasm_flags(shell_path, input_list=False, scheduler=None):
     """Returns a list with probably additional WebAssembly (wasm/asmjs) flags added.
 
     Args:
         shell_path (str): Path to the required shell.
         input_list (list): List of flags to eventually be tested against a shell.
+        scheduler (FlagScheduler): Adjusts the probability of each flag from past outcomes, if specified.
 
     Returns:
         list: List of flags to be tested, with probable wasm flags added.
     """
-    if shell_supports_flag(shell_path, "--wasm-gc") and chance(.8):
+    if shell_supports_flag(shell_path, "--wasm-gc") and flag_chance("--wasm-gc", .8, scheduler):
         # m-c rev 413255:302befe7689a, see bug 1445272
         input_list.append("--wasm-gc")
-    if shell_supports_flag(shell_path, "--test-wasm-await-tier2") and chance(.8):
+    if (shell_supports_flag(shell_path, "--test-wasm-await-tier2") and
+            flag_chance("--test-wasm-await-tier2", .8, scheduler)):
         # m-c rev 387188:b1dc87a94262, see bug 1388785
         input_list.append("--test-wasm-await-tier2")
-    if shell_supports_flag(shell_path, "--no-wasm-ion") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-wasm-ion") and flag_chance("--no-wasm-ion", .2, scheduler):
         # m-c rev 375650:158b333a0a89, see bug 1277562
         input_list.append("--no-wasm-ion")
-    if shell_supports_flag(shell_path, "--no-wasm-baseline") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-wasm-baseline") and flag_chance("--no-wasm-baseline", .2, scheduler):
         # m-c rev 375639:9ea44ef0c07c, see bug 1277562
         input_list.append("--no-wasm-baseline")
 
     # m-c rev 222786:bcacb5692ad9 is the earliest known working revision, so stop testing prior existence of flag
 
-    if chance(.7):  # m-c rev 124920:b3d85b68449d, see bug 840282
+    if flag_chance("--no-asmjs", .7, scheduler):  # m-c rev 124920:b3d85b68449d, see bug 840282
         input_list.append("--no-asmjs")
 
     return input_list
 
 
-def random_flag_set(shell_path=False):  # pylint: disable=too-complex,too-many-branches,too-many-statements
+def random_flag_set(shell_path=False, scheduler=None):
+    # pylint: disable=too-complex,too-many-branches,too-many-statements
     """Returns a random list of CLI flags appropriate for the given shell.
 
     Args:
         shell_path (str): Path to the required shell.
+        scheduler (FlagScheduler): Adjusts the probability of each flag from past outcomes, if specified.
 
     Returns:
         list: List of flags to be tested.
@@ -201,52 +320,54 @@ def random_flag_set(shell_path=False):  # pylint: disable=too-complex,too-many-b
     # Add other groups of flags randomly
     if shell_supports_flag(shell_path, "--no-wasm"):
         # m-c rev 321230:e9b561d60697, see bug 1313180
-        args = add_random_wasm_flags(shell_path, args)
+        args = add_random_wasm_flags(shell_path, args, scheduler)
 
     if shell_supports_flag(shell_path, "--no-sse3"):
         # m-c rev 154600:526ba3ace37a, see bug 935791
-        args = add_random_arch_flags(shell_path, args)
+        args = add_random_arch_flags(shell_path, args, scheduler)
 
     if shell_supports_flag(shell_path, "--ion") and chance(.7):
         # m-c rev 104923:8db8eef79b8c, see bug 670816
-        args = add_random_ion_flags(shell_path, args)
+        args = add_random_ion_flags(shell_path, args, scheduler)
     elif shell_supports_flag(shell_path, "--no-ion"):
         # m-c rev 106120:300ac3d58291, see bug 724751
         args.append("--no-ion")
 
     # Other flags
-    if shell_supports_flag(shell_path, "--more-compartments") and chance(.9):
+    if shell_supports_flag(shell_path, "--more-compartments") and flag_chance("--more-compartments", .9, scheduler):
         # m-c rev 453627:450b8f0cbb4e, see bug 1518753
         args.append("--more-compartments")
 
-    if shell_supports_flag(shell_path, "--no-streams") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-streams") and flag_chance("--no-streams", .2, scheduler):
         # m-c rev 442977:c6a8b4d451af, see bug 1501734
         args.append("--no-streams")
 
-    if shell_supports_flag(shell_path, "--nursery-strings=on") and chance(.2):
+    if shell_supports_flag(shell_path, "--nursery-strings=on") and flag_chance("--nursery-strings", .2, scheduler):
         # m-c rev 406115:321c29f48508, see bug 903519
         args.append("--nursery-strings=" + ("on" if chance(.1) else "off"))
 
-    if shell_supports_flag(shell_path, "--spectre-mitigations=on") and chance(.2):
+    if (shell_supports_flag(shell_path, "--spectre-mitigations=on") and
+            flag_chance("--spectre-mitigations", .2, scheduler)):
         # m-c rev 399868:a98f615965d7, see bug 1430053
         args.append("--spectre-mitigations=" + ("on" if chance(.9) else "off"))
 
     # m-c rev 380023:1b55231e6628, see bug 1206770
     if shell_supports_flag(shell_path, "--cpu-count=1"):
-        if shell_supports_flag(shell_path, "--ion-offthread-compile=on") and chance(.7):
+        if (shell_supports_flag(shell_path, "--ion-offthread-compile=on") and
+                flag_chance("--ion-offthread-compile", .7, scheduler)):
             # Focus on the reproducible cases
             # m-c rev 188900:9ab3b097f304, see bug 1020364
             args.append("--ion-offthread-compile=" + ("on" if chance(.1) else "off"))
-        elif (chance(.5) and multiprocessing.cpu_count() > 1 and
+        elif (flag_chance("--cpu-count", .5, scheduler) and multiprocessing.cpu_count() > 1 and
               shell_supports_flag(shell_path, "--cpu-count=1")):
             # Adjusts default number of threads for offthread compilation (turned on by default)
             args.append(f"--cpu-count={random.randint(2, (multiprocessing.cpu_count() * 2))}")
 
-    if shell_supports_flag(shell_path, "--no-unboxed-objects") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-unboxed-objects") and flag_chance("--no-unboxed-objects", .2, scheduler):
         # m-c rev 244297:322487136b28, see bug 1162199
         args.append("--no-unboxed-objects")
 
-    if shell_supports_flag(shell_path, "--no-cgc") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-cgc") and flag_chance("--no-cgc", .2, scheduler):
         # m-c rev 226540:ade5e0300605, see bug 1126769
         args.append("--no-cgc")
 
@@ -280,33 +401,33 @@ def random_flag_set(shell_path=False):  # pylint: disable=too-complex,too-many-b
             final_value = final_value.split(";")[0]
         args.append(f"--gc-zeal={final_value},{allocations_number}")
 
-    if shell_supports_flag(shell_path, "--no-incremental-gc") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-incremental-gc") and flag_chance("--no-incremental-gc", .2, scheduler):
         # m-c rev 211115:35025fd9e99b, see bug 958492
         args.append("--no-incremental-gc")
 
-    if shell_supports_flag(shell_path, "--no-threads") and chance(.5):
+    if shell_supports_flag(shell_path, "--no-threads") and flag_chance("--no-threads", .5, scheduler):
         # m-c rev 195996:35038c3324ee, see bug 1031529
         args.append("--no-threads")
 
-    if shell_supports_flag(shell_path, "--no-native-regexp") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-native-regexp") and flag_chance("--no-native-regexp", .2, scheduler):
         # m-c rev 183413:43acd23f5a98, see bug 976446
         args.append("--no-native-regexp")
 
-    if shell_supports_flag(shell_path, "--no-ggc") and chance(.2):
+    if shell_supports_flag(shell_path, "--no-ggc") and flag_chance("--no-ggc", .2, scheduler):
         # m-c rev 129273:3297733a2661, see bug 706885
         args.append("--no-ggc")
 
     # --baseline-eager landed after --no-baseline on the IonMonkey branch prior to landing on m-c.
     if shell_supports_flag(shell_path, "--baseline-eager"):
-        if chance(.2):
+        if flag_chance("--no-baseline", .2, scheduler):
             # m-c rev 127126:1c0489e5a302, see bug 818231
             args.append("--no-baseline")
         # elif is important, as we want to call --baseline-eager only if --no-baseline is not set.
-        elif chance(.5):
+        elif flag_chance("--baseline-eager", .5, scheduler):
             # m-c rev 127353:be125cabea26, see bug 843596
             args.append("--baseline-eager")
 
-    if shell_supports_flag(shell_path, "--dump-bytecode") and chance(.05):
+    if shell_supports_flag(shell_path, "--dump-bytecode") and flag_chance("--dump-bytecode", .05, scheduler):
         # m-c rev 73054:b1923b866d6a, see bug 668095
         args.append("--dump-bytecode")
 
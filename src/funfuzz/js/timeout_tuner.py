@@ -0,0 +1,162 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Tunes the timeout of the js shell and the maxRunTime of jsfunfuzz from the outcome of past runs.
+
+A longer maxRunTime lets jsfunfuzz mix more, but makes OOMs more likely, and every run that times out wastes the whole
+timeout. After each window of runs, maxRunTime hill-climbs on the useful executions per CPU-hour, i.e. the iterations
+that jsfunfuzz went through in runs that neither timed out nor ran out of memory, per hour spent in all runs: it keeps
+moving in the same direction while that improves on the previous window, and turns around once it drops. The OOM and
+timeout rates are limits rather than goals, so maxRunTime is lowered whenever either of them is too high. The timeout
+follows the time taken by normal runs. Tuned values are kept per build and flag group,
+next to the shell in its shell-cache directory. Random flag sets hardly ever repeat, so runs are grouped by the few
+flags that change how fast the shell runs and how much memory it uses, and the other flags are ignored.
+"""
+
+from collections import deque
+import math
+
+from ..util import shell_metadata
+
+TIMEOUT_TUNING_METADATA = "timeout-tuning"
+ALL_FLAGS = ""  # Key of the values shared by all flag sets of the build
+# Flags, without their values, that group runs for tuning, as they change the speed or memory usage of the shell
+TIMING_FLAGS = ("--baseline-eager", "--dump-bytecode", "--ion-eager", "--no-baseline", "--no-ggc", "--no-ion",
+                "--no-threads")
+
+TUNING_WINDOW = 40  # Number of runs between adjustments
+OOM_RATE_TARGET = 0.05
+TIMEOUT_RATE_TARGET = 0.05
+MAX_RUN_TIME_DECREASE = 0.8  # Factor applied to maxRunTime when too many runs time out or run out of memory
+MAX_RUN_TIME_STEP = 1.1  # Factor by which maxRunTime is raised or lowered while hill-climbing
+TIMEOUT_MARGIN = 1.25  # Factor applied to the 95th percentile of the time taken by normal runs
+STARTUP_ALLOWANCE = 2  # Seconds given to the shell beyond maxRunTime, to start up and print its last output
+
+
+def flags_key(flags):
+    """Retrieve the key under which tuned values for a flag set are kept, i.e. that of its flag group.
+
+    Args:
+        flags (list): Flags passed to the js shell
+
+    Returns:
+        str: Key of the flag group, made of the TIMING_FLAGS in the flag set
+    """
+    return " ".join(sorted({str(x).split("=", 1)[0] for x in flags} & set(TIMING_FLAGS)))
+
+
+class TimeoutTuner:
+    """Adaptive controller for the timeout and maxRunTime of one build.
+
+    Args:
+        binary_path (Path): Path to the js shell
+        timeout (int): Initial timeout in seconds, jsfunfuzz initially gets half of it as its maxRunTime
+        min_timeout (int): Lowest timeout in seconds that may be chosen
+        max_timeout (int): Highest timeout in seconds that may be chosen
+        window (int): Number of runs between adjustments
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, binary_path, timeout, min_timeout, max_timeout, window=TUNING_WINDOW):
+        assert min_timeout <= timeout <= max_timeout
+        self.binary_path = binary_path
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.window = window
+        self.initial = {"timeout": timeout, "max_run_time": timeout * (1000 // 2)}
+        settings = shell_metadata.load_metadata(binary_path, TIMEOUT_TUNING_METADATA) or {}
+        # Drop values stored under keys that are not flag groups, e.g. by versions that tuned each full flag set
+        self.settings = {key: value for key, value in settings.items() if key == flags_key(key.split())}
+        self.runs = {}  # At most one window per flag group
+
+    def values_for(self, flags):
+        """Retrieve the timeout and maxRunTime to use with a flag set.
+
+        Args:
+            flags (list): Flags passed to the js shell
+
+        Returns:
+            tuple: Timeout in seconds and maxRunTime in milliseconds
+        """
+        settings = self.settings_for_key(flags_key(flags))
+        return settings["timeout"], settings["max_run_time"]
+
+    def settings_for_key(self, key):
+        """Retrieve the tuned values of a flag group, falling back to those of the build if it has not been tuned yet.
+
+        Args:
+            key (str): Key of the flag group
+
+        Returns:
+            dict: Tuned values
+        """
+        return self.settings.get(key) or self.settings.get(ALL_FLAGS) or self.initial
+
+    def record(self, flags, elapsed, timed_out, oomed, iterations):  # pylint: disable=too-many-arguments
+        """Record the outcome of a run, and adjust the values once a window of runs has been recorded.
+
+        Args:
+            flags (list): Flags passed to the js shell
+            elapsed (float): Time taken by the run, in seconds
+            timed_out (bool): Whether the run had to be killed after the timeout
+            oomed (bool): Whether the shell ran out of memory
+            iterations (int): Number of iterations jsfunfuzz went through, see seed_replay.count_iterations
+        """
+        flag_group_key = flags_key(flags)
+        # The flag group is tuned first, as it falls back to the values of the build until it has been tuned
+        for key in ([flag_group_key] if flag_group_key != ALL_FLAGS else []) + [ALL_FLAGS]:
+            runs = self.runs.setdefault(key, deque(maxlen=self.window))
+            runs.append((elapsed, timed_out, oomed, iterations))
+            if len(runs) == self.window:
+                self.tune(key, list(runs))
+                runs.clear()
+
+    def tune(self, key, runs):
+        """Adjust the values of a flag group from a window of runs, then report and store them.
+
+        Args:
+            key (str): Key of the flag group
+            runs (list): Elapsed time, timeout and OOM status, and number of iterations of each run
+        """
+        # pylint: disable=too-many-locals
+        settings = self.settings_for_key(key)
+        oom_rate = sum(1 for _, _, oomed, _ in runs if oomed) / len(runs)
+        timeout_rate = sum(1 for _, timed_out, _, _ in runs if timed_out) / len(runs)
+        normal_runs = [(elapsed, iterations) for elapsed, timed_out, oomed, iterations in runs
+                       if not (timed_out or oomed)]
+        normal_times = sorted(elapsed for elapsed, _ in normal_runs)
+        useful_execs_per_hour = (sum(iterations for _, iterations in normal_runs) * 3600 /
+                                 max(sum(elapsed for elapsed, _, _, _ in runs), 1))
+
+        # The window ran with the current values, so compare it with the previous window, which ran with the values
+        # before them, to tell whether the last move paid off
+        direction = settings.get("direction", 1)
+        previous = settings.get("useful_execs_per_hour")
+        max_run_time = settings["max_run_time"]
+        if oom_rate > OOM_RATE_TARGET or timeout_rate > TIMEOUT_RATE_TARGET:
+            direction = -1
+            max_run_time *= MAX_RUN_TIME_DECREASE
+        else:
+            if previous is not None and useful_execs_per_hour < previous:
+                direction = -direction
+            max_run_time *= MAX_RUN_TIME_STEP if direction > 0 else 1 / MAX_RUN_TIME_STEP
+        lowest = (self.min_timeout - STARTUP_ALLOWANCE) * 1000
+        highest = (self.max_timeout - STARTUP_ALLOWANCE) * 1000
+        if not lowest < max_run_time < highest:
+            direction = 1 if max_run_time <= lowest else -1  # Explore the other way from a bound
+        max_run_time = int(min(max(max_run_time, lowest), highest))
+
+        timeout = max_run_time / 1000 + STARTUP_ALLOWANCE
+        if normal_times:
+            timeout = max(timeout, normal_times[int(0.95 * (len(normal_times) - 1))] * TIMEOUT_MARGIN)
+        timeout = min(max(int(math.ceil(timeout)), self.min_timeout), self.max_timeout)
+
+        print(f"Timeout tuning for {key or 'all flag sets'}: timeout {timeout}s, maxRunTime {max_run_time}ms "
+              f"({useful_execs_per_hour:.0f} useful executions per CPU-hour with maxRunTime "
+              f"{settings['max_run_time']}ms, {oom_rate:.0%} OOMs, {timeout_rate:.0%} timeouts)")
+
+        self.settings[key] = {"timeout": timeout, "max_run_time": max_run_time, "direction": direction,
+                              "useful_execs_per_hour": round(useful_execs_per_hour)}
+        shell_metadata.save_metadata(self.binary_path, TIMEOUT_TUNING_METADATA, self.settings)
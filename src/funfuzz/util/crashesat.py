@@ -14,10 +14,10 @@ import argparse
 import logging
 from pathlib import Path
 
-import lithium.interestingness.timed_run as timedrun
 from lithium.interestingness.utils import file_contains
 
 from . import os_ops
+from . import shell_runner
 
 
 def interesting(cli_args, temp_prefix):
@@ -44,14 +44,18 @@ def interesting(cli_args, temp_prefix):
     log = logging.getLogger(__name__)
 
     # Examine stack for crash signature, this is needed if args.sig is specified.
-    runinfo = timedrun.timed_run(args.cmd_with_flags, args.timeout, temp_prefix)
-    if runinfo.sta == timedrun.CRASHED:
+    runinfo = shell_runner.timed_run(args.cmd_with_flags, args.timeout)
+    runinfo.save(Path(temp_prefix))
+    runinfo.close()
+    if runinfo.sta == shell_runner.CRASHED:
         os_ops.grab_crash_log(args.cmd_with_flags[0], runinfo.pid, temp_prefix, True)
 
     crash_log = Path(f"{temp_prefix}-crash.txt")
     time_str = f" ({runinfo.elapsedtime:.3f} seconds)"
+    if runinfo.rusage:
+        time_str = f" ({runinfo.elapsedtime:.3f} seconds, {runinfo.rusage['max_rss'] / 2 ** 20:.1f} MB peak RSS)"
 
-    if runinfo.sta == timedrun.CRASHED:
+    if runinfo.sta == shell_runner.CRASHED:
         if crash_log.resolve().is_file():
             # When using this script, remember to escape characters, e.g. "\(" instead of "(" !
             if file_contains(str(crash_log), args.sig, args.regex)[0]:
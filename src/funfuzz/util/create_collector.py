@@ -7,20 +7,73 @@
 """Functions here make use of a Collector created from FuzzManager.
 """
 
+import io
+import json
 from pathlib import Path
 
 from Collector.Collector import Collector
+from FTB.Signatures.CrashSignature import CrashSignature
+
+
+class SigCacheCollector(Collector):
+    """A Collector that keeps the parsed signatures of its signature cache directory in memory.
+
+    Collector.search reads and parses every signature file on each call. This class only does so again once the
+    signature cache directory changes, e.g. after a refresh.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sig_cache_mtime = None
+        self.signatures = []
+
+    def load_signatures(self):
+        """Parse the signature cache directory, unless it has not changed since it was last parsed."""
+        sig_cache_mtime = Path(self.sigCacheDir).stat().st_mtime_ns
+        if sig_cache_mtime == self.sig_cache_mtime:
+            return
+
+        signatures = []
+        for sig_file in sorted(Path(self.sigCacheDir).glob("*.signature")):
+            with io.open(str(sig_file), "r", encoding="utf-8", errors="replace") as f:
+                crash_sig = CrashSignature(f.read())
+            metadata = None
+            metadata_file = sig_file.with_suffix(".metadata")
+            if metadata_file.is_file():
+                with io.open(str(metadata_file), "r", encoding="utf-8", errors="replace") as f:
+                    metadata = json.load(f)
+            signatures.append((str(sig_file), crash_sig, metadata))
+
+        self.signatures = signatures
+        self.sig_cache_mtime = sig_cache_mtime
+
+    def search(self, crashInfo):  # pylint: disable=invalid-name
+        """Search the signature cache for a signature matching the crash.
+
+        Args:
+            crashInfo (CrashInfo): Crash information to match against
+
+        Returns:
+            tuple: Path to the matching signature file and its metadata, or (None, None) if nothing matches
+        """
+        if not self.sigCacheDir:
+            return super().search(crashInfo)
+
+        self.load_signatures()
+        for sig_file, crash_sig, metadata in self.signatures:
+            if crash_sig.matches(crashInfo):
+                return sig_file, metadata
+        return None, None
 
 
 def make_collector():
     """Creates a jsfunfuzz collector specifying ~/sigcache as the signature cache dir
 
     Returns:
-        Collector: jsfunfuzz collector object
+        SigCacheCollector: jsfunfuzz collector object
     """
     sigcache_path = Path.home() / "sigcache"
     sigcache_path.mkdir(exist_ok=True)
-    return Collector(sigCacheDir=str(sigcache_path), tool="jsfunfuzz")
+    return SigCacheCollector(sigCacheDir=str(sigcache_path), tool="jsfunfuzz")
 
 
 def printCrashInfo(crashInfo):  # pylint: disable=invalid-name,missing-docstring
@@ -14,18 +14,30 @@ def amiss(log_prefix):  # pylint: disable=missing-param-doc,missing-return-doc,m
     """Look for "szone_error" (Tiger), "malloc_error_break" (Leopard), "MallocHelp" (?)
     which are signs of malloc being unhappy (double free, out-of-memory, etc).
     """
-    found_something = False
     err_log = (log_prefix.parent / f"{log_prefix.stem}-err").with_suffix(".txt")
     with io.open(str(err_log), "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.strip("\x07").rstrip("\n")
-            if (line.find("szone_error") != -1 or
-                    line.find("malloc_error_break") != -1 or
-                    line.find("MallocHelp") != -1):
-                print()
-                print(line)
-                found_something = True
-                break  # Don't flood the log with repeated malloc failures
+        return amiss_lines(f)
+
+
+def amiss_lines(err_lines):
+    """Look for signs of malloc being unhappy in stderr lines that are already in memory, see amiss.
+
+    Args:
+        err_lines (iterable): Lines of stderr
+
+    Returns:
+        bool: True if malloc reported an error, False otherwise
+    """
+    found_something = False
+    for line in err_lines:
+        line = line.strip("\x07").rstrip("\n")
+        if (line.find("szone_error") != -1 or
+                line.find("malloc_error_break") != -1 or
+                line.find("MallocHelp") != -1):
+            print()
+            print(line)
+            found_something = True
+            break  # Don't flood the log with repeated malloc failures
 
     return found_something
 
@@ -7,6 +7,33 @@
 """Helper functions dealing with the files on the file system.
 """
 
+import io
+import os
+from pathlib import Path
+import tempfile
+
+
+def atomic_write(file_path, contents):
+    """Write a file by renaming a temporary file over it, so concurrent readers never see a partially-written file.
+
+    Line endings are written as they are, even on Windows, so byte offsets computed from the contents stay valid.
+
+    Args:
+        file_path (Path): Path to the file to be written
+        contents (str): Contents of the file
+
+    Raises:
+        OSError: Raised if the file could not be written
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{file_path.name}.", suffix=".tmp", dir=str(file_path.parent))
+    try:
+        with io.open(fd, "w", encoding="utf-8", errors="replace", newline="") as f:
+            f.write(contents)
+        os.replace(tmp_path, str(file_path))
+    finally:
+        if Path(tmp_path).is_file():
+            Path(tmp_path).unlink()
+
 
 def delete_logs(log_prefix):
     """Whoever might call baseLevel should eventually call this function (unless a bug was found).
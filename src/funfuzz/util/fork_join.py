@@ -7,46 +7,19 @@
 """Functions dealing with multiple processes.
 """
 
-import io
-import multiprocessing
-from pathlib import Path
-import sys
+from . import supervisor
 
 
 # Call |fun| in a bunch of separate processes, then wait for them all to finish.
 # fun is called with someArgs, plus an additional argument with a numeric ID.
 # |fun| must be a top-level function (not a closure) so it can be pickled on Windows.
+# Children that crash are restarted and their output is streamed while they run, see supervisor.Supervisor.
 def forkJoin(logDir, numProcesses, fun, *someArgs):  # pylint: disable=invalid-name,missing-docstring
-    def showFile(fn):  # pylint: disable=invalid-name
-        print(f"==== {fn} ====")
-        print()
-        with io.open(str(fn), "r", encoding="utf-8", errors="replace") as f:
-            for line in f:
-                print(line.rstrip())
-        print()
-
-    # Fork a bunch of processes
     print(f"Forking {numProcesses} children...")
-    ps = []  # pylint: disable=invalid-name
-    for i in range(numProcesses):
-        p = multiprocessing.Process(  # pylint: disable=invalid-name
-            target=redirectOutputAndCallFun, args=[logDir, i, fun, someArgs], name=f"Parallel process {i}")
-        p.start()
-        ps.append(p)
-
-    # Wait for them all to finish, and splat their outputs
-    for i in range(numProcesses):
-        p = ps[i]  # pylint: disable=invalid-name
-        print(f"=== Waiting for child #{i} ({p.pid}) to finish... ===")
-        p.join()
-        print(f"=== Child process #{i} exited with code {p.exitcode} ===")
-        print()
-        showFile(log_name(logDir, i, "out"))
-        showFile(log_name(logDir, i, "err"))
-        print()
+    with supervisor.Supervisor(logDir, fun, someArgs, heartbeat_timeout=None) as pool:
+        pool.run(lambda _active: numProcesses)
 
 
-# Functions used by forkJoin are top-level so they can be "pickled" (required on Windows)
 def log_name(log_dir, i, log_type):
     """Returns the path of the forkjoin log file as a string.
 
@@ -58,13 +31,7 @@ def log_name(log_dir, i, log_type):
     Returns:
         str: The forkjoin log file path
     """
-    return str(Path(log_dir) / f"forkjoin-{i}-{log_type}.txt")
-
-
-def redirectOutputAndCallFun(logDir, i, fun, someArgs):  # pylint: disable=invalid-name,missing-docstring
-    sys.stdout = io.open(log_name(logDir, i, "out"), "w", buffering=1)
-    sys.stderr = io.open(log_name(logDir, i, "err"), "w", buffering=1)
-    fun(*(someArgs + (i,)))
+    return supervisor.log_name(log_dir, i, log_type)
 
 
 # You should see:
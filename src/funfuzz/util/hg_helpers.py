@@ -160,6 +160,58 @@ def get_repo_hash_and_id(repo_dir, repo_rev="parents() and default"):
     return hg_id_hash, hg_id_local_num, is_on_default
 
 
+def get_working_dir_hash(repo_dir):
+    """Return the full hash of the changeset the working directory of a repository is at.
+
+    Args:
+        repo_dir (Path): Full path to the repository
+
+    Returns:
+        str: Changeset hash, or None if repo_dir is not a Mercurial repository or hg is unavailable
+    """
+    try:
+        return subprocess.run(
+            ["hg", "-R", str(repo_dir), "log", "-r", ".", "--template={node}"],
+            cwd=os.getcwd(),
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=99,
+            ).stdout.decode("utf-8", errors="replace").strip() or None
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+
+
+def get_changed_paths(repo_dir, from_rev, dirs):
+    """Return the files changed between a changeset and the working directory, within some directories.
+
+    Args:
+        repo_dir (Path): Full path to the repository
+        from_rev (str): Changeset to compare the working directory with
+        dirs (list): Directories to look in, relative to the root of the repository
+
+    Returns:
+        dict: Paths relative to the root of the repository, as strings with forward slashes, mapped to True if they
+              were added or modified and False if they were removed, or None if hg could not compare them
+    """
+    try:
+        status = subprocess.run(
+            ["hg", "status", "--rev", from_rev, "-amrd"] + [f"path:{Path(x).as_posix()}" for x in dirs],
+            cwd=str(repo_dir),  # Paths are printed relative to the current directory
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=999,
+            ).stdout.decode("utf-8", errors="replace")
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+    changed_paths = {}
+    for line in status.splitlines():
+        if len(line) > 2 and line[1] == " ":
+            changed_paths[Path(line[2:]).as_posix()] = line[0] in "AM"
+    return changed_paths
+
+
 def hgrc_repo_name(repo_dir):
     """Look in the hgrc file in the .hg directory of the Mercurial repository and return the name.
 
@@ -18,6 +18,7 @@ import time
 
 from pkg_resources import parse_version
 
+from . import shell_runner
 from . import subprocesses as sps
 
 NO_DUMP_MSG = r"""
@@ -127,6 +128,16 @@ def disable_corefile():
     resource.setrlimit(resource.RLIMIT_CORE, (0, 0))  # pylint: disable=no-member
 
 
+def corefile_rlimits():
+    """Retrieve the resource limits that disable core files. Must only be called on POSIX.
+
+    Returns:
+        dict: Soft and hard limits keyed by resource
+    """
+    import resource  # module only available on POSIX  pylint: disable=import-error
+    return {resource.RLIMIT_CORE: (0, 0)}  # pylint: disable=no-member
+
+
 def get_core_limit():
     """Returns the maximum core file size that the current process can create.
 
@@ -178,7 +189,7 @@ def grab_crash_log(prog_full_path, crashed_pid, log_prefix, want_stack):
         sps.vdump(" ".join([str(x) for x in dbggr_cmd]))
         core_file = Path(dbggr_cmd[-1])
         assert core_file.is_file()
-        dbbgr_exit_code = subprocess.run(
+        dbbgr_exit_code = shell_runner.spawn(
             [str(x) for x in dbggr_cmd],
             stdin=None,
             stderr=subprocess.STDOUT,
@@ -187,8 +198,8 @@ def grab_crash_log(prog_full_path, crashed_pid, log_prefix, want_stack):
             # (http://docs.python.org/library/subprocess.html)
             close_fds=(os.name == "posix"),
             # Do not generate a core_file if gdb crashes in Linux
-            preexec_fn=(disable_corefile if platform.system() == "Linux" else None),
-        ).returncode
+            rlimits=(corefile_rlimits() if platform.system() == "Linux" else None),
+        ).wait()
         if dbbgr_exit_code != 0:
             print(f'Debugger exited with code {dbbgr_exit_code} : {" ".join(quote(str(x)) for x in dbggr_cmd)}')
         if use_logfiles:  # pylint: disable=no-else-return
@@ -0,0 +1,139 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Manages the scratch space used by fuzzing iterations.
+
+Per-iteration logs and testcases are placed on a RAM-backed filesystem such as /dev/shm when it has enough room, and
+only the artifacts of interesting iterations are moved to the persistent wtmp directory.
+"""
+
+import os
+from pathlib import Path
+import platform
+import re
+import shutil
+import tempfile
+
+RAM_BACKED_DIR = Path("/dev/shm")
+SCRATCH_BUDGET = 512 * 2 ** 20  # 512 MB, free space required on the RAM-backed filesystem for each iteration
+SCRATCH_DIR_PREFIX = "funfuzz-scratch-"
+
+
+def is_pid_alive(pid):
+    """Check if a process is still running.
+
+    Args:
+        pid (int): Process ID
+
+    Returns:
+        bool: True if the process exists, False otherwise
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # The process exists but belongs to another user
+        return True
+    return True
+
+
+def remove_stale_scratch_dirs(base_dir):
+    """Remove scratch directories left behind by processes that are no longer running, e.g. after a crash.
+
+    Args:
+        base_dir (Path): Directory in which scratch directories are created
+    """
+    for scratch_dir in base_dir.glob(f"{SCRATCH_DIR_PREFIX}*"):
+        match = re.match(rf"{SCRATCH_DIR_PREFIX}(\d+)-", scratch_dir.name)
+        if match and not is_pid_alive(int(match.group(1))):
+            shutil.rmtree(str(scratch_dir), ignore_errors=True)
+
+
+def ram_backed_dir(budget):
+    """Retrieve the RAM-backed directory to use for scratch space, if there is one with enough room.
+
+    Args:
+        budget (int): Free space required, in bytes
+
+    Returns:
+        Path: The RAM-backed directory, or None if none is usable
+    """
+    if platform.system() != "Linux" or not RAM_BACKED_DIR.is_dir() or not os.access(str(RAM_BACKED_DIR), os.W_OK):
+        return None
+    if shutil.disk_usage(str(RAM_BACKED_DIR)).free < budget:
+        return None
+    return RAM_BACKED_DIR
+
+
+class ScratchSpace:
+    """Scratch space for fuzzing iterations, with one directory per iteration.
+
+    Args:
+        persistent_dir (Path): Directory where artifacts of interesting iterations are kept, e.g. the wtmp directory
+        budget (int): Free space required on the RAM-backed filesystem, below which the disk is used instead
+    """
+    def __init__(self, persistent_dir, budget=SCRATCH_BUDGET):
+        self.persistent_dir = persistent_dir
+        self.budget = budget
+        self.disk_root = persistent_dir / "scratch"
+
+        self.ram_root = None
+        ram_dir = ram_backed_dir(budget)
+        if ram_dir:
+            remove_stale_scratch_dirs(ram_dir)
+            self.ram_root = Path(tempfile.mkdtemp(prefix=f"{SCRATCH_DIR_PREFIX}{os.getpid()}-", dir=str(ram_dir)))
+        print(f"Scratch space for iterations is in {self.ram_root or self.disk_root}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def iteration_dir(self, iteration):
+        """Create an empty directory for an iteration, on the RAM-backed filesystem if it still has enough room.
+
+        Args:
+            iteration (int): Number of the iteration
+
+        Returns:
+            Path: Directory for the iteration
+        """
+        root = self.disk_root
+        if self.ram_root and shutil.disk_usage(str(self.ram_root)).free >= self.budget:
+            root = self.ram_root
+        iteration_dir = root / f"i{iteration}"
+        iteration_dir.mkdir(parents=True)
+        return iteration_dir
+
+    def persist(self, iteration_dir):
+        """Move the remaining contents of an iteration directory to the persistent directory.
+
+        Args:
+            iteration_dir (Path): Directory of the iteration
+        """
+        for entry in iteration_dir.iterdir():
+            target = self.persistent_dir / entry.name
+            if target.is_dir():
+                shutil.rmtree(str(target))
+            elif target.exists():
+                target.unlink()
+            shutil.move(str(entry), str(target))
+
+    @staticmethod
+    def clear(iteration_dir):
+        """Remove an iteration directory along with everything in it.
+
+        Args:
+            iteration_dir (Path): Directory of the iteration
+        """
+        shutil.rmtree(str(iteration_dir), ignore_errors=True)
+
+    def cleanup(self):
+        """Remove all scratch space."""
+        if self.ram_root:
+            shutil.rmtree(str(self.ram_root), ignore_errors=True)
+        shutil.rmtree(str(self.disk_root), ignore_errors=True)
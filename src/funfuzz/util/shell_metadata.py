@@ -0,0 +1,109 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Persist information about a js shell binary in JSON files stored next to it, e.g. in its shell-cache directory.
+
+Each file records the content hash of the binary it describes, so stale information is ignored if the binary at that
+path is ever replaced.
+"""
+
+from functools import lru_cache
+import hashlib
+import io
+import json
+from pathlib import Path
+
+from . import file_system_helpers
+
+HASH_CHUNK_SIZE = 2 ** 20  # 1 MB
+
+
+@lru_cache(maxsize=None)
+def _hash_file(file_path, _size, _mtime_ns):
+    """Compute the SHA-1 hash of a file. The size and modification time are only used as part of the cache key.
+
+    Args:
+        file_path (str): Path to the file
+        _size (int): Size of the file in bytes
+        _mtime_ns (int): Modification time of the file in nanoseconds
+
+    Returns:
+        str: Hexadecimal SHA-1 hash of the file contents
+    """
+    sha1 = hashlib.sha1()
+    with io.open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def binary_hash(binary_path):
+    """Retrieve the content hash of a binary. The hash is only recomputed if the binary changes on disk.
+
+    Args:
+        binary_path (Path): Path to the binary
+
+    Returns:
+        str: Hexadecimal SHA-1 hash of the binary
+    """
+    binary_path = Path(binary_path).expanduser().resolve()
+    stat_result = binary_path.stat()
+    return _hash_file(str(binary_path), stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def metadata_path(binary_path, name):
+    """Retrieve the path of a metadata file stored next to the binary.
+
+    Args:
+        binary_path (Path): Path to the binary
+        name (str): Name of the metadata, e.g. "build-configuration"
+
+    Returns:
+        Path: Path to the metadata file
+    """
+    binary_path = Path(binary_path).expanduser().resolve()
+    return binary_path.parent / f"{binary_path.stem}.{name}.json"
+
+
+def load_metadata(binary_path, name):
+    """Load metadata stored next to a binary, if it exists and still describes the binary.
+
+    Args:
+        binary_path (Path): Path to the binary
+        name (str): Name of the metadata, e.g. "build-configuration"
+
+    Returns:
+        object: The stored metadata, or None if it is absent, unreadable or belongs to a different binary
+    """
+    json_path = metadata_path(binary_path, name)
+    try:
+        with io.open(str(json_path), "r", encoding="utf-8", errors="replace") as f:
+            contents = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(contents, dict) or contents.get("binary_hash") != binary_hash(binary_path):
+        return None
+    return contents.get(name)
+
+
+def save_metadata(binary_path, name, data):
+    """Atomically store metadata next to a binary, so concurrent readers never see a partially-written file.
+
+    Args:
+        binary_path (Path): Path to the binary
+        name (str): Name of the metadata, e.g. "build-configuration"
+        data (object): JSON-serializable metadata
+
+    Returns:
+        bool: True if the metadata was written, False if the directory of the binary is not writable
+    """
+    contents = {"binary_hash": binary_hash(binary_path), name: data}
+    try:
+        file_system_helpers.atomic_write(metadata_path(binary_path, name),
+                                         json.dumps(contents, indent=1, sort_keys=True))
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,520 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Runs a js shell with a timeout, capturing its stdout and stderr through pipes instead of log files.
+
+Output is kept in memory, and only spills over to an anonymous temporary file if it grows beyond a size limit, so
+uninteresting runs do not create, read back and delete log files.
+
+Resource limits are set before the command is executed by running it through the prlimit command of util-linux where
+it is installed, and from a preexec_fn otherwise. Without a preexec_fn, subprocess in Python 3.10 and later can start
+the child with vfork instead of a plain fork of a large worker, while older versions fork either way.
+
+On Linux, the harness waits for the process on a pidfd, so it wakes up as soon as the process exits or the timeout
+expires instead of polling, and reaps it with wait4 to get its resource usage. A CPU time limit can also be enforced
+with RLIMIT_CPU, in which case the kernel kills the process with SIGXCPU.
+"""
+
+import functools
+import io
+import os
+import platform
+import select
+import shutil
+import signal
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+(CRASHED, TIMED_OUT, NORMAL, ABNORMAL, NONE) = range(5)  # Same values as Lithium's timed_run
+
+CANCEL_POLL_INTERVAL = 0.05  # seconds
+SPAWN_LATENCY_RUNS = 20
+MAX_IN_MEMORY_SIZE = 8 * 2 ** 20  # 8 MB per stream
+READ_CHUNK_SIZE = 2 ** 16
+PRLIMIT_RESOURCES = ("as", "core", "cpu", "data", "fsize", "memlock", "nofile", "nproc", "rss", "stack")
+
+
+class CapturedOutput:
+    """Output of a stream, held in memory until it grows beyond max_in_memory_size bytes.
+
+    Args:
+        max_in_memory_size (int): Size in bytes after which the output is spilled to a temporary file
+    """
+    def __init__(self, max_in_memory_size=MAX_IN_MEMORY_SIZE):
+        self.spool = tempfile.SpooledTemporaryFile(max_size=max_in_memory_size)  # pylint: disable=consider-using-with
+        self.size = 0
+
+    def write(self, data):
+        """Append data to the captured output.
+
+        Args:
+            data (bytes): Data read from the stream
+        """
+        self.spool.write(data)
+        self.size += len(data)
+
+    def lines(self):
+        """Decode the captured output into lines.
+
+        Returns:
+            list: Lines of the output, including their line endings
+        """
+        self.spool.seek(0)
+        # Decode like io.open in text mode would, i.e. with universal newlines
+        return io.StringIO(self.spool.read().decode("utf-8", errors="replace"), newline=None).readlines()
+
+    def save(self, path):
+        """Materialize the captured output in a file.
+
+        Args:
+            path (Path): Path to the file to be written
+        """
+        self.spool.seek(0)
+        with io.open(str(path), "wb") as f:
+            shutil.copyfileobj(self.spool, f)
+
+    def close(self):
+        """Release the memory or temporary file holding the output."""
+        self.spool.close()
+
+
+def _rusage_dict(rusage):
+    """Extract the interesting parts of the resource usage of a process.
+
+    Args:
+        rusage (resource.struct_rusage): Resource usage, as returned by os.wait4
+
+    Returns:
+        dict: Peak resident set size in bytes, user and system CPU time in seconds, and numbers of page faults
+    """
+    # ru_maxrss is in bytes on macOS, but in kilobytes elsewhere
+    max_rss = rusage.ru_maxrss if platform.system() == "Darwin" else rusage.ru_maxrss * 1024
+    return {
+        "max_rss": max_rss,
+        "user_time": rusage.ru_utime,
+        "sys_time": rusage.ru_stime,
+        "minor_faults": rusage.ru_minflt,
+        "major_faults": rusage.ru_majflt,
+    }
+
+
+class RunResult:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """Results of a timed_run, with attribute names compatible with those of Lithium's RunData.
+
+    Args:
+        sta (int): One of CRASHED, TIMED_OUT, NORMAL or ABNORMAL
+        return_code (int): Return code of the process, or None if it timed out
+        msg (str): Human-readable description of the status
+        elapsedtime (float): Time taken by the run, in seconds
+        pid (int): Process ID of the run
+        out (CapturedOutput): Captured stdout
+        err (CapturedOutput): Captured stderr
+        spawn_time (float): Part of elapsedtime taken to start the process, in seconds
+        rusage (dict): Resource usage of the process, see _rusage_dict, or None if unavailable, e.g. on Windows
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, sta, return_code, msg, elapsedtime, pid, out, err, spawn_time=0.0, rusage=None):
+        self.sta = sta
+        self.return_code = return_code
+        self.msg = msg
+        self.elapsedtime = elapsedtime
+        self.spawn_time = spawn_time
+        self.rusage = rusage
+        self.killed = sta == TIMED_OUT
+        self.pid = pid
+        self.out = out
+        self.err = err
+
+    def save(self, log_prefix):
+        """Materialize stdout and stderr in the same -out.txt and -err.txt files that Lithium's timed_run writes.
+
+        Args:
+            log_prefix (Path): Prefix of the log name
+        """
+        self.out.save((log_prefix.parent / f"{log_prefix.stem}-out").with_suffix(".txt"))
+        self.err.save((log_prefix.parent / f"{log_prefix.stem}-err").with_suffix(".txt"))
+
+    def close(self):
+        """Release the captured output."""
+        self.out.close()
+        self.err.close()
+
+
+def _drain(stream, captured, line_callback=None):
+    """Read a pipe until it is closed.
+
+    Args:
+        stream (file): Pipe to be read
+        captured (CapturedOutput): Where the data read is stored
+        line_callback (function): Called with each line read, without its line ending, as soon as it is complete
+    """
+    partial_line = b""
+    with stream:
+        for chunk in iter(lambda: stream.read1(READ_CHUNK_SIZE), b""):
+            captured.write(chunk)
+            if line_callback:
+                lines = (partial_line + chunk).split(b"\n")
+                partial_line = lines.pop()
+                for line in lines:
+                    line_callback(line)
+    if line_callback and partial_line:
+        line_callback(partial_line)
+
+
+def _signal_name(signum):
+    """Retrieve the name of a signal.
+
+    Args:
+        signum (int): Signal number
+
+    Returns:
+        str: Name of the signal, e.g. "SIGSEGV"
+    """
+    try:
+        return signal.Signals(signum).name  # pylint: disable=no-member
+    except ValueError:
+        return "Unknown signal"
+
+
+def wait_or_cancel(child, timeout, cancel_event):
+    """Wait for a process to exit, unless it times out or the run is cancelled.
+
+    Args:
+        child (Popen): Process to wait for
+        timeout (int): Timeout in seconds
+        cancel_event (threading.Event): Event that is set when the run is no longer needed, or None
+
+    Returns:
+        bool: True if the process exited by itself, False if it timed out or was cancelled
+    """
+    if cancel_event is None:
+        try:
+            child.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        return True
+
+    deadline = time.time() + timeout
+    while not cancel_event.is_set():
+        try:
+            child.wait(timeout=max(min(CANCEL_POLL_INTERVAL, deadline - time.time()), 0))
+            return True
+        except subprocess.TimeoutExpired:
+            if time.time() >= deadline:
+                return False
+    return False
+
+
+def wait_on_pidfd(child, timeout, cancel_event):
+    """Wait for a process to exit by polling its pidfd, unless it times out or the run is cancelled. Linux-only.
+
+    Args:
+        child (Popen): Process to wait for, which must not have been reaped yet
+        timeout (int): Timeout in seconds
+        cancel_event (threading.Event): Event that is set when the run is no longer needed, or None
+
+    Returns:
+        bool: True if the process exited by itself, False if it timed out or was cancelled
+    """
+    pidfd = os.pidfd_open(child.pid)  # pylint: disable=no-member
+    try:
+        with select.epoll() as epoll:  # pylint: disable=no-member
+            epoll.register(pidfd, select.EPOLLIN)  # pylint: disable=no-member
+            deadline = time.monotonic() + timeout
+            while cancel_event is None or not cancel_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if cancel_event is not None:
+                    remaining = min(remaining, CANCEL_POLL_INTERVAL)
+                if epoll.poll(remaining):
+                    return True
+    finally:
+        os.close(pidfd)
+    return False
+
+
+def wait_for_exit(child, timeout, cancel_event):
+    """Wait for a process to exit, on its pidfd where supported, unless it times out or the run is cancelled.
+
+    Args:
+        child (Popen): Process to wait for
+        timeout (int): Timeout in seconds
+        cancel_event (threading.Event): Event that is set when the run is no longer needed, or None
+
+    Returns:
+        bool: True if the process exited by itself, False if it timed out or was cancelled
+    """
+    if hasattr(os, "pidfd_open") and hasattr(select, "epoll"):
+        try:
+            return wait_on_pidfd(child, timeout, cancel_event)
+        except OSError:  # pidfd_open needs Linux 5.3 or later
+            pass
+    return wait_or_cancel(child, timeout, cancel_event)
+
+
+def reap(child):
+    """Reap a process that exited or was killed, collecting its resource usage where possible.
+
+    Args:
+        child (Popen): Process to reap
+
+    Returns:
+        dict: Resource usage of the process, see _rusage_dict, or None if it was already reaped or on Windows
+    """
+    if child.returncode is not None or not hasattr(os, "wait4"):
+        child.wait()
+        return None
+    _pid, status, rusage = os.wait4(child.pid, 0)  # pylint: disable=no-member
+    child.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return _rusage_dict(rusage)
+
+
+def cpu_timed_out(return_code, rusage, cpu_timeout):
+    """Check if a process was killed by the kernel for exceeding its CPU time limit, see timed_run.
+
+    Args:
+        return_code (int): Return code of the process
+        rusage (dict): Resource usage of the process, or None if unavailable
+        cpu_timeout (int): CPU time limit in seconds, or None
+
+    Returns:
+        bool: True if the process ran out of CPU time, False otherwise
+    """
+    if not cpu_timeout or platform.system() == "Windows":
+        return False
+    if return_code == -signal.SIGXCPU:  # pylint: disable=no-member
+        return True
+    # The kernel sends SIGKILL once the hard limit is reached, if the process survives SIGXCPU
+    return (return_code == -signal.SIGKILL and rusage is not None and  # pylint: disable=no-member
+            rusage["user_time"] + rusage["sys_time"] >= cpu_timeout)
+
+
+def set_rlimits(rlimits, preexec_fn=None):
+    """Set resource limits of the current process, e.g. from a preexec_fn. Must only be called on POSIX.
+
+    Args:
+        rlimits (dict): Soft and hard limits, keyed by resource, e.g. resource.RLIMIT_AS
+        preexec_fn (function): Called afterwards, if any
+    """
+    import resource  # module only available on POSIX  pylint: disable=import-error
+    for limit, value in rlimits.items():
+        resource.setrlimit(limit, value)  # pylint: disable=no-member
+    if preexec_fn:
+        preexec_fn()
+
+
+@functools.lru_cache(maxsize=None)
+def prlimit_path():
+    """Find the prlimit command of util-linux, which sets resource limits and then executes a command in its place.
+
+    Returns:
+        str: Path to prlimit, or None if it is not installed, e.g. when not on Linux
+    """
+    return shutil.which("prlimit")
+
+
+def prlimit_wrapper(rlimits):
+    """Build the prlimit command that sets resource limits before executing the command that follows it.
+
+    Args:
+        rlimits (dict): Soft and hard limits, keyed by resource, e.g. resource.RLIMIT_AS
+
+    Returns:
+        list: prlimit and its arguments, or None if prlimit is not installed or does not support one of the resources
+    """
+    if not prlimit_path():
+        return None
+    import resource  # module only available on POSIX  pylint: disable=import-error
+    names = {getattr(resource, f"RLIMIT_{x.upper()}", None): x for x in PRLIMIT_RESOURCES}
+    if any(limit is None or limit not in names for limit in rlimits):
+        return None
+    wrapper = [prlimit_path()]
+    for limit, values in rlimits.items():
+        values = ["unlimited" if x == resource.RLIM_INFINITY else str(x) for x in values]  # pylint: disable=no-member
+        wrapper.append(f"--{names[limit]}={':'.join(values)}")
+    return wrapper + ["--"]
+
+
+def limit_command(cmd_with_args, rlimits, preexec_fn=None):
+    """Arrange for resource limits to be set in the child process before a command is executed.
+
+    The command is run through prlimit where possible, which keeps the process ID of the command. Otherwise the limits
+    are set from a preexec_fn.
+
+    Args:
+        cmd_with_args (list): Command and its arguments
+        rlimits (dict): Soft and hard limits, keyed by resource, e.g. resource.RLIMIT_AS, ignored on Windows
+        preexec_fn (function): Called in the child process before the command is executed, on POSIX
+
+    Returns:
+        tuple: Command to run and its arguments, and the preexec_fn to pass to subprocess, or None if none is needed
+    """
+    if platform.system() == "Windows":
+        return cmd_with_args, None
+    if not rlimits:
+        return cmd_with_args, preexec_fn
+    wrapper = prlimit_wrapper(rlimits)
+    if wrapper is None:
+        return cmd_with_args, functools.partial(set_rlimits, rlimits, preexec_fn)
+    return wrapper + list(cmd_with_args), preexec_fn
+
+
+def spawn(cmd_with_args, rlimits=None, preexec_fn=None, **popen_kw):
+    """Start a process with resource limits, which are set before the command is executed, see limit_command.
+
+    Args:
+        cmd_with_args (list): Command and its arguments
+        rlimits (dict): Soft and hard limits, keyed by resource, e.g. resource.RLIMIT_AS, ignored on Windows
+        preexec_fn (function): Called in the child process before the command is executed, on POSIX
+        popen_kw (dict): Other arguments to subprocess.Popen
+
+    Returns:
+        subprocess.Popen: The started process
+    """
+    cmd_with_args, preexec_fn = limit_command(cmd_with_args, rlimits, preexec_fn)
+    if preexec_fn:
+        popen_kw["preexec_fn"] = preexec_fn
+    return subprocess.Popen(cmd_with_args, **popen_kw)  # pylint: disable=consider-using-with
+
+
+def cpu_time_rlimits(rlimits, cpu_timeout):
+    """Add a limit on CPU time to resource limits, on POSIX.
+
+    Args:
+        rlimits (dict): Soft and hard limits, keyed by resource, if any
+        cpu_timeout (int): CPU time in seconds after which the kernel kills the process, if any
+
+    Returns:
+        dict: Soft and hard limits, keyed by resource, or rlimits as is if there is no CPU timeout or not on POSIX
+    """
+    if not cpu_timeout or platform.system() == "Windows":
+        return rlimits
+    import resource  # module only available on POSIX  pylint: disable=import-error
+    rlimits = dict(rlimits or {})
+    # SIGXCPU is sent at the soft limit, and SIGKILL at the hard limit. Like a crash, SIGXCPU may dump core.
+    rlimits[resource.RLIMIT_CPU] = (cpu_timeout, cpu_timeout + 1)  # pylint: disable=no-member
+    return rlimits
+
+
+def children_rusage():
+    """Retrieve the resource usage of all child processes reaped so far, on POSIX.
+
+    Returns:
+        dict: Resource usage, see _rusage_dict, with the peak resident set size of the largest child, or None if
+              unavailable, e.g. on Windows
+    """
+    try:
+        import resource  # module only available on POSIX  pylint: disable=import-error
+    except ImportError:
+        return None
+    return _rusage_dict(resource.getrusage(resource.RUSAGE_CHILDREN))  # pylint: disable=no-member
+
+
+def run_status(return_code, timed_out, cancelled=False, rusage=None, cpu_timeout=None):
+    """Determine the status of a finished run.
+
+    Args:
+        return_code (int): Return code of the process
+        timed_out (bool): Whether the process had to be killed after the timeout
+        cancelled (bool): Whether the process was killed because its result was no longer needed
+        rusage (dict): Resource usage of the process, see _rusage_dict, if any
+        cpu_timeout (int): CPU time in seconds after which the kernel kills the process, if any
+
+    Returns:
+        tuple: One of CRASHED, TIMED_OUT, NORMAL or ABNORMAL, and a human-readable description of it
+    """
+    if timed_out:
+        return TIMED_OUT, "CANCELLED" if cancelled else "TIMED OUT"
+    if cpu_timed_out(return_code, rusage, cpu_timeout):
+        return TIMED_OUT, "CPU TIMED OUT"
+    if return_code == 0:
+        return NORMAL, "NORMAL"
+    if 0 < return_code < 0x80000000:
+        return ABNORMAL, f"ABNORMAL exit code {return_code}"
+    # Negative return codes on POSIX are signals, large ones on Windows are exceptions
+    if return_code < 0:
+        return CRASHED, f"CRASHED signal {-return_code} ({_signal_name(-return_code)})"
+    return CRASHED, "CRASHED"
+
+
+def measure_spawn_latency(cmd_with_args, rlimits, runs=SPAWN_LATENCY_RUNS):
+    """Compare the time taken to spawn a process with resource limits set by prlimit and from a preexec_fn.
+
+    Args:
+        cmd_with_args (list): Command and its arguments
+        rlimits (dict): Soft and hard limits, keyed by resource, e.g. resource.RLIMIT_AS
+        runs (int): Number of processes spawned each way
+
+    Returns:
+        dict: Median spawn time in seconds, keyed by "prlimit" and "preexec_fn"
+    """
+    cmd_with_args = [str(x) for x in cmd_with_args]
+    spawn_kw = {
+        "prlimit": {"rlimits": rlimits},
+        "preexec_fn": {"preexec_fn": functools.partial(set_rlimits, rlimits)},
+    }
+    latency = {}
+    for way, kw in spawn_kw.items():
+        spawn_times = []
+        for _ in range(runs):
+            start_time = time.time()
+            child = spawn(cmd_with_args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL, **kw)
+            spawn_times.append(time.time() - start_time)
+            child.wait()
+        latency[way] = statistics.median(spawn_times)
+    return latency
+
+
+def timed_run(cmd_with_args, timeout, env=None, preexec_fn=None, max_in_memory_size=MAX_IN_MEMORY_SIZE,
+              cancel_event=None, stdout_line_callback=None, rlimits=None, cpu_timeout=None):
+    """Run a command with a timeout, capturing its output in memory.
+
+    Args:
+        cmd_with_args (list): Command and its arguments
+        timeout (int): Timeout in seconds, after which the process is killed
+        env (dict): Environment to run the command in
+        preexec_fn (function): Called in the child process before the command is executed, on POSIX
+        max_in_memory_size (int): Size in bytes after which each stream is spilled to a temporary file
+        cancel_event (threading.Event): If set while the command runs, it is killed as if it had timed out
+        stdout_line_callback (function): Called from another thread with each line of stdout, as it is written
+        rlimits (dict): Resource limits of the command, see spawn
+        cpu_timeout (int): CPU time in seconds after which the kernel kills the process, on POSIX
+
+    Returns:
+        RunResult: Status of the run and its captured output
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    cmd_with_args = [str(x) for x in cmd_with_args]
+    out = CapturedOutput(max_in_memory_size)
+    err = CapturedOutput(max_in_memory_size)
+
+    rlimits = cpu_time_rlimits(rlimits, cpu_timeout)
+    start_time = time.time()
+    child = spawn(cmd_with_args, rlimits=rlimits, preexec_fn=preexec_fn, env=env, stdin=subprocess.DEVNULL,
+                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    spawn_time = time.time() - start_time
+    readers = [threading.Thread(target=_drain, args=(child.stdout, out, stdout_line_callback)),
+               threading.Thread(target=_drain, args=(child.stderr, err))]
+    for reader in readers:
+        reader.start()
+
+    timed_out = not wait_for_exit(child, timeout, cancel_event)
+    if timed_out:
+        child.kill()
+    rusage = reap(child)
+    for reader in readers:
+        reader.join()
+    elapsedtime = time.time() - start_time
+
+    sta, msg = run_status(child.returncode, timed_out, cancel_event is not None and cancel_event.is_set(), rusage,
+                          cpu_timeout)
+    return RunResult(sta, child.returncode if sta != TIMED_OUT else None, msg, elapsedtime, child.pid, out, err,
+                     spawn_time, rusage)
@@ -0,0 +1,386 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Aggregates the statistics of all fuzzing workers of a machine while they run.
+
+Workers send snapshots of their statistics as JSON datagrams to a local UDP port. The aggregator serves the latest
+snapshot of each worker, along with compilation statistics of the bot, in Prometheus text format on the same port
+number over HTTP, and periodically writes a rolled-up JSON snapshot so throughput can be compared across builds.
+Workers that stop sending snapshots, e.g. because they exited or were restarted, are dropped after a while: their
+gauges no longer count, and their counters are kept in a separate total of retired workers.
+
+bot runs the aggregator in a process of its own, so the workers it forks inherit neither the threads of the aggregator
+nor its sockets.
+"""
+
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+import json
+import multiprocessing
+import socket
+import socketserver
+import threading
+import time
+
+from . import file_system_helpers
+
+STATS_HOST = "127.0.0.1"
+SNAPSHOT_INTERVAL = 60  # seconds between writes of the rolled-up snapshot
+MAX_DATAGRAM_SIZE = 65507
+WORKER_EXPIRY = 3 * 60  # seconds without a snapshot after which a worker is deemed gone, i.e. a few stats intervals
+RETIRED_WORKER = "retired"  # Value of the worker label of the counters of retired workers
+
+# Statistics of worker snapshots that are summed up: name in the snapshot, Prometheus metric, type and help text
+WORKER_METRICS = [
+    ("execs_done", "funfuzz_execs_total", "counter", "Number of js shell runs"),
+    ("execs_per_sec", "funfuzz_execs_per_second", "gauge", "Average number of js shell runs per second"),
+    ("interesting", "funfuzz_interesting_total", "counter", "Number of iterations that found something interesting"),
+    ("stage_lithium_in_flight", "funfuzz_reductions_in_flight", "gauge", "Number of Lithium reductions running"),
+]
+SUMMED_KEYS = [key for key, _, _, _ in WORKER_METRICS]
+COUNTER_KEYS = [key for key, _, metric_type, _ in WORKER_METRICS if metric_type == "counter"]
+
+
+def is_counter(key):
+    """Check if a statistic of a worker snapshot only ever grows, so it still counts once the worker is gone.
+
+    Args:
+        key (str): Name of the statistic in the snapshot
+
+    Returns:
+        bool: True for counters, False for gauges and other statistics
+    """
+    return key in COUNTER_KEYS or key.startswith("found_") or (key.startswith("stage_") and key.endswith("_total_sec"))
+
+
+def send_snapshot(address, snapshot):
+    """Send a snapshot of the statistics of a worker to the aggregator, without waiting for it.
+
+    Args:
+        address (tuple): Host and port of the aggregator
+        snapshot (dict): Statistics of the worker
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.sendto(json.dumps(snapshot).encode("utf-8"), address)
+        except OSError:  # The aggregator is not running, statistics are best-effort
+            pass
+
+
+def _escape_label(value):
+    """Escape a Prometheus label value.
+
+    Args:
+        value (str): Label value
+
+    Returns:
+        str: Escaped label value
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    """Render Prometheus labels.
+
+    Args:
+        **labels: Label names and values
+
+    Returns:
+        str: Labels, e.g. '{build="js-dbg",worker="42"}'
+    """
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in sorted(labels.items())) + "}"
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request in a thread, as http.server.ThreadingHTTPServer does from Python 3.7."""
+    daemon_threads = True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the /metrics endpoint of the aggregator."""
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Respond with the metrics in Prometheus text format."""
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.aggregator.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=missing-param-doc,missing-type-doc,redefined-builtin
+        """Do not log each scrape."""
+
+
+class StatsAggregator:  # pylint: disable=too-many-instance-attributes
+    """Collector of worker statistics, serving them over HTTP and writing rolled-up snapshots.
+
+    Args:
+        port (int): Local port to receive snapshots (UDP) and serve metrics (HTTP) on, or 0 to pick a free one
+        snapshot_file (Path): Path to the rolled-up JSON snapshot, or None to not write one
+        interval (int): Seconds between writes of the rolled-up snapshot
+        expiry (int): Seconds without a snapshot after which a worker is retired
+    """
+    def __init__(self, port, snapshot_file=None, interval=SNAPSHOT_INTERVAL, expiry=WORKER_EXPIRY):
+        self.snapshot_file = snapshot_file
+        self.interval = interval
+        self.expiry = expiry
+        self.workers = {}
+        self.retired = {}  # Summed counters of the workers that are gone, keyed by build
+        self.builds = {"compile_seconds": 0.0, "cache_hits": 0, "obtained": 0}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        self.http_server = _ThreadingHTTPServer((STATS_HOST, port), _MetricsHandler)
+        self.http_server.aggregator = self
+        self.port = self.http_server.server_address[1]
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.bind((STATS_HOST, self.port))
+        self.udp_socket.settimeout(0.5)
+
+        self.threads = [threading.Thread(target=self.http_server.serve_forever, name="stats http", daemon=True),
+                        threading.Thread(target=self._receive, name="stats receiver", daemon=True),
+                        threading.Thread(target=self._write_periodically, name="stats snapshot", daemon=True)]
+
+    @property
+    def address(self):
+        """Address workers send their snapshots to.
+
+        Returns:
+            tuple: Host and port of the aggregator
+        """
+        return (STATS_HOST, self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Start receiving snapshots and serving metrics in the background."""
+        for thread in self.threads:
+            thread.start()
+        print(f"Serving fuzzing statistics on http://{STATS_HOST}:{self.port}/metrics")
+
+    def close(self):
+        """Stop the background threads, and write the final rolled-up snapshot."""
+        self.stop_event.set()
+        self.http_server.shutdown()
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join()
+        self.http_server.server_close()
+        self.udp_socket.close()
+        self.write_snapshot()
+
+    def _receive(self):
+        """Receive worker snapshots until stopped."""
+        while not self.stop_event.is_set():
+            try:
+                data = self.udp_socket.recv(MAX_DATAGRAM_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self.update_worker(json.loads(data.decode("utf-8", errors="replace")))
+            except ValueError:
+                print("Ignoring a malformed statistics snapshot")
+
+    def _write_periodically(self):
+        """Write the rolled-up snapshot every interval until stopped."""
+        while not self.stop_event.wait(self.interval):
+            self.write_snapshot()
+
+    def update_worker(self, snapshot):
+        """Store the latest snapshot of a worker.
+
+        Args:
+            snapshot (dict): Statistics of the worker, as sent by WorkerStats
+        """
+        with self.lock:
+            self.workers[snapshot.get("fuzzer_pid", 0)] = snapshot
+
+    def expire_workers(self, now=None):
+        """Retire the workers that stopped sending snapshots, keeping only their counters.
+
+        Args:
+            now (float): Current time, defaults to the time of the call
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for pid, snapshot in list(self.workers.items()):
+                if now - snapshot.get("last_update", 0) <= self.expiry:
+                    continue
+                retired = self.retired.setdefault(snapshot.get("build", ""), {"workers": 0})
+                retired["workers"] += 1
+                for key, value in snapshot.items():
+                    if is_counter(key):
+                        retired[key] = round(retired.get(key, 0) + value, 3)
+                del self.workers[pid]
+
+    def set_snapshot_file(self, snapshot_file):
+        """Set where the rolled-up snapshot is written, e.g. once the directory of the build is known.
+
+        Args:
+            snapshot_file (Path): Path to the rolled-up JSON snapshot
+        """
+        self.snapshot_file = snapshot_file
+
+    def record_build(self, seconds, cache_hit):
+        """Record how a shell was obtained.
+
+        Args:
+            seconds (float): Time taken to obtain the shell
+            cache_hit (bool): Whether the shell was already in the shell-cache
+        """
+        with self.lock:
+            self.builds["compile_seconds"] += 0 if cache_hit else seconds
+            self.builds["cache_hits"] += cache_hit
+            self.builds["obtained"] += 1
+
+    def rollup(self):
+        """Sum up the statistics of all workers, in total and per build.
+
+        Returns:
+            dict: Rolled-up statistics of the running workers, then the counters of the retired ones
+        """
+        self.expire_workers()
+        with self.lock:
+            workers = list(self.workers.values())
+            retired = {build: dict(counters) for build, counters in self.retired.items()}
+            builds = dict(self.builds)
+        total = {"workers": len(workers)}
+        per_build = {}
+        for snapshot in workers:
+            build_stats = per_build.setdefault(snapshot.get("build", ""), {"workers": 0})
+            build_stats["workers"] += 1
+            for stats in (total, build_stats):
+                for key, value in snapshot.items():
+                    if key in SUMMED_KEYS or is_counter(key):
+                        stats[key] = round(stats.get(key, 0) + value, 3)
+        return {"time": int(time.time()), "total": total, "builds": per_build, "retired": retired,
+                "compilation": builds}
+
+    def write_snapshot(self):
+        """Atomically write the rolled-up statistics to the snapshot file, if there is one."""
+        if not self.snapshot_file:
+            return
+        try:
+            file_system_helpers.atomic_write(self.snapshot_file, json.dumps(self.rollup(), indent=1, sort_keys=True))
+        except OSError as ex:
+            print(f"Unable to update {self.snapshot_file}: {ex}")
+
+    def prometheus_text(self):
+        """Render the statistics of all workers in Prometheus text format.
+
+        Returns:
+            str: Metrics, one sample per running worker for worker statistics, plus one per build with the counters of
+                 the retired workers
+        """
+        self.expire_workers()
+        with self.lock:
+            workers = sorted(self.workers.items(), key=lambda x: str(x[0]))
+            # Counters of retired workers are served as a worker of their own, so the sums over workers never go down
+            workers += [(RETIRED_WORKER, dict(counters, build=build))
+                        for build, counters in sorted(self.retired.items())]
+            builds = dict(self.builds)
+
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        for key, name, metric_type, help_text in WORKER_METRICS:
+            add_metric(name, metric_type, help_text,
+                       [(_labels(build=snapshot.get("build", ""), worker=pid), snapshot.get(key, 0))
+                        for pid, snapshot in workers if metric_type == "counter" or pid != RETIRED_WORKER])
+        add_metric("funfuzz_found_total", "counter", "Number of js shell runs that reached a level of interestingness",
+                   [(_labels(build=snapshot.get("build", ""), worker=pid, level=key[len("found_"):]), value)
+                    for pid, snapshot in workers for key, value in snapshot.items() if key.startswith("found_")])
+        add_metric("funfuzz_stage_seconds_total", "counter", "Time spent in each stage of the fuzzing loop",
+                   [(_labels(build=snapshot.get("build", ""), worker=pid, stage=key[len("stage_"):-len("_total_sec")]),
+                     value)
+                    for pid, snapshot in workers for key, value in snapshot.items()
+                    if key.startswith("stage_") and key.endswith("_total_sec")])
+        add_metric("funfuzz_compile_seconds_total", "counter", "Time spent compiling shells",
+                   [("", builds["compile_seconds"])])
+        add_metric("funfuzz_shell_cache_hits_total", "counter", "Number of shells found in the shell-cache",
+                   [("", builds["cache_hits"])])
+        add_metric("funfuzz_shells_obtained_total", "counter", "Number of shells obtained", [("", builds["obtained"])])
+        return "\n".join(lines) + "\n"
+
+
+def serve(port, conn):
+    """Run an aggregator, calling its methods as requested over a pipe until None is received.
+
+    Args:
+        port (int): Local port of the aggregator, see StatsAggregator
+        conn (multiprocessing.connection.Connection): Pipe to send the port picked, then to receive method calls on
+    """
+    with StatsAggregator(port) as aggregator:
+        conn.send(aggregator.port)
+        try:
+            for method, args in iter(conn.recv, None):
+                getattr(aggregator, method)(*args)
+        except EOFError:  # bot is gone
+            pass
+    conn.close()
+
+
+class AggregatorProcess:
+    """StatsAggregator running in a process of its own, see serve.
+
+    Args:
+        port (int): Local port to receive snapshots (UDP) and serve metrics (HTTP) on, or 0 to pick a free one
+    """
+    def __init__(self, port):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve, args=(port, child_conn), name="stats aggregator",
+                                               daemon=True)
+        self.process.start()
+        child_conn.close()
+        try:
+            self.port = self.conn.recv()
+        except EOFError as ex:
+            self.process.join()
+            raise OSError(f"Unable to start the stats aggregator on port {port}") from ex
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def set_snapshot_file(self, snapshot_file):
+        """Set where the rolled-up snapshot is written, see StatsAggregator.set_snapshot_file.
+
+        Args:
+            snapshot_file (Path): Path to the rolled-up JSON snapshot
+        """
+        self.conn.send(("set_snapshot_file", (snapshot_file,)))
+
+    def record_build(self, seconds, cache_hit):
+        """Record how a shell was obtained, see StatsAggregator.record_build.
+
+        Args:
+            seconds (float): Time taken to obtain the shell
+            cache_hit (bool): Whether the shell was already in the shell-cache
+        """
+        self.conn.send(("record_build", (seconds, cache_hit)))
+
+    def close(self):
+        """Stop the aggregator, which writes the final rolled-up snapshot, and wait for its process to exit."""
+        if self.process.is_alive():
+            self.conn.send(None)
+        self.process.join()
+        self.conn.close()
@@ -0,0 +1,505 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Supervises a pool of worker processes, such as the fuzzing workers of bot.
+
+Each worker calls a top-level function in a process of its own, which is also the leader of a new process group on
+POSIX, so the js shells it starts are killed along with it. Its output goes to log files that are streamed to the output
+of the supervisor as they grow, and rotated once they get too large. Workers that crash are restarted, as are those that
+stop touching their heartbeat file. Workers can be added at any time, or drained by creating their drain file, which
+they are expected to check so they can stop after their current job. Stages that legitimately outlast the heartbeat
+timeout, such as Lithium, keep touching the heartbeat file from a background thread.
+
+A round can have a deadline, shared by all workers whenever they are started, after which no worker is added or
+restarted.
+
+On Linux, workers are forked, so they share the modules and caches loaded by the supervisor copy-on-write, and the
+memory unique to each of them is logged periodically. It is also sampled shortly after each worker is forked and once it
+warmed up, so that callers can tell how much of the shared memory stays shared.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import multiprocessing.connection
+import os
+from pathlib import Path
+import platform
+import shutil
+import signal
+import statistics
+import sys
+import threading
+import time
+
+from . import worker_sizing
+
+CHECK_INTERVAL = 60  # seconds between checks of how many workers should run
+STREAM_INTERVAL = 1  # seconds between reads of the log files of the workers
+HEARTBEAT_TIMEOUT = 2 * 60 * 60  # seconds without a heartbeat after which a worker is deemed hung
+HEARTBEAT_INTERVAL = 60  # seconds between heartbeats sent from a background thread during long stages
+MAX_RESTARTS = 5  # Number of times a worker is restarted before it is given up on
+MAX_LOG_SIZE = 10 * 2 ** 20  # 10 MB
+LOG_BACKUPS = 2  # Number of rotated log files kept for each log
+SHUTDOWN_GRACE = 10  # seconds that workers are given to exit after being asked to, before they are killed
+LOG_TYPES = ("out", "err")
+MEMORY_REPORT_INTERVAL = 10 * 60  # seconds between logs of the unique memory of the workers
+MEMORY_SAMPLES = (("after fork", 10), ("after warm-up", 5 * 60))  # Name, and seconds after the worker started
+# Forked workers share the memory of the supervisor. Python 3.14 defaults to forkserver on Linux, so ask for fork.
+START_METHOD = "fork" if platform.system() == "Linux" else None
+
+
+def log_name(log_dir, i, log_type):
+    """Returns the path of the log file of a worker as a string.
+
+    Args:
+        log_dir (str): Directory of the log file
+        i (int): Numeric ID of the worker
+        log_type (str): Log type
+
+    Returns:
+        str: The log file path
+    """
+    return str(Path(log_dir) / f"forkjoin-{i}-{log_type}.txt")
+
+
+def drain_name(log_dir, i):
+    """Returns the path of the file whose existence asks a worker to stop after its current job.
+
+    Args:
+        log_dir (str): Directory of the drain file
+        i (int): Numeric ID of the worker
+
+    Returns:
+        str: The drain file path
+    """
+    return str(Path(log_dir) / f"forkjoin-{i}-drain")
+
+
+def heartbeat_name(log_dir, i):
+    """Returns the path of the file that a worker touches regularly, to show it is not hung.
+
+    Args:
+        log_dir (str): Directory of the heartbeat file
+        i (int): Numeric ID of the worker
+
+    Returns:
+        str: The heartbeat file path
+    """
+    return str(Path(log_dir) / f"forkjoin-{i}-heartbeat")
+
+
+@contextlib.contextmanager
+def keep_beating(heartbeat_file, interval=HEARTBEAT_INTERVAL):
+    """Touch a heartbeat file from a background thread while a long stage runs, e.g. Lithium or autobisectjs.
+
+    Args:
+        heartbeat_file (Path): File touched regularly, nothing is done if None
+        interval (int): Seconds between touches of the file
+
+    Yields:
+        None: The heartbeat file is touched until the end of the with statement
+    """
+    if heartbeat_file is None:
+        yield
+        return
+    heartbeat_file.touch()
+    done = threading.Event()
+
+    def beat():
+        """Touch the heartbeat file until the stage is done."""
+        while not done.wait(interval):
+            try:
+                heartbeat_file.touch()
+            except OSError:  # The supervisor removed it while shutting down
+                pass
+
+    thread = threading.Thread(target=beat, name="heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def run_worker(log_dir, i, fun, some_args):
+    """Call |fun| in a worker process, in a process group of its own and with its output redirected to log files.
+
+    Args:
+        log_dir (str): Directory of the log files
+        i (int): Numeric ID of the worker
+        fun (function): Top-level function to be called, so it can be pickled on Windows
+        some_args (tuple): Arguments passed to fun, followed by the numeric ID
+    """
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # Undo the handler of the supervisor, if inherited
+    # Append, so restarted workers keep the output of their previous runs and the supervisor can truncate the logs
+    sys.stdout = io.open(log_name(log_dir, i, "out"), "a", buffering=1,  # pylint: disable=consider-using-with
+                         encoding="utf-8", errors="replace")
+    sys.stderr = io.open(log_name(log_dir, i, "err"), "a", buffering=1,  # pylint: disable=consider-using-with
+                         encoding="utf-8", errors="replace")
+    fun(*(some_args + (i,)))
+
+
+def rotate_log(log_path, backups=LOG_BACKUPS):
+    """Move the contents of a log file to a numbered backup, shifting older backups and removing the oldest one.
+
+    The log file is copied then truncated rather than moved, as the worker keeps it open.
+
+    Args:
+        log_path (str): Path to the log file
+        backups (int): Number of backups kept
+    """
+    for n in range(backups - 1, 0, -1):
+        if os.path.isfile(f"{log_path}.{n}"):
+            os.replace(f"{log_path}.{n}", f"{log_path}.{n + 1}")
+    shutil.copyfile(log_path, f"{log_path}.1")
+    with io.open(log_path, "r+b") as f:
+        f.truncate(0)
+
+
+def _raise_system_exit(_signum, _frame):
+    """Turn SIGTERM into SystemExit, so the supervisor shuts its workers down on the way out."""
+    raise SystemExit(1)
+
+
+class Worker:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """State of a worker process.
+
+    Args:
+        worker_id (int): Numeric ID of the worker
+        process (multiprocessing.Process): Started process of the worker
+    """
+    def __init__(self, worker_id, process):
+        self.worker_id = worker_id
+        self.process = process
+        self.started_at = time.time()
+        self.memory_sampled = set()  # Names of the MEMORY_SAMPLES taken so far
+        self.draining = False
+        self.hung = False
+        self.restarts = 0
+        self.offsets = {x: 0 for x in LOG_TYPES}
+        self.partial_lines = {x: "" for x in LOG_TYPES}
+
+
+class Supervisor:  # pylint: disable=too-many-instance-attributes
+    """Pool of worker processes calling the same function, each with its own numeric ID.
+
+    Once a worker finishes on its own, i.e. it exits normally without having been drained, the round is over: no worker
+    is added any more, and the supervisor waits for the others.
+
+    Args:
+        log_dir (str): Directory of the log, drain and heartbeat files
+        fun (function): Top-level function called in each worker with some_args then the numeric ID of the worker
+        some_args (tuple): Arguments passed to fun
+        heartbeat_timeout (int): Seconds without a heartbeat after which a worker is restarted, None to never do so
+        max_log_size (int): Size in bytes after which log files are rotated
+        deadline (float): Time after which the round is over and no worker is added or restarted, None if there is none
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, log_dir, fun, some_args, heartbeat_timeout=HEARTBEAT_TIMEOUT, max_log_size=MAX_LOG_SIZE,
+                 deadline=None):
+        self.log_dir = log_dir
+        self.fun = fun
+        self.some_args = tuple(some_args)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_log_size = max_log_size
+        self.deadline = deadline
+        self.workers = {}
+        self.next_id = 0
+        self.round_over = False
+        self.stopping = False
+        self.next_memory_report = 0
+        self.memory_samples = {name: [] for name, _ in MEMORY_SAMPLES}  # Unique memory of the workers, in bytes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def remove_files(self, worker_id):
+        """Remove the drain and heartbeat files of a worker.
+
+        Args:
+            worker_id (int): Numeric ID of the worker
+        """
+        for file_name in (drain_name(self.log_dir, worker_id), heartbeat_name(self.log_dir, worker_id)):
+            if os.path.isfile(file_name):
+                os.remove(file_name)
+
+    def start_process(self, worker_id):
+        """Start the process of a worker, after removing the files left by a previous run of it.
+
+        Args:
+            worker_id (int): Numeric ID of the worker
+
+        Returns:
+            multiprocessing.Process: The started process
+        """
+        self.remove_files(worker_id)
+        process = multiprocessing.get_context(START_METHOD).Process(
+            target=run_worker, args=[self.log_dir, worker_id, self.fun, self.some_args],
+            name=f"Parallel process {worker_id}")
+        process.start()
+        return process
+
+    def add_worker(self):
+        """Start a new worker.
+
+        Returns:
+            int: Numeric ID of the worker
+        """
+        worker_id = self.next_id
+        self.next_id += 1
+        self.workers[worker_id] = Worker(worker_id, self.start_process(worker_id))
+        return worker_id
+
+    def active_workers(self):
+        """List the workers that are running and not draining.
+
+        Returns:
+            list: Numeric IDs of the workers, oldest first
+        """
+        return sorted(i for i, worker in self.workers.items() if not worker.draining)
+
+    def drain_worker(self, worker_id=None):
+        """Ask a worker to stop after its current job.
+
+        Args:
+            worker_id (int): Numeric ID of the worker, defaults to the newest one, which has the least work in progress
+
+        Returns:
+            int: Numeric ID of the drained worker, or None if there is none left to drain
+        """
+        active = self.active_workers()
+        if worker_id is None:
+            worker_id = active[-1] if active else None
+        if worker_id not in active:
+            return None
+        self.workers[worker_id].draining = True
+        Path(drain_name(self.log_dir, worker_id)).touch()
+        return worker_id
+
+    def resize(self, count):
+        """Add or drain workers, so that a number of them are active.
+
+        Args:
+            count (int): Number of active workers wanted
+        """
+        active = len(self.active_workers())
+        if count != active:
+            print(f"Adjusting the number of workers from {active} to {count}...")
+        for _ in range(active, count):
+            self.add_worker()
+        for _ in range(count, active):
+            self.drain_worker()
+
+    def stream_log(self, worker, log_type, flush=False):
+        """Print the lines added to a log file of a worker since the last call, then rotate the file if it is too large.
+
+        Args:
+            worker (Worker): The worker
+            log_type (str): Log type
+            flush (bool): Whether to also print the last line even if it is not terminated, e.g. once the worker exited
+        """
+        log_path = log_name(self.log_dir, worker.worker_id, log_type)
+        try:
+            size = os.path.getsize(log_path)
+            if size < worker.offsets[log_type]:  # The file was truncated
+                worker.offsets[log_type] = 0
+            with io.open(log_path, "rb") as f:
+                f.seek(worker.offsets[log_type])
+                data = f.read(size - worker.offsets[log_type])
+        except OSError:  # The worker has not created its log file yet
+            return
+        worker.offsets[log_type] += len(data)
+        lines = (worker.partial_lines[log_type] + data.decode("utf-8", errors="replace")).split("\n")
+        worker.partial_lines[log_type] = lines.pop()
+        if flush and worker.partial_lines[log_type]:
+            lines.append(worker.partial_lines[log_type])
+            worker.partial_lines[log_type] = ""
+        prefix = f"[{worker.worker_id}]" if log_type == "out" else f"[{worker.worker_id} {log_type}]"
+        for line in lines:
+            print(f"{prefix} {line.rstrip()}")
+        if worker.offsets[log_type] > self.max_log_size:
+            rotate_log(log_path)
+            worker.offsets[log_type] = 0
+
+    def is_hung(self, worker, now):
+        """Check if a worker stopped touching its heartbeat file.
+
+        Args:
+            worker (Worker): The worker
+            now (float): Current time
+
+        Returns:
+            bool: True if the worker is deemed hung, False otherwise
+        """
+        if self.heartbeat_timeout is None:
+            return False
+        try:
+            last_beat = os.path.getmtime(heartbeat_name(self.log_dir, worker.worker_id))
+        except OSError:  # No heartbeat yet
+            last_beat = worker.started_at
+        return now - max(last_beat, worker.started_at) > self.heartbeat_timeout
+
+    @staticmethod
+    def signal_worker(worker, signum):
+        """Send a signal to the process group of a worker, which includes the js shells it started.
+
+        Args:
+            worker (Worker): The worker
+            signum (int): Signal to be sent
+        """
+        try:
+            os.killpg(worker.process.pid, signum)
+            return
+        except (AttributeError, OSError):  # Not on POSIX, or the worker has not created its process group yet
+            pass
+        if worker.process.is_alive():
+            worker.process.terminate()
+
+    def reap(self, worker):
+        """Clean up after a worker that exited, and restart it if it crashed or hung.
+
+        Args:
+            worker (Worker): The worker
+        """
+        # Kill whatever is left of its process group before reaping the worker, so the group ID cannot be reused
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(worker.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        worker.process.join()
+        for log_type in LOG_TYPES:
+            self.stream_log(worker, log_type, flush=True)
+        exit_code = worker.process.exitcode
+        print(f"=== Worker #{worker.worker_id} exited with code {exit_code} ===")
+
+        crashed = worker.hung or exit_code != 0
+        if crashed and not worker.draining and not self.stopping and not self.past_deadline() and \
+                worker.restarts < MAX_RESTARTS:
+            print(f"=== Restarting worker #{worker.worker_id}, which {'hung' if worker.hung else 'crashed'} ===")
+            worker.process = self.start_process(worker.worker_id)
+            worker.started_at = time.time()
+            worker.memory_sampled = set()
+            worker.hung = False
+            worker.restarts += 1
+            return
+        if crashed and not worker.draining and not self.stopping and not self.past_deadline():
+            print(f"=== Giving up on worker #{worker.worker_id} after {MAX_RESTARTS} restarts ===")
+        elif not crashed and not worker.draining:
+            self.round_over = True
+        self.remove_files(worker.worker_id)
+        del self.workers[worker.worker_id]
+
+    def past_deadline(self):
+        """Check if the deadline of the round has passed.
+
+        Returns:
+            bool: True if there is a deadline and it has passed, False otherwise
+        """
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def report_memory(self):
+        """Log the unique set size of the workers, i.e. the memory they do not share with the supervisor."""
+        uss = [worker_sizing.unique_memory(x.process.pid) for x in self.workers.values()]
+        uss = [x for x in uss if x is not None]
+        if uss:
+            print(f"Workers use {statistics.mean(uss) / 2 ** 20:.1f} MB of unique memory on average, "
+                  f"{max(uss) / 2 ** 20:.1f} MB at most")
+
+    def sample_memory(self, now):
+        """Measure the unique set size of the workers that reached one of the MEMORY_SAMPLES since the last call.
+
+        Args:
+            now (float): Current time
+        """
+        for worker in self.workers.values():
+            for name, delay in MEMORY_SAMPLES:
+                if name in worker.memory_sampled or now - worker.started_at < delay:
+                    continue
+                worker.memory_sampled.add(name)
+                uss = worker_sizing.unique_memory(worker.process.pid)
+                if uss is not None:
+                    self.memory_samples[name].append(uss)
+
+    def poll(self):
+        """Stream the output of the workers, and deal with those that exited or hung.
+
+        Returns:
+            bool: True if any worker exited, False otherwise
+        """
+        now = time.time()
+        exited = multiprocessing.connection.wait([x.process.sentinel for x in self.workers.values()], timeout=0)
+        for worker in sorted(self.workers.values(), key=lambda x: x.worker_id):
+            if worker.process.sentinel in exited:
+                self.reap(worker)
+                continue
+            for log_type in LOG_TYPES:
+                self.stream_log(worker, log_type)
+            if not worker.hung and self.is_hung(worker, now):
+                print(f"=== Worker #{worker.worker_id} has not sent a heartbeat in {self.heartbeat_timeout}s ===")
+                worker.hung = True
+                self.signal_worker(worker, getattr(signal, "SIGKILL", signal.SIGTERM))
+        return bool(exited)
+
+    def run(self, target_count, check_interval=CHECK_INTERVAL):
+        """Run workers until the round is over and they all exited, then shut down.
+
+        Args:
+            target_count (function): Called with the number of active workers every check_interval seconds and whenever
+                                     a worker exits, returns how many should be active
+            check_interval (int): Seconds between calls to target_count
+        """
+        previous_handler = signal.signal(signal.SIGTERM, _raise_system_exit)
+        try:
+            next_check = 0
+            while True:
+                if self.past_deadline():
+                    self.round_over = True
+                if not self.round_over and time.time() >= next_check:
+                    self.resize(max(target_count(len(self.active_workers())), 1))
+                    next_check = time.time() + check_interval
+                if self.poll():
+                    next_check = 0
+                self.sample_memory(time.time())
+                if self.workers and time.time() >= self.next_memory_report:
+                    self.report_memory()
+                    self.next_memory_report = time.time() + MEMORY_REPORT_INTERVAL
+                if not self.workers:
+                    break
+                timeout = STREAM_INTERVAL
+                if not self.round_over:
+                    timeout = min(timeout, max(next_check - time.time(), 0))
+                multiprocessing.connection.wait([x.process.sentinel for x in self.workers.values()], timeout=timeout)
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            self.shutdown()
+
+    def shutdown(self, grace=SHUTDOWN_GRACE):
+        """Terminate all workers and the js shells they started, killing those that do not exit within a grace period.
+
+        Args:
+            grace (int): Seconds given to the workers to exit after being asked to
+        """
+        if not self.workers:
+            return
+        self.stopping = True
+        for worker in self.workers.values():
+            self.signal_worker(worker, signal.SIGTERM)
+        deadline = time.time() + grace
+        while self.workers and time.time() < deadline:
+            multiprocessing.connection.wait([x.process.sentinel for x in self.workers.values()],
+                                            timeout=max(deadline - time.time(), 0))
+            self.poll()
+        for worker in list(self.workers.values()):
+            self.signal_worker(worker, getattr(signal, "SIGKILL", signal.SIGTERM))
+            self.reap(worker)
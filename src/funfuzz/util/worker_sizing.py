@@ -0,0 +1,301 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Sizes the number of fuzzing workers from the memory available, rather than from the number of cores alone.
+
+The memory a worker needs is estimated from the peak RSS of the latest shells it ran, as reported in the stats files of
+the workers fuzzing the same build, and remembered next to the shell for later runs. The memory available is the lower
+of MemAvailable in /proc/meminfo and the room left under the memory.max limit of the cgroup v2 of the bot. Running
+workers may still grow up to the memory they need, so that growth is set aside from the memory available before adding
+workers, using the unique memory they and their shells use now. Workers are only retired once memory is short by more
+than a margin, so that the count does not flap as shells come and go.
+"""
+
+import glob
+import io
+import math
+import multiprocessing
+import os
+from pathlib import Path
+import tempfile
+
+from . import shell_metadata
+from . import worker_stats
+
+MEMINFO_PATH = Path("/proc/meminfo")
+PROC_PATH = Path("/proc")
+CGROUP_PATH = Path("/proc/self/cgroup")
+CGROUP_ROOTS = (Path("/sys/fs/cgroup"), Path("/sys/fs/cgroup") / "unified")  # cgroup v2-only, then hybrid hierarchy
+PEAK_RSS_METADATA = "peak-rss"
+
+DEFAULT_PEAK_RSS = 2 ** 30  # 1 GB, assumed until shells of the build have been measured
+SLOW_BUILD_PEAK_RSS = 3 * 2 ** 30  # 3 GB, for ASan and valgrind builds
+MEMORY_HEADROOM = 1.5  # Factor applied to the peak RSS, as later runs may use more memory than those measured
+WORKER_OVERHEAD = 200 * 2 ** 20  # 200 MB, used by the Python process of the worker itself
+MEMORY_RESERVE = 2 ** 29  # 512 MB left to the rest of the machine
+RETIRE_MARGIN = 0.5  # Fraction of the memory needed by a worker that must be missing before workers are retired
+
+
+def meminfo_available(meminfo_path=MEMINFO_PATH):
+    """Read the memory available for starting new processes without swapping.
+
+    Args:
+        meminfo_path (Path): Path to the meminfo file
+
+    Returns:
+        int: MemAvailable in bytes, or None if it is unknown, e.g. when not on Linux
+    """
+    try:
+        with io.open(str(meminfo_path), "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024  # The value is in kB
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def cgroup_headroom(cgroup_path=CGROUP_PATH, cgroup_roots=CGROUP_ROOTS):
+    """Read the room left under the memory limit of the cgroup v2 of the current process.
+
+    Args:
+        cgroup_path (Path): Path to the file listing the cgroups of the current process
+        cgroup_roots (tuple): Paths where the cgroup v2 hierarchy may be mounted
+
+    Returns:
+        int: memory.max minus memory.current in bytes, or None if there is no limit or no cgroup v2
+    """
+    try:
+        with io.open(str(cgroup_path), "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    # The cgroup v2 entry is the only one with an ID of 0 and no controllers, e.g. "0::/user.slice/bot.service"
+    rel_paths = [x[3:].lstrip("/") for x in lines if x.startswith("0::")]
+    if not rel_paths:
+        return None
+    for root in cgroup_roots:
+        try:
+            limit = (root / rel_paths[0] / "memory.max").read_text().strip()
+            current = (root / rel_paths[0] / "memory.current").read_text().strip()
+        except OSError:
+            continue
+        if limit == "max":
+            return None
+        try:
+            return max(int(limit) - int(current), 0)
+        except ValueError:
+            return None
+    return None
+
+
+def unique_memory(pid, proc_path=PROC_PATH):
+    """Read the unique set size (USS) of a process, i.e. the memory it would free by exiting.
+
+    Pages shared copy-on-write with the process it was forked from are not counted, unlike in its RSS.
+
+    Args:
+        pid (int): Process ID
+        proc_path (Path): Path where procfs is mounted
+
+    Returns:
+        int: Private_Clean plus Private_Dirty in bytes, or None if it is unknown, e.g. when not on Linux
+    """
+    # smaps_rollup sums up smaps, but only exists on Linux 4.14 and later
+    for smaps_name in ("smaps_rollup", "smaps"):
+        try:
+            with io.open(str(proc_path / str(pid) / smaps_name), "r", encoding="utf-8", errors="replace") as f:
+                return sum(int(line.split()[1]) * 1024 for line in f  # The values are in kB
+                           if line.startswith(("Private_Clean:", "Private_Dirty:")))
+        except (OSError, ValueError, IndexError):
+            continue
+    return None
+
+
+def child_pids(pid, proc_path=PROC_PATH):
+    """Find the child processes of a process.
+
+    Args:
+        pid (int): Process ID
+        proc_path (Path): Path where procfs is mounted
+
+    Returns:
+        list: Process IDs of the children, empty if they are unknown, e.g. when not on Linux
+    """
+    children = []
+    for children_file in glob.glob(str(proc_path / str(pid) / "task" / "*" / "children")):
+        try:
+            with io.open(children_file, "r", encoding="utf-8", errors="replace") as f:
+                children.extend(int(x) for x in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def tree_unique_memory(pid, proc_path=PROC_PATH):
+    """Read the unique set size of a process and all of its descendants, e.g. a worker and the js shell it runs.
+
+    Args:
+        pid (int): Process ID
+        proc_path (Path): Path where procfs is mounted
+
+    Returns:
+        int: Sum of the unique set sizes in bytes, or None if that of the process itself is unknown
+    """
+    uss = unique_memory(pid, proc_path)
+    if uss is None:
+        return None
+    for child in child_pids(pid, proc_path):
+        uss += tree_unique_memory(child, proc_path) or 0
+    return uss
+
+
+def available_memory():
+    """Retrieve the memory that new workers may use.
+
+    Returns:
+        int: Available memory in bytes, or None if it is unknown
+    """
+    available = [x for x in (meminfo_available(), cgroup_headroom()) if x is not None]
+    return min(available) if available else None
+
+
+def worker_stats_files():
+    """Find the stats files of the running workers of the machine, which are in the wtmp directories created by bot.
+
+    Returns:
+        list: Paths to the stats files
+    """
+    return glob.glob(os.path.join(tempfile.gettempdir(), "*loop*", worker_stats.STATS_FILENAME))
+
+
+def read_peak_rss(stats_files, build):
+    """Read the highest recent peak RSS reported in the stats files of workers fuzzing a build.
+
+    Args:
+        stats_files (list): Paths to worker stats files
+        build (str): Name of the build, as recorded in the stats files
+
+    Returns:
+        int: Highest peak RSS in bytes, or 0 if no shell of the build was measured
+    """
+    peak_rss = 0
+    for stats_file in stats_files:
+        stats = worker_stats.read_stats(stats_file)
+        if stats and stats.get("build") == build:
+            try:
+                peak_rss = max(peak_rss, int(float(stats.get("recent_peak_rss_mb", 0)) * 2 ** 20))
+            except ValueError:
+                continue
+    return peak_rss
+
+
+def read_worker_memory(stats_files, build, proc_path=PROC_PATH):
+    """Read the unique memory used now by the running workers fuzzing a build, including that of their js shells.
+
+    Args:
+        stats_files (list): Paths to worker stats files
+        build (str): Name of the build, as recorded in the stats files
+        proc_path (Path): Path where procfs is mounted
+
+    Returns:
+        list: Unique memory of each worker that is still running, in bytes
+    """
+    in_use = []
+    for stats_file in stats_files:
+        stats = worker_stats.read_stats(stats_file)
+        if not stats or stats.get("build") != build:
+            continue
+        try:
+            uss = tree_unique_memory(int(stats.get("fuzzer_pid", "")), proc_path)
+        except ValueError:
+            continue
+        if uss is not None:
+            in_use.append(uss)
+    return in_use
+
+
+def worker_memory(peak_rss):
+    """Estimate the memory needed by a worker.
+
+    Args:
+        peak_rss (int): Peak RSS of the shells run by the worker, in bytes
+
+    Returns:
+        int: Memory needed by the worker, in bytes
+    """
+    return int(peak_rss * MEMORY_HEADROOM) + WORKER_OVERHEAD
+
+
+def worker_count(running, cpu_count, available, per_worker,  # pylint: disable=too-many-arguments
+                 in_use=(), reserve=MEMORY_RESERVE, margin=RETIRE_MARGIN):
+    """Compute how many workers should run, given the memory left by those already running.
+
+    Args:
+        running (int): Number of workers running
+        cpu_count (int): Number of cores, which is the most workers that may run
+        available (int): Memory available, in bytes
+        per_worker (int): Memory needed by each worker, in bytes
+        in_use (list): Unique memory used now by the running workers whose usage is known, in bytes, the others are
+                       assumed to still need all of per_worker
+        reserve (int): Memory left to the rest of the machine, in bytes
+        margin (float): Fraction of per_worker that must be missing before workers are retired
+
+    Returns:
+        int: Number of workers that should run, between 1 and cpu_count
+    """
+    known = list(in_use)[:running]
+    growth = sum(max(per_worker - x, 0) for x in known) + (running - len(known)) * per_worker
+    spare = available - reserve - growth
+    if spare >= 0:
+        count = running + math.floor(spare / per_worker)
+    elif -spare > margin * per_worker:
+        count = running - math.ceil(-spare / per_worker)
+    else:
+        count = running
+    return min(max(count, 1), cpu_count)
+
+
+class WorkerSizer:
+    """Picks the number of workers fuzzing a js shell.
+
+    Args:
+        js_shell (Path): Path to the js shell being fuzzed
+        slow_build (bool): Whether the shell is an ASan build or is run under valgrind, so it needs more memory
+        cpu_count (int): Number of cores, defaults to that of the machine
+    """
+    def __init__(self, js_shell, slow_build, cpu_count=None):
+        self.js_shell = js_shell
+        self.slow_build = slow_build
+        self.cpu_count = cpu_count or multiprocessing.cpu_count()
+        self.peak_rss = 0
+        stored = shell_metadata.load_metadata(js_shell, PEAK_RSS_METADATA)
+        if isinstance(stored, int):
+            self.peak_rss = stored
+
+    def update_peak_rss(self):
+        """Pick up the recent peak RSS measured by the workers, and remember it next to the shell if it changed."""
+        measured = read_peak_rss(worker_stats_files(), self.js_shell.stem)
+        if measured and measured != self.peak_rss:
+            self.peak_rss = measured
+            shell_metadata.save_metadata(self.js_shell, PEAK_RSS_METADATA, measured)
+
+    def target(self, running):
+        """Compute how many workers should run.
+
+        Args:
+            running (int): Number of workers running
+
+        Returns:
+            int: Number of workers that should run
+        """
+        self.update_peak_rss()
+        available = available_memory()
+        if available is None:  # Fall back to one worker per core, or per two cores for builds needing more memory
+            return max(self.cpu_count // 2, 1) if self.slow_build else self.cpu_count
+        peak_rss = self.peak_rss or (SLOW_BUILD_PEAK_RSS if self.slow_build else DEFAULT_PEAK_RSS)
+        in_use = read_worker_memory(worker_stats_files(), self.js_shell.stem)
+        return worker_count(running, self.cpu_count, available, worker_memory(peak_rss), in_use)
@@ -0,0 +1,263 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Keeps throughput and latency statistics of a fuzzing worker in an AFL-style stats file.
+
+The file is rewritten atomically at a fixed interval from a background thread, with one "key : value" line per
+statistic, so operators can spot slow workers without parsing logs. The same snapshot can also be sent to a
+stats_aggregator serving the statistics of all workers of the machine.
+"""
+
+import collections
+import contextlib
+import io
+import math
+import os
+import threading
+import time
+
+from . import file_system_helpers
+from . import stats_aggregator
+
+STATS_FILENAME = "fuzzer_stats"
+STATS_INTERVAL = 60  # seconds between updates of the stats file
+STAGES = ("spawn", "wait", "classify", "fm_search", "seed_bisect", "lithium", "compare_jit", "wasm", "cleanup")
+LATENCY_BUCKETS = (0.01, 0.1, 1, 10, 100, 1000)  # Upper bounds of the histogram buckets, in seconds
+RECENT_RUNS = 100  # Number of the latest runs whose peak RSS make up recent_peak_rss_mb
+RECENT_PEAK_RSS_PERCENTILE = 0.95
+
+
+def read_stats(stats_file):
+    """Read a stats file written by a worker.
+
+    Args:
+        stats_file (Path): Path to the stats file
+
+    Returns:
+        dict: Value of each statistic, as a string, or None if the file is gone, e.g. because the worker finished
+    """
+    stats = {}
+    try:
+        with io.open(str(stats_file), "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                key, _sep, value = line.partition(":")
+                stats[key.strip()] = value.strip()
+    except OSError:
+        return None
+    return stats
+
+
+class StageLatency:
+    """Latency histogram of a stage.
+
+    Args:
+        buckets (tuple): Upper bounds of the histogram buckets, in seconds
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket holds durations above the highest bound
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        """Record a duration.
+
+        Args:
+            seconds (float): Time taken by the stage
+        """
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def histogram(self):
+        """Render the histogram.
+
+        Returns:
+            str: Count of durations in each bucket, e.g. "<=0.01s:0 <=0.1s:3 ... >1000s:0"
+        """
+        labels = [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+        return " ".join(f"{label}:{count}" for label, count in zip(labels, self.counts))
+
+
+class WorkerStats:  # pylint: disable=too-many-instance-attributes
+    """Statistics of a fuzzing worker, periodically written to a stats file.
+
+    Args:
+        stats_file (Path): Path to the stats file
+        interval (int): Seconds between updates of the stats file
+        level_names (list): Name of each level of interestingness, indexed by level
+        report_address (tuple): Host and port of a stats_aggregator to send snapshots to, if specified
+        build (str): Name of the build being fuzzed, to tell workers apart in the aggregated statistics
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, stats_file, interval=STATS_INTERVAL, level_names=None, report_address=None, build=""):
+        self.stats_file = stats_file
+        self.interval = interval
+        self.level_names = level_names or []
+        self.report_address = report_address
+        self.build = build
+        self.start_time = time.time()
+        self.execs = 0
+        self.timeouts = 0
+        self.ooms = 0
+        self.interesting = 0
+        self.levels = {}
+        self.peak_rss = 0
+        self.recent_rss = collections.deque(maxlen=RECENT_RUNS)
+        self.cpu_time = 0.0
+        self.stages = {stage: StageLatency() for stage in STAGES}
+        self.in_flight = {stage: 0 for stage in STAGES}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.writer = threading.Thread(target=self._write_periodically, name="worker stats writer", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Start updating the stats file in the background."""
+        self.writer.start()
+
+    def close(self):
+        """Stop updating the stats file in the background, and write the final statistics."""
+        self.stop_event.set()
+        if self.writer.is_alive():
+            self.writer.join()
+        self.write()
+
+    def _write_periodically(self):
+        """Write the stats file every interval until stopped."""
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def add_time(self, stage, seconds):
+        """Record the time taken by a stage.
+
+        Args:
+            stage (str): Name of the stage, one of STAGES
+            seconds (float): Time taken by the stage
+        """
+        with self.lock:
+            self.stages[stage].add(seconds)
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """Record the time taken by the body of a with statement as a stage.
+
+        Args:
+            stage (str): Name of the stage, one of STAGES
+
+        Yields:
+            None: Nothing
+        """
+        start_time = time.time()
+        with self.lock:
+            self.in_flight[stage] += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight[stage] -= 1
+            self.add_time(stage, time.time() - start_time)
+
+    def record_run(self, level, timed_out, oomed, interesting, rusage=None):  # pylint: disable=too-many-arguments
+        """Record the outcome of an iteration.
+
+        Args:
+            level (int): Level reached by the js shell run of the iteration
+            timed_out (bool): Whether the run had to be killed after the timeout
+            oomed (bool): Whether the shell ran out of memory
+            interesting (bool): Whether the iteration found anything interesting, including in later stages
+            rusage (dict): Resource usage of the js shell run, as collected by shell_runner, if any
+        """
+        with self.lock:
+            self.execs += 1
+            self.timeouts += timed_out
+            self.ooms += oomed
+            self.interesting += interesting
+            if rusage:
+                self.peak_rss = max(self.peak_rss, rusage["max_rss"])
+                self.recent_rss.append(rusage["max_rss"])
+                self.cpu_time += rusage["user_time"] + rusage["sys_time"]
+            if level:
+                self.levels[level] = self.levels.get(level, 0) + 1
+
+    def recent_peak_rss(self):
+        """Compute a high percentile of the peak RSS of the latest runs, which unlike the peak RSS of all runs goes
+        down again once the shells stop needing as much memory.
+
+        Returns:
+            int: Peak RSS in bytes, or 0 if no run was measured
+        """
+        if not self.recent_rss:
+            return 0
+        ordered = sorted(self.recent_rss)
+        return ordered[min(math.ceil(len(ordered) * RECENT_PEAK_RSS_PERCENTILE), len(ordered)) - 1]
+
+    def level_name(self, level):
+        """Retrieve the key under which a level is reported.
+
+        Args:
+            level (int): Level of interestingness
+
+        Returns:
+            str: Key of the level, e.g. "found_new_assert_or_crash"
+        """
+        if level < len(self.level_names):
+            return "found_" + "_".join(self.level_names[level].split())
+        return f"found_level_{level}"
+
+    def snapshot(self):
+        """Retrieve the current statistics.
+
+        Returns:
+            dict: Statistics, in the order they are written to the stats file
+        """
+        with self.lock:
+            now = time.time()
+            run_time = max(now - self.start_time, 1e-6)
+            stats = {
+                "start_time": int(self.start_time),
+                "last_update": int(now),
+                "fuzzer_pid": os.getpid(),
+                "build": self.build,
+                "run_time": int(run_time),
+                "execs_done": self.execs,
+                "execs_per_sec": round(self.execs / run_time, 2),
+                "timeout_ratio": round(self.timeouts / self.execs, 4) if self.execs else 0.0,
+                "oom_ratio": round(self.ooms / self.execs, 4) if self.execs else 0.0,
+                "interesting": self.interesting,
+                "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+                "recent_peak_rss_mb": round(self.recent_peak_rss() / 2 ** 20, 1),
+                "cpu_time_sec": round(self.cpu_time, 3),
+            }
+            for level in sorted(self.levels):
+                stats[self.level_name(level)] = self.levels[level]
+            for name, latency in self.stages.items():
+                stats[f"stage_{name}_count"] = latency.count
+                stats[f"stage_{name}_total_sec"] = round(latency.total, 3)
+                stats[f"stage_{name}_in_flight"] = self.in_flight[name]
+                stats[f"stage_{name}_hist"] = latency.histogram()
+        return stats
+
+    def write(self):
+        """Atomically write the current statistics to the stats file, so readers never see a partial file."""
+        snapshot = self.snapshot()
+        if self.report_address:
+            stats_aggregator.send_snapshot(self.report_address, snapshot)
+        try:
+            file_system_helpers.atomic_write(self.stats_file,
+                                             "".join(f"{key:<24}: {value}\n" for key, value in snapshot.items()))
+        except OSError as ex:
+            print(f"Unable to update {self.stats_file}: {ex}")
@@ -0,0 +1,247 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Tunes the number of fuzzing workers by hill-climbing on their aggregate throughput.
+
+The best number of workers depends on hyperthreading, on the memory bandwidth used by debug builds, and on the helper
+threads of the js shell, so it is measured instead. Each number of workers is held for a warm-up period, then the
+executions and interesting results reported in the stats files of the workers are counted over a measurement period.
+As stats files are only rewritten every so often, the rate of each worker is computed over the time between its own
+updates rather than over the period. Neighbouring numbers are tried until neither does better than the best one, which
+is kept from then on. Executions per second are compared first, and interesting results per hour break ties.
+Measurements are stored per build type in the shell-cache directory, so later bot runs carry on from them, and they go
+stale after a while so that neighbouring numbers are tried again.
+"""
+
+import io
+import json
+import time
+
+from . import file_system_helpers
+from . import worker_sizing
+from . import worker_stats
+
+WORKER_TUNING_FILENAME = "worker-tuning.json"
+
+WARMUP_TIME = 2 * 60  # seconds after a change in the number of workers before their throughput is measured
+MEASURE_TIME = 5 * 60  # seconds over which the throughput of each number of workers is measured
+REEVALUATE_INTERVAL = 6 * 60 * 60  # seconds after which measurements are stale, so neighbouring numbers are retried
+MIN_GAIN = 0.03  # Relative gain in throughput needed to prefer another number of workers, so noise does not matter
+
+
+def read_progress(stats_files, build):
+    """Read the progress of the workers fuzzing a build from their stats files.
+
+    Args:
+        stats_files (list): Paths to worker stats files
+        build (str): Name of the build, as recorded in the stats files
+
+    Returns:
+        dict: Number of executions, number of interesting results, start time and time of the last update of the
+              stats file, keyed by the PID of each worker
+    """
+    progress = {}
+    for stats_file in stats_files:
+        stats = worker_stats.read_stats(stats_file)
+        if not stats or stats.get("build") != build:
+            continue
+        try:
+            progress[int(stats["fuzzer_pid"])] = (int(stats["execs_done"]), int(stats["interesting"]),
+                                                  int(stats["start_time"]), int(stats["last_update"]))
+        except (KeyError, ValueError):
+            continue
+    return progress
+
+
+def throughput(before, after, elapsed):
+    """Compute the aggregate throughput of workers between two readings of their progress.
+
+    The rate of each worker is computed between the updates of its stats file, which can be up to a stats interval
+    older than the readings. Workers started in between count from their start, for the part of the period they ran.
+
+    Args:
+        before (dict): Progress of the workers at the start, as returned by read_progress
+        after (dict): Progress of the workers at the end, as returned by read_progress
+        elapsed (float): Seconds between both readings
+
+    Returns:
+        tuple: Executions per second and interesting results per hour
+    """
+    # pylint: disable=too-many-locals
+    elapsed = max(elapsed, 1e-6)
+    execs_per_sec = 0.0
+    interesting_per_sec = 0.0
+    for pid, (execs, interesting, start_time, last_update) in after.items():
+        if pid in before:
+            prev_execs, prev_interesting, _start_time, prev_update = before[pid]
+            share = 1.0  # Ran for the whole period
+        else:
+            prev_execs, prev_interesting, prev_update = 0, 0, start_time
+            share = min((last_update - start_time) / elapsed, 1.0)
+        window = last_update - prev_update
+        if window <= 0:  # The stats file was not updated in between
+            continue
+        execs_per_sec += (execs - prev_execs) / window * share
+        interesting_per_sec += (interesting - prev_interesting) / window * share
+    return execs_per_sec, interesting_per_sec * 3600
+
+
+class WorkerTuner:  # pylint: disable=too-many-instance-attributes
+    """Hill-climbing tuner of the number of workers fuzzing a build.
+
+    Args:
+        state_file (Path): File holding the measurements of all build types
+        build_type (str): Type of the build, under which measurements are stored, e.g. "dbg-opt-64-dm-linux"
+        stats_build (str): Name of the build, as recorded in the stats files of the workers
+        limit (function): Called with the number of running workers, returns the most workers that may run
+    """
+    def __init__(self, state_file, build_type, stats_build, limit):
+        self.state_file = state_file
+        self.build_type = build_type
+        self.stats_build = stats_build
+        self.limit = limit
+        self.scores = self.load().get(build_type, {})
+        self.count = None
+        self.changed_at = 0.0
+        self.baseline = None
+        self.baseline_time = 0.0
+
+    def load(self):
+        """Read the measurements of all build types.
+
+        Returns:
+            dict: Execs per second, interesting results per hour and time of measurement, keyed by build type then by
+                  number of workers, empty if the file does not exist or is corrupted
+        """
+        try:
+            with io.open(str(self.state_file), "r", encoding="utf-8", errors="replace") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def save(self):
+        """Store the measurements of the build type along with those of the others."""
+        state = self.load()
+        state[self.build_type] = self.scores
+        try:
+            file_system_helpers.atomic_write(self.state_file, json.dumps(state, indent=1, sort_keys=True))
+        except OSError as ex:
+            print(f"Unable to update {self.state_file}: {ex}")
+
+    def best_count(self, scores):
+        """Pick the number of workers with the highest throughput, sticking to the current one unless clearly beaten.
+
+        Numbers of workers running about as many executions per second are told apart by their interesting results per
+        hour.
+
+        Args:
+            scores (dict): Measurements keyed by number of workers, as strings
+
+        Returns:
+            int: Best number of workers
+        """
+        best = self.count if str(self.count) in scores else None
+        for count, score in sorted(scores.items(), key=lambda x: int(x[0])):
+            if best is None:
+                best = int(count)
+                continue
+            best_score = scores[str(best)]
+            if score[0] > best_score[0] * (1 + MIN_GAIN):
+                best = int(count)
+            elif score[0] >= best_score[0] * (1 - MIN_GAIN) and score[1] > best_score[1] * (1 + MIN_GAIN):
+                best = int(count)
+        return best
+
+    def is_fresh(self, count, now):
+        """Check if a number of workers was measured recently enough to be trusted.
+
+        Args:
+            count (int): Number of workers
+            now (float): Current time
+
+        Returns:
+            bool: True if the number of workers was measured within the reevaluation interval, False otherwise
+        """
+        return str(count) in self.scores and now - self.scores[str(count)][2] < REEVALUATE_INTERVAL
+
+    def next_count(self, limit, now):
+        """Pick the number of workers to try next.
+
+        Args:
+            limit (int): Most workers that may run
+            now (float): Current time
+
+        Returns:
+            int: Number of workers to try next
+        """
+        usable = {k: v for k, v in self.scores.items() if int(k) <= limit}
+        fresh = {k: v for k, v in usable.items() if self.is_fresh(k, now)}
+        if not fresh:  # Start again from the best number measured before, else from as many workers as fit
+            return self.best_count(usable) if usable else limit
+        best = self.best_count(fresh)
+        for candidate in (best + 1, best - 1):
+            if 1 <= candidate <= limit and str(candidate) not in fresh:
+                return candidate
+        return best
+
+    def set_count(self, count, now, reason):
+        """Change the number of workers, and restart the warm-up period.
+
+        Args:
+            count (int): New number of workers
+            now (float): Current time
+            reason (str): Reason of the change, to be logged
+        """
+        print(f"worker_tuner: {reason}, switching from {self.count} to {count} workers")
+        self.count = count
+        self.changed_at = now
+        self.baseline = None
+
+    def measure(self, now):
+        """Record the throughput of the current number of workers since the baseline reading.
+
+        Args:
+            now (float): Current time
+        """
+        progress = read_progress(worker_sizing.worker_stats_files(), self.stats_build)
+        execs_per_sec, interesting_per_hour = throughput(self.baseline, progress, now - self.baseline_time)
+        self.scores[str(self.count)] = [round(execs_per_sec, 3), round(interesting_per_hour, 3), int(now)]
+        self.save()
+        print(f"worker_tuner: {self.count} workers ran {execs_per_sec:.2f} execs/sec and found "
+              f"{interesting_per_hour:.2f} interesting results/hour")
+        self.baseline = progress
+        self.baseline_time = now
+
+    def target(self, running):
+        """Compute how many workers should run, measuring the current number and moving on once it is measured.
+
+        Args:
+            running (int): Number of workers running
+
+        Returns:
+            int: Number of workers that should run
+        """
+        now = time.time()
+        limit = self.limit(running)
+        if self.count is None:
+            self.set_count(self.next_count(limit, now), now, "starting")
+        elif self.baseline is None:
+            if now >= self.changed_at + WARMUP_TIME:
+                self.baseline = read_progress(worker_sizing.worker_stats_files(), self.stats_build)
+                self.baseline_time = now
+        elif now >= self.baseline_time + MEASURE_TIME:
+            self.measure(now)
+            count = self.next_count(limit, now)
+            if count != self.count:
+                reason = "settling on the best" if self.is_fresh(count, now) else "trying a neighbour"
+                self.set_count(count, now, reason)
+            else:
+                print(f"worker_tuner: keeping {self.count} workers, neither neighbour did better")
+
+        if self.count > limit:
+            self.set_count(limit, now, "running short of memory")
+        return self.count
@@ -0,0 +1,179 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the async_loop.py file."""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pytest
+
+from funfuzz.js import async_loop
+from funfuzz.js import js_interesting
+from funfuzz.js import loop
+from funfuzz.util import shell_runner
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+STUB_SHELL = """\
+import json
+import sys
+
+if "getBuildConfiguration" in " ".join(sys.argv):
+    print(json.dumps({"asan": False, "more-deterministic": False}))
+else:
+    print("fuzzSeed: 1")
+    print("It's looking good!")
+"""
+
+
+def run_in_event_loop(coroutine):
+    """Run a coroutine to completion in a new event loop.
+
+    Args:
+        coroutine (coroutine): Coroutine to be run
+
+    Returns:
+        object: What the coroutine returned
+    """
+    event_loop = async_loop.new_event_loop()
+    try:
+        return event_loop.run_until_complete(coroutine)
+    finally:
+        event_loop.close()
+
+
+def fake_classify_run(_args, _fuzzjs, job):
+    """Stand-in for classify_run that deems the first iteration interesting and writes its summary.
+
+    Args:
+        job (dict): The run, see async_loop.classify_run
+
+    Returns:
+        dict: Outcome of the run, see async_loop.classify_run
+    """
+    lev = js_interesting.JS_FINE
+    if job["log_prefix"].name == "w1":
+        lev = js_interesting.JS_NEW_ASSERT_OR_CRASH
+        (job["log_prefix"].parent / "w1-summary.txt").write_bytes(job["out"])
+    return {"lev": lev, "oomed": False, "soft_timed_out": False, "iterations": 1, "timings": {"classify": 0.01}}
+
+
+class AsyncLoopTests(unittest.TestCase):
+    """"TestCase class for functions in async_loop.py"""
+    @staticmethod
+    def test_run_shell():
+        """Test that the output and return code of a run are captured, that large output spills over to a file, and
+        that runs are killed at the timeout."""
+        job = run_in_event_loop(async_loop.run_shell(
+            [sys.executable, "-c", "import sys; print('out'); sys.stderr.write('err'); sys.exit(3)"], 60))
+        assert job["sta"] == shell_runner.ABNORMAL
+        assert job["return_code"] == 3
+        assert job["out"].splitlines() == [b"out"]
+        assert job["err"] == b"err"
+
+        with tempfile.TemporaryDirectory(suffix="async_loop_test") as tmp_dir:
+            job = run_in_event_loop(async_loop.run_shell(
+                [sys.executable, "-c", "import sys; print('out' * 10); sys.stderr.write('err')"], 60,
+                spill_dir=Path(tmp_dir), max_in_memory_size=16))
+            # Output beyond the size limit spills over to a file, and is read back from there
+            assert job["out"].parent == Path(tmp_dir)
+            assert job["err"] == b"err"
+            assert async_loop.job_runinfo(job).out.lines() == ["out" * 10 + "\n"]
+
+        job = run_in_event_loop(async_loop.run_shell([sys.executable, "-c", "import time; time.sleep(60)"], 1))
+        assert job["sta"] == shell_runner.TIMED_OUT
+        assert job["return_code"] is None
+        assert job["elapsedtime"] < 30
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() == "Windows", reason="Resource usage of child processes is POSIX-only")
+    def test_rusage_since():
+        """Test that the resource usage of the shells reaped since the previous reading is computed."""
+        assert async_loop.rusage_since(None)[0] is None
+        _, reading = async_loop.rusage_since(None)
+        subprocess.run([sys.executable, "-c", "sum(range(10 ** 6))"], check=True)
+        delta, next_reading = async_loop.rusage_since(reading)
+        assert delta["user_time"] + delta["sys_time"] > 0
+        assert delta["max_rss"] == next_reading["max_rss"] > 0
+        assert next_reading["user_time"] >= reading["user_time"]
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() == "Windows", reason="The stub js shell is a script with a shebang")
+    def test_async_fuzzer():
+        """Test that slots run a stub js shell until the deadline, and that interesting runs are reduced and kept."""
+        with tempfile.TemporaryDirectory(suffix="async_loop_test") as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            shell = tmp_dir / "js"
+            shell.write_text(f"#!{sys.executable}\n{STUB_SHELL}", encoding="utf-8")
+            shell.chmod(0o755)
+            fuzzjs = tmp_dir / "jsfunfuzz.js"
+            fuzzjs.write_text("", encoding="utf-8")
+            wtmp_dir = tmp_dir / "wtmp1"
+            wtmp_dir.mkdir()
+            args = ["10", "mozilla-central", str(shell)]
+            reduced = []
+
+            def fake_reduce_run(_args, _fuzzjs, _target_time, job):
+                """Stand-in for reduce_run that records which runs it was given.
+
+                Args:
+                    job (dict): The run, see async_loop.classify_run
+
+                Returns:
+                    dict: No time spent in any stage
+                """
+                reduced.append(job)
+                return {}
+
+            with ThreadPoolExecutor(max_workers=2) as executor, ThreadPoolExecutor(max_workers=1) as reducer, \
+                    mock.patch.object(async_loop, "classify_run", fake_classify_run), \
+                    mock.patch.object(async_loop, "reduce_run", fake_reduce_run):
+                fuzzer = async_loop.AsyncFuzzer(loop.parseOpts(args), args, fuzzjs, object(), wtmp_dir, executor,
+                                                reducer, 2)
+                run_in_event_loop(fuzzer.run(2))
+            stats = fuzzer.stats.snapshot()
+            loop.wrap_up(wtmp_dir, fuzzer.scratch, fuzzer.stats, fuzzer.scheduler)
+
+            assert stats["execs_done"] >= 2
+            assert stats["interesting"] == 1
+            assert [job["log_prefix"].name for job in reduced] == ["w1"]
+            assert (wtmp_dir / "w1-summary.txt").read_text(encoding="utf-8").splitlines() == [
+                "fuzzSeed: 1", "It's looking good!"]
+            assert sorted(os.listdir(str(wtmp_dir))) == ["w1-summary.txt"]
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() == "Windows", reason="The stub js shell is a script with a shebang")
+    def test_classification_failure():
+        """Test that a failing classification stops the slots, is raised, and leaves no task behind."""
+        with tempfile.TemporaryDirectory(suffix="async_loop_test") as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            shell = tmp_dir / "js"
+            shell.write_text(f"#!{sys.executable}\n{STUB_SHELL}", encoding="utf-8")
+            shell.chmod(0o755)
+            fuzzjs = tmp_dir / "jsfunfuzz.js"
+            fuzzjs.write_text("", encoding="utf-8")
+            wtmp_dir = tmp_dir / "wtmp1"
+            wtmp_dir.mkdir()
+            args = ["60", "mozilla-central", str(shell)]
+
+            with ThreadPoolExecutor(max_workers=1) as executor, \
+                    mock.patch.object(async_loop, "classify_run", mock.Mock(side_effect=RuntimeError("broken"))):
+                fuzzer = async_loop.AsyncFuzzer(loop.parseOpts(args), args, fuzzjs, object(), wtmp_dir, executor,
+                                                None, 60)
+                with pytest.raises(RuntimeError, match="broken"):
+                    run_in_event_loop(fuzzer.run(1))
+            assert not fuzzer.classifications
@@ -0,0 +1,44 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the bytecode_cache.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.js import bytecode_cache
+from funfuzz.js import link_fuzzer
+from funfuzz.util import shell_metadata
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class BytecodeCacheTests(unittest.TestCase):
+    """"TestCase class for functions in bytecode_cache.py"""
+    @staticmethod
+    def test_parse_probe_output():
+        """Test that the time printed by the probe script is parsed, and that unsupported shells are detected."""
+        assert bytecode_cache.parse_probe_output(["It's looking good!\n", "BYTECODE-CACHE 41.5\n"]) == 41.5
+        assert bytecode_cache.parse_probe_output(["BYTECODE-CACHE unsupported\n"]) is None
+        assert bytecode_cache.parse_probe_output([]) is None
+
+    @staticmethod
+    def test_startup_savings_are_kept_per_fuzzer():
+        """Test that stored measurements are reused for the same jsfunfuzz."""
+        with tempfile.TemporaryDirectory(suffix="bytecode_cache_test") as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            js_engine = tmp_dir / "js"
+            js_engine.write_text("not a shell")
+            fuzzjs = link_fuzzer.cached_link_fuzzer(tmp_dir / link_fuzzer.LINKED_FUZZER_DIRNAME)
+            fuzzer_hash = fuzzjs.stem.split("-")[1]
+
+            savings = {"supported": True, "source_ms": 40.0, "bytecode_ms": 10.0}
+            shell_metadata.save_metadata(js_engine, bytecode_cache.BYTECODE_CACHE_METADATA, {fuzzer_hash: savings})
+            assert bytecode_cache.startup_savings(js_engine, fuzzjs) == savings
@@ -0,0 +1,69 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the compare_jit.py file."""
+
+import logging
+import threading
+import unittest
+
+from funfuzz.js import compare_jit
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class CompareJitTests(unittest.TestCase):
+    """"TestCase class for functions in compare_jit.py"""
+    @staticmethod
+    def test_streaming_comparator_ahead():
+        """Test that lines of a run ahead of the first run are checked once the first run catches up."""
+        events = [threading.Event(), threading.Event()]
+        comparator = compare_jit.StreamingComparator(events)
+        comparator.add_line(1, b"a\n")
+        comparator.add_line(1, b"b\n")
+        assert len(comparator.unchecked_hashes[1]) == 2
+        comparator.add_line(0, b"a\n")
+        comparator.add_line(0, b"b\n")
+        assert not comparator.unchecked_hashes[1]
+        assert not comparator.has_diverged(1)
+        assert not events[1].is_set()
+
+    @staticmethod
+    def test_streaming_comparator_behind():
+        """Test that lines of a run behind the first run are checked as soon as they are added."""
+        events = [threading.Event(), threading.Event()]
+        comparator = compare_jit.StreamingComparator(events)
+        for line in [b"a\n", b"b\n", b"c\n"]:
+            comparator.add_line(0, line)
+        comparator.add_line(1, b"a\n")
+        comparator.add_line(1, b"b\n")
+        assert not comparator.unchecked_hashes[1]
+        assert comparator.line_counts[1] == 2
+        assert not comparator.has_diverged(1)
+        assert not events[1].is_set()
+
+    @staticmethod
+    def test_streaming_comparator_divergence():
+        """Test that a run is killed at its first line differing from the first run, whichever run is ahead."""
+        events = [threading.Event(), threading.Event(), threading.Event()]
+        comparator = compare_jit.StreamingComparator(events)
+        comparator.add_line(2, b"a\n")
+        comparator.add_line(2, b"z\n")
+        comparator.add_line(0, b"a\n")
+        comparator.add_line(1, b"a\n")
+        comparator.add_line(1, b"y\n")
+        assert not comparator.has_diverged(1)
+        assert not comparator.has_diverged(2)
+        comparator.add_line(0, b"b\n")
+        assert comparator.has_diverged(1)
+        assert comparator.has_diverged(2)
+        assert comparator.divergent_lines == [None, 1, 1]
+        assert events[1].is_set() and events[2].is_set()
+        assert not events[0].is_set()
+        comparator.add_line(1, b"c\n")
+        assert comparator.divergent_lines[1] == 1
@@ -0,0 +1,64 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the flag_scheduler.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.js import flag_scheduler
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class FlagSchedulerTests(unittest.TestCase):
+    """"TestCase class for functions in flag_scheduler.py"""
+    @staticmethod
+    def test_arm_for():
+        """Test that flags are grouped into arms regardless of their values."""
+        assert flag_scheduler.arm_for("--ion-gvn=on") == flag_scheduler.arm_for("--ion-gvn=off") == "--ion-gvn"
+        assert flag_scheduler.arm_for("--ion-eager") == "--ion-eager"
+        assert flag_scheduler.arm_for('--execute="foo()"') == '--execute="foo()"'
+
+    @staticmethod
+    def test_probability_follows_yield():
+        """Test that flags of runs going through more iterations per second become more likely, and flags of runs that
+        time out less likely."""
+        with tempfile.TemporaryDirectory(suffix="flag_scheduler_test") as tmp_dir:
+            scheduler = flag_scheduler.FlagScheduler(Path(tmp_dir) / flag_scheduler.FLAG_SCHEDULER_FILENAME)
+            assert scheduler.probability("--ion-eager", .2) == .2
+
+            for _ in range(100):
+                # Runs last about as long whatever their flags, so only their throughput tells them apart
+                scheduler.record(["--fuzzing-safe", "--ion-eager"], 0, 10, False, False, 3000)
+                scheduler.record(["--fuzzing-safe", "--no-threads"], 0, 30, True, False, 0)
+                scheduler.record(["--fuzzing-safe", "--no-asmjs"], 0, 10, False, False, 500)
+                scheduler.record(["--fuzzing-safe"], 0, 10, False, False, 1000)
+
+            assert scheduler.probability("--ion-eager", .2) > .2
+            assert scheduler.probability("--no-threads", .2) < .2
+            assert scheduler.probability("--no-asmjs", .2) < .2
+            assert scheduler.probability("--ion-gvn", .2) == .2
+
+    @staticmethod
+    def test_statistics_are_shared():
+        """Test that statistics recorded by several workers are merged into the shared file."""
+        with tempfile.TemporaryDirectory(suffix="flag_scheduler_shared_test") as tmp_dir:
+            state_file = Path(tmp_dir) / flag_scheduler.FLAG_SCHEDULER_FILENAME
+            worker_1 = flag_scheduler.FlagScheduler(state_file, sync_interval=10)
+            worker_2 = flag_scheduler.FlagScheduler(state_file, sync_interval=10)
+            for _ in range(10):
+                worker_1.record(["--ion-eager"], 5, 2, False, False, 100)
+                worker_2.record(["--no-asmjs"], 0, 2, False, True, 100)
+
+            restarted = flag_scheduler.FlagScheduler(state_file)
+            assert restarted.shared["runs"] == 20
+            assert restarted.stats_for("--ion-eager")[:2] == (10, 10 * (100 + 5 * flag_scheduler.LEVEL_REWARD) / 2)
+            assert restarted.stats_for("--no-asmjs")[:2] == (10, 0)
@@ -9,10 +9,12 @@
 import io
 import logging
 from pathlib import Path
+import stat
 import tempfile
 import unittest
 
 from funfuzz.js import link_fuzzer
+from funfuzz.util import file_manipulation
 
 FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
 logging.basicConfig(level=logging.DEBUG)
@@ -38,3 +40,34 @@ class LinkFuzzerTests(unittest.TestCase):
                         break
 
             assert found
+
+    @staticmethod
+    def test_cached_link_fuzzer():
+        """Test that the shared jsfunfuzz file is content-addressed, read-only and spliced like fuzzSplice does."""
+        with tempfile.TemporaryDirectory(suffix="link_fuzzer_test") as tmp_dir:
+            cache_dir = Path(tmp_dir) / link_fuzzer.LINKED_FUZZER_DIRNAME
+
+            fuzzjs = link_fuzzer.cached_link_fuzzer(cache_dir, 'const prologue = "é";\n')
+            assert link_fuzzer.cached_link_fuzzer(cache_dir, 'const prologue = "é";\n') == fuzzjs
+            assert link_fuzzer.cached_link_fuzzer(cache_dir) != fuzzjs
+            assert not fuzzjs.stat().st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+            # The SPLICE offsets are computed on the contents, so newlines must not be translated on Windows
+            assert fuzzjs.read_bytes() == link_fuzzer.linked_contents('const prologue = "é";\n').encode("utf-8")
+
+            [before, after] = link_fuzzer.fuzz_splice(fuzzjs)
+            assert [before, after] == file_manipulation.fuzzSplice(fuzzjs)
+            assert before[-1].rstrip() == "// SPLICE DDBEGIN"
+            assert after[0].rstrip() == "// SPLICE DDEND"
+
+    @staticmethod
+    def test_splice_testcase():
+        """Test that the FRC lines printed by jsfunfuzz replace its call to start()."""
+        with tempfile.TemporaryDirectory(suffix="link_fuzzer_test") as tmp_dir:
+            fuzzjs = link_fuzzer.cached_link_fuzzer(Path(tmp_dir) / link_fuzzer.LINKED_FUZZER_DIRNAME)
+
+            testcase = link_fuzzer.splice_testcase(fuzzjs, ["fuzzSeed: 1\n",
+                                                            '/*FRC-fuzzSeed-1*/count=1; tryItOut("x");\n',
+                                                            "It's looking good!\n"])
+            splice_start = testcase.index("// SPLICE DDBEGIN\n")
+            assert testcase[splice_start + 1:splice_start + 3] == ['/*fuzzSeed-1*/count=1; tryItOut("x");\n',
+                                                                   "// SPLICE DDEND\n"]
@@ -0,0 +1,70 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the regression_catalog.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.js import regression_catalog
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+def make_test_files(repo, rel_paths):
+    """Create files in a fake repository.
+
+    Args:
+        repo (Path): Root of the fake repository
+        rel_paths (list): Paths of the files, relative to the root
+    """
+    for rel_path in rel_paths:
+        (repo / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (repo / rel_path).write_text("print(1);\n")
+
+
+class RegressionCatalogTests(unittest.TestCase):
+    """"TestCase class for functions in regression_catalog.py"""
+    @staticmethod
+    def test_scan_and_apply_changes():
+        """Test that tests are listed once, stored with their size, and updated from changed paths."""
+        with tempfile.TemporaryDirectory(suffix="regression_catalog_test") as tmp_dir:
+            repo = Path(tmp_dir) / "mozilla-central"
+            make_test_files(repo, ["js/src/jit-test/tests/basic/a.js",
+                                   "js/src/tests/non262/b.js",
+                                   "js/src/tests/test262/c.js",
+                                   "js/src/tests/non262/README.txt",
+                                   "js/src/shell/js.cpp"])
+            catalog_file = Path(tmp_dir) / "mozilla-central.json"
+
+            catalog = regression_catalog.RegressionCatalog(repo, catalog_file)
+            catalog.update(None)
+            first_list_file = catalog.list_file
+            assert catalog.paths() == [str(Path(x)) for x in ["js/src/jit-test/tests/basic/a.js",
+                                                              "js/src/tests/non262/b.js",
+                                                              "js/src/tests/test262/c.js"]]
+            assert catalog.tests["js/src/tests/non262/b.js"] == {"size": 10}
+
+            make_test_files(repo, ["js/src/tests/non262/d.js"])
+            (repo / "js" / "src" / "tests" / "test262" / "c.js").unlink()
+            catalog.apply_changes({"js/src/tests/non262/d.js": True,
+                                   "js/src/tests/test262/c.js": False,
+                                   "js/src/shell/js.cpp": True})
+            catalog.save()
+
+            reloaded = regression_catalog.RegressionCatalog(repo, catalog_file)
+            assert sorted(reloaded.tests) == ["js/src/jit-test/tests/basic/a.js",
+                                              "js/src/tests/non262/b.js",
+                                              "js/src/tests/non262/d.js"]
+            assert reloaded.tests["js/src/tests/non262/b.js"] == {"size": 10}
+            assert catalog.list_file.read_text(encoding="utf-8").splitlines() == reloaded.paths()
+            # Seed records of earlier runs refer to the previous list file, which is left as it was
+            assert catalog.list_file != first_list_file
+            assert len(first_list_file.read_text(encoding="utf-8").splitlines()) == 3
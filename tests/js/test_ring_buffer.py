@@ -0,0 +1,45 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the ring_buffer.py file."""
+
+import logging
+import unittest
+
+from funfuzz.js import ring_buffer
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class RingBufferTests(unittest.TestCase):
+    """"TestCase class for functions in ring_buffer.py"""
+    @staticmethod
+    def test_shell_args():
+        """Test that jsfunfuzz is asked to stop by itself before the timeout."""
+        assert ring_buffer.shell_args(1000, 10) == "ringBufferSize=1000; ringBufferTimeout=8;"
+        assert ring_buffer.shell_args(1000, 1) == "ringBufferSize=1000; ringBufferTimeout=1;"
+
+    @staticmethod
+    def test_parse_marker():
+        """Test that the reason why jsfunfuzz stopped and the number of dropped lines are found."""
+        lines = ["fuzzSeed: 42\n",
+                 "/*RING-timeout-dropped-1234*/\n",
+                 '/*FRC-fuzzSeed-42*/count=1235; tryItOut("x");\n']
+        assert ring_buffer.parse_marker(lines) == ("timeout", 1234)
+        assert ring_buffer.soft_timed_out(lines)
+        assert not ring_buffer.soft_timed_out(["/*RING-exit-dropped-0*/\n", "It's looking good!\n"])
+        assert ring_buffer.parse_marker(["fuzzSeed: 42\n", "It's looking good!\n"]) is None
+
+    @staticmethod
+    def test_replay_cmd():
+        """Test that runs whose lines were lost are replayed from their seed without the ring buffer."""
+        cmd = ["js", "--ion-eager", "-e", f"maxRunTime=5000; {ring_buffer.shell_args(1000, 10)}", "-f", "jsfunfuzz.js"]
+        assert ring_buffer.replay_cmd(cmd, ["fuzzSeed: 42\n"]) == [
+            "js", "--ion-eager", "-e", "maxRunTime=5000; forcedFuzzSeed=42;", "-f", "jsfunfuzz.js"]
+        assert ring_buffer.replay_cmd(cmd, ["fuzzSeed: 42\n", "/*RING-bug-dropped-0*/\n"]) is None
+        assert ring_buffer.replay_cmd(cmd, ["Assertion failure: x\n"]) is None
@@ -0,0 +1,85 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the seed_replay.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.js import link_fuzzer
+from funfuzz.js import seed_replay
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+OUT_LINES = [
+    "fuzzSeed: 1234\n",
+    "/*FCM*/ try { x = 1; } catch(e) { }\n",
+    '/*FRC-fuzzSeed-1234*/count=1; tryItOut("x = 1;");\n',
+    "Compiling threw: SyntaxError\n",
+    '/*FRC-fuzzSeed-1234*/count=2; tryItOut("gc();");\n',
+    "It's looking good!\n",
+]
+
+
+class SeedReplayTests(unittest.TestCase):
+    """"TestCase class for functions in seed_replay.py"""
+    @staticmethod
+    def test_parse_seed():
+        """Test that the seed and the number of iterations of a run are found."""
+        assert seed_replay.parse_seed(OUT_LINES) == (1234, 2)
+        assert seed_replay.parse_seed(OUT_LINES[:1]) == (1234, 0)
+        assert seed_replay.parse_seed(OUT_LINES[1:]) is None
+
+    @staticmethod
+    def test_record_and_replay_cmd():
+        """Test that a record holds what is needed to replay the run."""
+        with tempfile.TemporaryDirectory(suffix="seed_replay_test") as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            js_engine = tmp_dir / "js"
+            js_engine.write_text("not a shell")
+            fuzzjs = link_fuzzer.cached_link_fuzzer(tmp_dir / link_fuzzer.LINKED_FUZZER_DIRNAME)
+
+            record = seed_replay.make_record(js_engine, ["--fuzzing-safe", "--ion-eager"], fuzzjs, OUT_LINES, 4)
+            record_file = tmp_dir / "w1-seed.json"
+            seed_replay.write_record(record_file, record)
+            record = seed_replay.load_record(record_file)
+
+            assert record["fuzzer_hash"] in fuzzjs.name
+            assert seed_replay.replay_cmd(record) == [str(js_engine), "--fuzzing-safe", "--ion-eager",
+                                                      "-e", "forcedFuzzSeed=1234; maxIterations=2;",
+                                                      "-f", str(fuzzjs)]
+            assert seed_replay.make_record(js_engine, [], fuzzjs, OUT_LINES[1:], 4) is None
+            assert seed_replay.make_record(js_engine, [], fuzzjs, OUT_LINES[:1], 4) is None
+
+    @staticmethod
+    def test_bisect_iterations():
+        """Test that the fewest iterations reproducing an issue are found in a logarithmic number of replays."""
+        record = {"seed": 1234, "iterations": 1000, "flags": [], "shell": "js", "fuzzer": "jsfunfuzz.js"}
+
+        def reproduces(cmd):
+            """Reproduce the issue from the 37th iteration on.
+
+            Args:
+                cmd (list): Replay command
+
+            Returns:
+                tuple: Whether the replay reproduces the issue, and the lines it printed
+            """
+            iterations = int(cmd[2].split("maxIterations=")[1].rstrip(";"))
+            return iterations >= 37, [f"replayed {iterations}\n"]
+
+        iterations, out_lines, step_times = seed_replay.bisect_iterations(record, reproduces)
+        assert iterations == 37
+        assert out_lines == ["replayed 37\n"]
+        assert len(step_times) <= 11
+
+        iterations, out_lines, step_times = seed_replay.bisect_iterations(record, lambda cmd: (False, []))
+        assert (iterations, out_lines, len(step_times)) == (1000, None, 1)
+        assert seed_replay.bisect_iterations(dict(record, iterations=1), reproduces) == (1, None, [])
@@ -7,6 +7,8 @@
 """Test the shell_flags.py file."""
 
 import logging
+from pathlib import Path
+import re
 
 from _pytest.monkeypatch import MonkeyPatch
 import pytest
@@ -95,6 +97,14 @@ class ShellFlagsTests(CompileShellTests):
         important_flag_set = ["--fuzzing-safe", "--no-threads", "--ion-eager"]  # Important flag set combination
         assert important_flag_set in js.shell_flags.basic_flag_sets(self.test_shell_compile())
 
+    @staticmethod
+    def test_candidate_flags():
+        """Test that every flag whose support is checked is probed as part of the flag support matrix."""
+        shell_flags_source = Path(js.shell_flags.__file__).read_text(encoding="utf-8")
+        for flag in re.findall(r'shell_supports_flag\(shell_path, "([^"]+)"\)', shell_flags_source):
+            assert flag in js.shell_flags.CANDIDATE_FLAGS
+        assert js.shell_flags.FORCEINLINE_SHELL_CMD in js.shell_flags.CANDIDATE_FLAGS
+
     def test_chance(self):
         """Test that the chance function works as intended."""
         ShellFlagsTests.monkeypatch.setattr(js.shell_flags, "chance", mock_chance)
@@ -129,3 +139,12 @@ class ShellFlagsTests(CompileShellTests):
     def test_shell_supports_flag(self):
         """Test that the shell does support flags as intended."""
         assert js.shell_flags.shell_supports_flag(self.test_shell_compile(), "--fuzzing-safe")
+
+    @pytest.mark.slow
+    def test_flag_support_matrix(self):
+        """Test that the flag support matrix is probed and stored next to the shell."""
+        support_matrix = js.shell_flags.flag_support_matrix(self.test_shell_compile())
+        assert support_matrix["--fuzzing-safe"]
+        assert set(support_matrix) == set(js.shell_flags.CANDIDATE_FLAGS)
+        assert js.shell_flags.shell_metadata.metadata_path(self.test_shell_compile(),
+                                                           js.shell_flags.FLAG_SUPPORT_METADATA).is_file()
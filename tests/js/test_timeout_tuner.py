@@ -0,0 +1,71 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the timeout_tuner.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.js import timeout_tuner
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class TimeoutTunerTests(unittest.TestCase):
+    """"TestCase class for functions in timeout_tuner.py"""
+    @staticmethod
+    def test_tuning():
+        """Test that maxRunTime shrinks with OOMs, keeps its direction while the useful executions per CPU-hour improve,
+        turns around once they drop, and that tuned values are stored."""
+        with tempfile.TemporaryDirectory(suffix="timeout_tuner_test") as tmp_dir:
+            binary = Path(tmp_dir) / "js-dbg-64-linux-1234567890ab"
+            binary.write_bytes(b"not really a js shell")
+
+            tuner = timeout_tuner.TimeoutTuner(binary, 24, 10, 60, window=10)
+            assert tuner.values_for(["--ion-eager"]) == (24, 12000)
+
+            for i in range(10):
+                # Flag sets differing only in flags that do not group runs share their window
+                tuner.record(["--fuzzing-safe", "--ion-eager", f"--ion-gvn={'on' if i % 3 else 'off'}"], 12.5, False,
+                             i % 2 == 0, 100)
+            timeout, max_run_time = tuner.values_for(["--ion-eager"])
+            assert max_run_time == 9600
+            assert 10 <= timeout <= 60
+            assert tuner.values_for(["--ion-eager", "--no-asmjs"]) == (timeout, max_run_time)
+            # Flag groups that have not been tuned on their own use the values of the build
+            assert tuner.values_for(["--no-threads"]) == (timeout, max_run_time)
+            assert set(tuner.runs) == {"--ion-eager", timeout_tuner.ALL_FLAGS}
+
+            # Shorter runs got more done, so maxRunTime keeps shrinking
+            for _ in range(10):
+                tuner.record(["--ion-eager"], 10.1, False, False, 100)
+            assert tuner.values_for(["--ion-eager"])[1] == 8727
+
+            # They got less done than in the previous window, so maxRunTime grows again
+            for _ in range(10):
+                tuner.record(["--ion-eager"], 9.2, False, False, 50)
+            assert tuner.values_for(["--ion-eager"])[1] == 9599
+
+            assert timeout_tuner.TimeoutTuner(binary, 24, 10, 60).values_for(["--ion-eager"])[1] == 9599
+
+    @staticmethod
+    def test_bounds():
+        """Test that the timeout stays within the configured bounds."""
+        with tempfile.TemporaryDirectory(suffix="timeout_tuner_bounds_test") as tmp_dir:
+            binary = Path(tmp_dir) / "js-64-linux-1234567890ab"
+            binary.write_bytes(b"not really a js shell")
+
+            tuner = timeout_tuner.TimeoutTuner(binary, 24, 10, 30, window=5)
+            for _ in range(5):
+                tuner.record([], 100, False, False, 1000)
+            assert tuner.values_for([])[0] == 30
+            for _ in range(20):
+                tuner.record([], 1, False, True, 0)
+            assert tuner.values_for([]) == (10, 8000)
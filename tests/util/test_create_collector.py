@@ -0,0 +1,61 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the create_collector.py file."""
+
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from FTB.ProgramConfiguration import ProgramConfiguration
+from FTB.Signatures.CrashInfo import CrashInfo
+
+from funfuzz.util import create_collector
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+def write_signature(sig_cache_dir, name, symptom):
+    """Write a signature matching an output symptom into a signature cache directory.
+
+    Args:
+        sig_cache_dir (Path): Path to the signature cache directory
+        name (str): Name of the signature file, without extension
+        symptom (str): Regular expression that the crash output should match
+    """
+    with io.open(str(sig_cache_dir / f"{name}.signature"), "w", encoding="utf-8", errors="replace") as f:
+        json.dump({"symptoms": [{"type": "output", "value": f"/{symptom}/"}]}, f)
+    with io.open(str(sig_cache_dir / f"{name}.metadata"), "w", encoding="utf-8", errors="replace") as f:
+        json.dump({"frequent": False, "shortDescription": name}, f)
+
+
+class CreateCollectorTests(unittest.TestCase):
+    """"TestCase class for functions in create_collector.py"""
+    @staticmethod
+    def test_sig_cache_collector_search():
+        """Test that the collector matches cached signatures and picks up new ones."""
+        config = ProgramConfiguration("test", "x86-64", "linux")
+        crash_info = CrashInfo.fromRawCrashData([], ["Assertion failure: bar, at foo.cpp:1"], config)
+
+        with tempfile.TemporaryDirectory(suffix="sig_cache_collector_test") as tmp_dir:
+            sig_cache_dir = Path(tmp_dir)
+            write_signature(sig_cache_dir, "unrelated", "Assertion failure: baz")
+            collector = create_collector.SigCacheCollector(sigCacheDir=str(sig_cache_dir), tool="jsfunfuzz")
+            assert collector.search(crash_info) == (None, None)
+
+            write_signature(sig_cache_dir, "matching", "Assertion failure: bar")
+            # Ensure that the directory appears modified even on filesystems with coarse timestamps
+            sig_cache_mtime = sig_cache_dir.stat().st_mtime_ns + 1000000000
+            os.utime(str(sig_cache_dir), ns=(sig_cache_mtime, sig_cache_mtime))
+            sig_file, metadata = collector.search(crash_info)
+            assert Path(sig_file).name == "matching.signature"
+            assert metadata["shortDescription"] == "matching"
@@ -0,0 +1,50 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the scratch_space.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.util import scratch_space
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class ScratchSpaceTests(unittest.TestCase):
+    """"TestCase class for functions in scratch_space.py"""
+    @staticmethod
+    def test_persist_and_clear():
+        """Test that only persisted iterations leave artifacts behind in the persistent directory."""
+        with tempfile.TemporaryDirectory(suffix="scratch_space_test") as tmp_dir:
+            wtmp_dir = Path(tmp_dir)
+            with scratch_space.ScratchSpace(wtmp_dir) as scratch:
+                boring_dir = scratch.iteration_dir(1)
+                (boring_dir / "w1-out.txt").write_text("boring")
+                scratch.clear(boring_dir)
+                assert not boring_dir.exists()
+
+                interesting_dir = scratch.iteration_dir(2)
+                (interesting_dir / "w2-summary.txt").write_text("interesting")
+                (interesting_dir / "w2-lith-tmp").mkdir()
+                scratch.persist(interesting_dir)
+                scratch.clear(interesting_dir)
+
+            assert sorted(x.name for x in wtmp_dir.iterdir()) == ["w2-lith-tmp", "w2-summary.txt"]
+            assert (wtmp_dir / "w2-summary.txt").read_text() == "interesting"
+
+    @staticmethod
+    def test_disk_fallback():
+        """Test that iterations use the persistent disk if the RAM-backed filesystem does not have enough room."""
+        with tempfile.TemporaryDirectory(suffix="scratch_space_fallback_test") as tmp_dir:
+            with scratch_space.ScratchSpace(Path(tmp_dir), budget=2 ** 62) as scratch:
+                assert scratch.ram_root is None
+                assert scratch.iteration_dir(1).parent == Path(tmp_dir) / "scratch"
+            assert not (Path(tmp_dir) / "scratch").exists()
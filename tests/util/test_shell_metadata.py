@@ -0,0 +1,46 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the shell_metadata.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.util import shell_metadata
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class ShellMetadataTests(unittest.TestCase):
+    """"TestCase class for functions in shell_metadata.py"""
+    @staticmethod
+    def test_save_and_load_metadata():
+        """Test that metadata stored next to a binary can be loaded back."""
+        with tempfile.TemporaryDirectory(suffix="save_and_load_metadata_test") as tmp_dir:
+            binary = Path(tmp_dir) / "js-dbg-64-linux-1234567890ab"
+            binary.write_bytes(b"not really a js shell")
+
+            assert shell_metadata.load_metadata(binary, "build-configuration") is None
+            assert shell_metadata.save_metadata(binary, "build-configuration", {"debug": True, "asan": False})
+            assert shell_metadata.metadata_path(binary, "build-configuration").is_file()
+            assert shell_metadata.load_metadata(binary, "build-configuration") == {"debug": True, "asan": False}
+
+    @staticmethod
+    def test_metadata_of_changed_binary_is_ignored():
+        """Test that metadata is ignored once the binary it describes has been replaced."""
+        with tempfile.TemporaryDirectory(suffix="changed_binary_test") as tmp_dir:
+            binary = Path(tmp_dir) / "js-64-linux-1234567890ab"
+            binary.write_bytes(b"first build")
+            first_hash = shell_metadata.binary_hash(binary)
+            assert shell_metadata.save_metadata(binary, "build-configuration", {"debug": False})
+
+            binary.write_bytes(b"second, different build")
+            assert shell_metadata.binary_hash(binary) != first_hash
+            assert shell_metadata.load_metadata(binary, "build-configuration") is None
@@ -0,0 +1,156 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the shell_runner.py file."""
+
+import io
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import pytest
+
+from funfuzz.util import shell_runner
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class ShellRunnerTests(unittest.TestCase):
+    """"TestCase class for functions in shell_runner.py"""
+    @staticmethod
+    def test_timed_run_in_memory():
+        """Test that output is captured in memory and only written to disk when saved."""
+        runinfo = shell_runner.timed_run(
+            [sys.executable, "-c", "import sys; print('first'); print('second\\r'); sys.stderr.write('err\\n')"], 60)
+        try:
+            assert runinfo.sta == shell_runner.NORMAL
+            assert runinfo.return_code == 0
+            assert runinfo.out.lines() == ["first\n", "second\n"]
+            assert runinfo.err.lines() == ["err\n"]
+
+            with tempfile.TemporaryDirectory(suffix="timed_run_in_memory_test") as tmp_dir:
+                log_prefix = Path(tmp_dir) / "w1"
+                runinfo.save(log_prefix)
+                with io.open(str(Path(tmp_dir) / "w1-err.txt"), "r", encoding="utf-8", errors="replace") as f:
+                    assert f.read() == "err\n"
+                assert (Path(tmp_dir) / "w1-out.txt").is_file()
+        finally:
+            runinfo.close()
+
+    @staticmethod
+    def test_timed_run_spills_large_output():
+        """Test that output larger than the in-memory limit is still captured in full."""
+        runinfo = shell_runner.timed_run(
+            [sys.executable, "-c", "print('x' * 99); print('y' * 99)"], 60, max_in_memory_size=50)
+        try:
+            assert runinfo.out.size == 200
+            assert runinfo.out.lines() == ["x" * 99 + "\n", "y" * 99 + "\n"]
+        finally:
+            runinfo.close()
+
+    @staticmethod
+    def test_timed_run_statuses():
+        """Test that abnormal exits and timeouts are recognized."""
+        runinfo = shell_runner.timed_run([sys.executable, "-c", "import sys; sys.exit(3)"], 60)
+        runinfo.close()
+        assert runinfo.sta == shell_runner.ABNORMAL
+        assert runinfo.return_code == 3
+
+        runinfo = shell_runner.timed_run([sys.executable, "-c", "import time; time.sleep(60)"], 1)
+        runinfo.close()
+        assert runinfo.sta == shell_runner.TIMED_OUT
+        assert runinfo.return_code is None
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() == "Windows", reason="Signals are POSIX-only")
+    def test_timed_run_crash():
+        """Test that a process killed by a signal is recognized as a crash."""
+        runinfo = shell_runner.timed_run(
+            [sys.executable, "-c", "import os, signal; os.kill(os.getpid(), signal.SIGSEGV)"], 60)
+        runinfo.close()
+        assert runinfo.sta == shell_runner.CRASHED
+        assert "SIGSEGV" in runinfo.msg
+
+    @staticmethod
+    def test_timed_run_cancel():
+        """Test that a run is killed once it is cancelled."""
+        cancel_event = threading.Event()
+        threading.Timer(0.5, cancel_event.set).start()
+        runinfo = shell_runner.timed_run([sys.executable, "-c", "import time; time.sleep(60)"], 60,
+                                         cancel_event=cancel_event)
+        runinfo.close()
+        assert runinfo.sta == shell_runner.TIMED_OUT
+        assert runinfo.msg == "CANCELLED"
+        assert runinfo.elapsedtime < 30
+
+    @staticmethod
+    def test_timed_run_stdout_line_callback():
+        """Test that each line of stdout is passed to the callback, including a last line without a line ending."""
+        lines = []
+        runinfo = shell_runner.timed_run(
+            [sys.executable, "-c", "import sys; sys.stdout.write('first\\nsecond\\nthird')"], 60,
+            stdout_line_callback=lines.append)
+        runinfo.close()
+        assert lines == [b"first", b"second", b"third"]
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() == "Windows", reason="Resource limits are POSIX-only")
+    def test_spawn_with_rlimits():
+        """Test that resource limits are in place before the command runs, without a preexec_fn where possible."""
+        import resource  # module only available on POSIX  pylint: disable=import-error
+        rlimits = {resource.RLIMIT_CORE: (0, 0)}  # pylint: disable=no-member
+        cmd, preexec_fn = shell_runner.limit_command(["js"], rlimits)
+        if shell_runner.prlimit_path():
+            assert cmd == [shell_runner.prlimit_path(), "--core=0:0", "--", "js"]
+            assert preexec_fn is None
+        else:
+            assert cmd == ["js"]
+            assert preexec_fn is not None
+
+        child = shell_runner.spawn(
+            [sys.executable, "-c", "import os, resource; print(os.getpid(), resource.getrlimit(resource.RLIMIT_CORE))"],
+            rlimits=rlimits, stdout=subprocess.PIPE)
+        out, _ = child.communicate()
+        assert out.decode("utf-8").split(None, 1) == [str(child.pid), "(0, 0)\n"]
+
+        latency = shell_runner.measure_spawn_latency(["true"], rlimits, runs=3)
+        assert set(latency) == {"prlimit", "preexec_fn"}
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() == "Windows", reason="Resource usage and limits are POSIX-only")
+    def test_timed_run_rusage_and_cpu_timeout():
+        """Test that resource usage is collected, and that a run exceeding its CPU time limit is a timeout."""
+        import resource  # module only available on POSIX  pylint: disable=import-error
+        runinfo = shell_runner.timed_run([sys.executable, "-c", "x = bytearray(64 * 2 ** 20)"], 60)
+        runinfo.close()
+        assert runinfo.sta == shell_runner.NORMAL
+        if runinfo.rusage:  # Not collected if the process could not be waited for on a pidfd
+            assert runinfo.rusage["max_rss"] >= 64 * 2 ** 20
+            assert runinfo.rusage["user_time"] + runinfo.rusage["sys_time"] > 0
+
+        runinfo = shell_runner.timed_run([sys.executable, "-c", "while True: pass"], 60, cpu_timeout=1,
+                                         rlimits={resource.RLIMIT_CORE: (0, 0)})  # pylint: disable=no-member
+        runinfo.close()
+        assert runinfo.sta == shell_runner.TIMED_OUT
+        assert runinfo.msg == "CPU TIMED OUT"
+        assert runinfo.elapsedtime < 30
+
+    @staticmethod
+    def test_run_status():
+        """Test that the status of a finished run is determined from its return code, timeout and CPU time."""
+        assert shell_runner.run_status(0, False) == (shell_runner.NORMAL, "NORMAL")
+        assert shell_runner.run_status(3, False) == (shell_runner.ABNORMAL, "ABNORMAL exit code 3")
+        assert shell_runner.run_status(-9, True) == (shell_runner.TIMED_OUT, "TIMED OUT")
+        assert shell_runner.run_status(-9, True, cancelled=True) == (shell_runner.TIMED_OUT, "CANCELLED")
+        assert shell_runner.run_status(-11, False)[0] == shell_runner.CRASHED
+        assert shell_runner.cpu_time_rlimits(None, None) is None
@@ -0,0 +1,111 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the stats_aggregator.py file."""
+
+import io
+import json
+import logging
+from pathlib import Path
+import tempfile
+import time
+import unittest
+import urllib.request
+
+from funfuzz.util import stats_aggregator
+from funfuzz.util import worker_stats
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class StatsAggregatorTests(unittest.TestCase):
+    """"TestCase class for functions in stats_aggregator.py"""
+    @staticmethod
+    def test_worker_snapshots_are_served():
+        """Test that snapshots sent by workers are served in Prometheus text format and rolled up per build."""
+        with tempfile.TemporaryDirectory(suffix="stats_aggregator_test") as tmp_dir:
+            snapshot_file = Path(tmp_dir) / "fuzz-stats.json"
+            with stats_aggregator.StatsAggregator(0, snapshot_file) as aggregator:
+                aggregator.record_build(60, False)
+                aggregator.record_build(1, True)
+
+                stats = worker_stats.WorkerStats(Path(tmp_dir) / worker_stats.STATS_FILENAME,
+                                                 level_names=["fine", "new assert or crash"],
+                                                 report_address=aggregator.address, build="js-dbg")
+                stats.record_run(1, False, False, True)
+                stats.write()
+                for _ in range(100):
+                    if aggregator.workers:
+                        break
+                    time.sleep(0.05)
+
+                with urllib.request.urlopen(f"http://{stats_aggregator.STATS_HOST}:{aggregator.port}/metrics") as r:
+                    metrics = r.read().decode("utf-8").splitlines()
+
+            labels = f'{{build="js-dbg",worker="{stats.snapshot()["fuzzer_pid"]}"}}'
+            assert f"funfuzz_execs_total{labels} 1" in metrics
+            assert "# TYPE funfuzz_execs_total counter" in metrics
+            assert any(x.startswith('funfuzz_found_total{build="js-dbg",level="new_assert_or_crash"') for x in metrics)
+            assert "funfuzz_compile_seconds_total 60.0" in metrics
+            assert "funfuzz_shell_cache_hits_total 1" in metrics
+
+            with io.open(str(snapshot_file), "r", encoding="utf-8", errors="replace") as f:
+                rollup = json.load(f)
+            assert rollup["total"]["execs_done"] == 1
+            assert rollup["builds"]["js-dbg"]["found_new_assert_or_crash"] == 1
+
+    @staticmethod
+    def test_workers_expire():
+        """Test that workers that stopped sending snapshots only count in the counters of the retired workers."""
+        aggregator = stats_aggregator.StatsAggregator(0, expiry=180)
+        try:
+            now = time.time()
+            aggregator.update_worker({"fuzzer_pid": 1, "build": "js-dbg", "last_update": now - 600, "execs_done": 10,
+                                      "execs_per_sec": 2.0, "stage_lithium_in_flight": 1, "found_crash": 1})
+            aggregator.update_worker({"fuzzer_pid": 2, "build": "js-dbg", "last_update": now, "execs_done": 5,
+                                      "execs_per_sec": 1.0, "stage_lithium_in_flight": 0})
+
+            rollup = aggregator.rollup()
+            assert rollup["total"]["workers"] == 1
+            assert rollup["total"]["execs_per_sec"] == 1.0
+            assert rollup["total"]["stage_lithium_in_flight"] == 0
+            assert rollup["retired"]["js-dbg"] == {"workers": 1, "execs_done": 10, "found_crash": 1}
+
+            metrics = aggregator.prometheus_text().splitlines()
+            assert 'funfuzz_execs_total{build="js-dbg",worker="retired"} 10' in metrics
+            assert 'funfuzz_execs_total{build="js-dbg",worker="2"} 5' in metrics
+            assert not any(x.startswith("funfuzz_reductions_in_flight") and "retired" in x for x in metrics)
+            assert not any('worker="1"' in x for x in metrics)
+        finally:
+            aggregator.http_server.server_close()
+            aggregator.udp_socket.close()
+
+    @staticmethod
+    def test_aggregator_process():
+        """Test that an aggregator running in a process of its own receives snapshots and build records."""
+        with tempfile.TemporaryDirectory(suffix="stats_aggregator_process_test") as tmp_dir:
+            snapshot_file = Path(tmp_dir) / "fuzz-stats.json"
+            with stats_aggregator.AggregatorProcess(0) as aggregator:
+                aggregator.set_snapshot_file(snapshot_file)
+                aggregator.record_build(60, False)
+                stats = worker_stats.WorkerStats(Path(tmp_dir) / worker_stats.STATS_FILENAME,
+                                                 report_address=(stats_aggregator.STATS_HOST, aggregator.port),
+                                                 build="js-dbg")
+                stats.record_run(0, False, False, False)
+                stats.write()
+                for _ in range(100):
+                    with urllib.request.urlopen(f"http://{stats_aggregator.STATS_HOST}:{aggregator.port}/metrics") as r:
+                        if "funfuzz_execs_total{" in r.read().decode("utf-8"):
+                            break
+                    time.sleep(0.05)
+            assert not aggregator.process.is_alive()
+
+            with io.open(str(snapshot_file), "r", encoding="utf-8", errors="replace") as f:
+                rollup = json.load(f)
+            assert rollup["total"]["execs_done"] == 1
+            assert rollup["compilation"]["compile_seconds"] == 60
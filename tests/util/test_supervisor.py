@@ -0,0 +1,175 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the supervisor.py file."""
+
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+import unittest
+
+import pytest
+
+from funfuzz.util import supervisor
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+def wait_for_drain(log_dir, worker_id):
+    """Stand-in for a fuzzing worker: the first one finishes on its own once the others are drained.
+
+    Args:
+        log_dir (str): Directory of the log and drain files
+        worker_id (int): Numeric ID of the worker
+    """
+    drain_file = Path(supervisor.drain_name(log_dir, worker_id))
+    other_log = Path(supervisor.log_name(log_dir, 1, "out"))
+    for _ in range(200):
+        if worker_id == 0 and other_log.is_file() and other_log.read_text(encoding="utf-8"):
+            break
+        if drain_file.exists():
+            print("drained")
+            break
+        time.sleep(0.05)
+
+
+def hang_then_crash_then_finish(log_dir, worker_id):
+    """Stand-in for a fuzzing worker that hangs with a js shell running, then crashes, then finishes on its own.
+
+    Args:
+        log_dir (str): Directory of the log files
+        worker_id (int): Numeric ID of the worker
+
+    Raises:
+        RuntimeError: On the second run, to simulate a crash
+    """
+    runs_file = Path(log_dir) / f"runs-{worker_id}"
+    runs = len(runs_file.read_text(encoding="utf-8")) if runs_file.is_file() else 0
+    runs_file.write_text("x" * (runs + 1), encoding="utf-8")
+    print(f"run {runs}")
+    if runs == 0:
+        shell = subprocess.Popen(["sleep", "60"])  # pylint: disable=consider-using-with
+        (Path(log_dir) / "shell-pid").write_text(str(shell.pid), encoding="utf-8")
+        time.sleep(60)
+    elif runs == 1:
+        raise RuntimeError("crashed")
+
+
+def crash_late(log_dir, worker_id):
+    """Stand-in for a fuzzing worker that crashes after the deadline of the round.
+
+    Args:
+        log_dir (str): Directory of the log files
+        worker_id (int): Numeric ID of the worker
+
+    Raises:
+        RuntimeError: To simulate a crash
+    """
+    print(f"worker {worker_id} of {log_dir}")
+    time.sleep(1)
+    raise RuntimeError("crashed")
+
+
+class SupervisorTests(unittest.TestCase):
+    """"TestCase class for functions in supervisor.py"""
+    @staticmethod
+    def test_rotate_log():
+        """Test that log files are copied to numbered backups then truncated."""
+        with tempfile.TemporaryDirectory(suffix="supervisor_test") as tmp_dir:
+            log_path = str(Path(tmp_dir) / "forkjoin-0-out.txt")
+            for contents in ("first\n", "second\n", "third\n"):
+                Path(log_path).write_text(contents, encoding="utf-8")
+                supervisor.rotate_log(log_path, backups=2)
+            assert Path(log_path).read_text(encoding="utf-8") == ""
+            assert Path(f"{log_path}.1").read_text(encoding="utf-8") == "third\n"
+            assert Path(f"{log_path}.2").read_text(encoding="utf-8") == "second\n"
+            assert not Path(f"{log_path}.3").exists()
+
+    @staticmethod
+    def test_keep_beating():
+        """Test that the heartbeat file is touched while a long stage runs, and no longer afterwards."""
+        with tempfile.TemporaryDirectory(suffix="supervisor_test") as tmp_dir:
+            heartbeat_file = Path(tmp_dir) / "forkjoin-0-heartbeat"
+            with supervisor.keep_beating(heartbeat_file, interval=0.05):
+                first_beat = heartbeat_file.stat().st_mtime_ns
+                time.sleep(0.3)
+                assert heartbeat_file.stat().st_mtime_ns > first_beat
+            last_beat = heartbeat_file.stat().st_mtime_ns
+            time.sleep(0.2)
+            assert heartbeat_file.stat().st_mtime_ns == last_beat
+            with supervisor.keep_beating(None):
+                pass
+
+    @staticmethod
+    def test_deadline():
+        """Test that workers which crash after the deadline of the round are not restarted."""
+        with tempfile.TemporaryDirectory(suffix="supervisor_test") as tmp_dir:
+            pool = supervisor.Supervisor(tmp_dir, crash_late, (tmp_dir,), deadline=time.time() + 0.5)
+            pool.run(lambda active: 2, check_interval=0.2)
+
+            outputs = [Path(supervisor.log_name(tmp_dir, i, "out")).read_text(encoding="utf-8") for i in range(2)]
+            assert outputs == [f"worker {i} of {tmp_dir}\n" for i in range(2)]
+            assert not Path(supervisor.log_name(tmp_dir, 2, "out")).exists()
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() != "Linux", reason="Unique memory is read from procfs")
+    def test_sample_memory():
+        """Test that the unique memory of each worker is sampled once at each point of its life."""
+        with tempfile.TemporaryDirectory(suffix="supervisor_test") as tmp_dir:
+            with supervisor.Supervisor(tmp_dir, crash_late, (tmp_dir,)) as pool:
+                worker = pool.workers[pool.add_worker()]
+                pool.sample_memory(worker.started_at)
+                assert [len(x) for x in pool.memory_samples.values()] == [0, 0]
+                for _ in range(2):
+                    pool.sample_memory(worker.started_at + supervisor.MEMORY_SAMPLES[0][1])
+                assert [len(x) for x in pool.memory_samples.values()] == [1, 0]
+                assert pool.memory_samples[supervisor.MEMORY_SAMPLES[0][0]][0] > 0
+
+    @staticmethod
+    def test_resize_and_drain():
+        """Test that workers are added and drained as the target count changes, until one finishes on its own."""
+        with tempfile.TemporaryDirectory(suffix="supervisor_test") as tmp_dir:
+            targets = iter([3, 1])
+            active_counts = []
+
+            def target_count(active):
+                """Record how many workers are active, and ask for 3 of them then for 1.
+
+                Args:
+                    active (int): Number of workers running and not draining
+
+                Returns:
+                    int: Number of workers that should be active
+                """
+                active_counts.append(active)
+                return next(targets, 1)
+
+            with supervisor.Supervisor(tmp_dir, wait_for_drain, (tmp_dir,)) as pool:
+                pool.run(target_count, check_interval=0.2)
+
+            assert active_counts[:2] == [0, 3]
+            outputs = [Path(supervisor.log_name(tmp_dir, i, "out")).read_text(encoding="utf-8") for i in range(3)]
+            assert outputs == ["", "drained\n", "drained\n"]
+            assert not list(Path(tmp_dir).glob("*-drain"))
+
+    @staticmethod
+    @pytest.mark.skipif(platform.system() != "Linux", reason="Checks the state of the js shell in /proc")
+    def test_restarts():
+        """Test that hung and crashed workers are restarted, and that the js shells of hung workers are killed."""
+        with tempfile.TemporaryDirectory(suffix="supervisor_test") as tmp_dir:
+            pool = supervisor.Supervisor(tmp_dir, hang_then_crash_then_finish, (tmp_dir,), heartbeat_timeout=1)
+            pool.run(lambda active: 1, check_interval=0.2)
+
+            assert Path(supervisor.log_name(tmp_dir, 0, "out")).read_text(encoding="utf-8") == "run 0\nrun 1\nrun 2\n"
+            assert "RuntimeError: crashed" in Path(supervisor.log_name(tmp_dir, 0, "err")).read_text(encoding="utf-8")
+            shell_stat = Path("/proc") / (Path(tmp_dir) / "shell-pid").read_text(encoding="utf-8") / "stat"
+            if shell_stat.is_file():  # The killed js shell may linger as a zombie until its new parent reaps it
+                assert shell_stat.read_text(encoding="utf-8").rsplit(")", 1)[1].split()[0] == "Z"
@@ -0,0 +1,93 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the worker_sizing.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.util import worker_sizing
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class WorkerSizingTests(unittest.TestCase):
+    """"TestCase class for functions in worker_sizing.py"""
+    @staticmethod
+    def test_memory_sources():
+        """Test that MemAvailable and the room left under the cgroup v2 memory limit are read."""
+        with tempfile.TemporaryDirectory(suffix="worker_sizing_test") as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            meminfo = tmp_dir / "meminfo"
+            meminfo.write_text("MemTotal:       16000000 kB\nMemAvailable:    8000000 kB\n")
+            assert worker_sizing.meminfo_available(meminfo) == 8000000 * 1024
+            assert worker_sizing.meminfo_available(tmp_dir / "absent") is None
+
+            cgroup = tmp_dir / "cgroup"
+            cgroup.write_text("4:memory:/v1\n0::/bot.service\n")
+            root = tmp_dir / "root"
+            (root / "bot.service").mkdir(parents=True)
+            (root / "bot.service" / "memory.max").write_text("4000\n")
+            (root / "bot.service" / "memory.current").write_text("1000\n")
+            assert worker_sizing.cgroup_headroom(cgroup, (tmp_dir / "unmounted", root)) == 3000
+            (root / "bot.service" / "memory.max").write_text("max\n")
+            assert worker_sizing.cgroup_headroom(cgroup, (root,)) is None
+
+    @staticmethod
+    def test_unique_memory():
+        """Test that the unique set size is read from smaps_rollup, else summed up from smaps."""
+        with tempfile.TemporaryDirectory(suffix="worker_sizing_test") as tmp_dir:
+            proc = Path(tmp_dir)
+            (proc / "42").mkdir()
+            (proc / "42" / "smaps").write_text("Rss:  100 kB\nPrivate_Clean:  8 kB\nPrivate_Dirty:  4 kB\n"
+                                               "Rss:  50 kB\nPrivate_Dirty:  2 kB\n")
+            assert worker_sizing.unique_memory(42, proc) == 14 * 1024
+            (proc / "42" / "smaps_rollup").write_text("Shared_Clean:  900 kB\nPrivate_Clean:  16 kB\n"
+                                                      "Private_Dirty:  32 kB\n")
+            assert worker_sizing.unique_memory(42, proc) == 48 * 1024
+            assert worker_sizing.unique_memory(43, proc) is None
+
+            # The js shell run by worker 42 is counted with it
+            (proc / "42" / "task" / "42").mkdir(parents=True)
+            (proc / "42" / "task" / "42" / "children").write_text("44 45 \n")
+            (proc / "44").mkdir()
+            (proc / "44" / "smaps_rollup").write_text("Private_Dirty:  100 kB\n")
+            assert worker_sizing.child_pids(42, proc) == [44, 45]
+            assert worker_sizing.tree_unique_memory(42, proc) == 148 * 1024
+            assert worker_sizing.tree_unique_memory(43, proc) is None
+
+            stats_files = [proc / "a", proc / "b", proc / "c"]
+            stats_files[0].write_text("fuzzer_pid              : 42\nbuild                   : js-dbg\n")
+            stats_files[1].write_text("fuzzer_pid              : 43\nbuild                   : js-dbg\n")
+            stats_files[2].write_text("fuzzer_pid              : 44\nbuild                   : js-opt\n")
+            assert worker_sizing.read_worker_memory(stats_files, "js-dbg", proc) == [148 * 1024]
+
+    @staticmethod
+    def test_worker_count():
+        """Test that the peak RSS of a build is read from stats files, and that workers are sized by memory."""
+        with tempfile.TemporaryDirectory(suffix="worker_sizing_test") as tmp_dir:
+            stats_files = [Path(tmp_dir) / "a", Path(tmp_dir) / "b", Path(tmp_dir) / "absent"]
+            stats_files[0].write_text("build                   : js-asan\npeak_rss_mb             : 4000.0\n"
+                                      "recent_peak_rss_mb      : 1500.5\n")
+            stats_files[1].write_text("build                   : js-dbg\nrecent_peak_rss_mb      : 3000.0\n")
+            assert worker_sizing.read_peak_rss(stats_files, "js-asan") == int(1500.5 * 2 ** 20)
+            assert worker_sizing.read_peak_rss(stats_files, "js-opt") == 0
+
+        gib = 2 ** 30
+        assert worker_sizing.worker_count(0, 16, 10 * gib, 2 * gib, reserve=0) == 5
+        assert worker_sizing.worker_count(0, 4, 10 * gib, 2 * gib, reserve=0) == 4
+        # Running workers may still grow up to the memory they need, which is not available to new workers
+        assert worker_sizing.worker_count(2, 16, 7 * gib, 2 * gib, [gib, 2 * gib], reserve=0) == 5
+        assert worker_sizing.worker_count(2, 16, 7 * gib, 2 * gib, [gib], reserve=0) == 4
+        # Workers are only retired once memory is short by more than the margin
+        assert worker_sizing.worker_count(5, 16, 5 * gib, 2 * gib, [gib] * 5, reserve=0) == 5
+        assert worker_sizing.worker_count(5, 16, 4 * gib, 2 * gib, [gib] * 5, reserve=0) == 5
+        assert worker_sizing.worker_count(5, 16, 3 * gib, 2 * gib, [gib] * 5, reserve=0) == 4
+        assert worker_sizing.worker_count(1, 16, 0, 2 * gib, reserve=gib) == 1
@@ -0,0 +1,67 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the worker_stats.py file."""
+
+import io
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.util import worker_stats
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class WorkerStatsTests(unittest.TestCase):
+    """"TestCase class for functions in worker_stats.py"""
+    @staticmethod
+    def test_stage_latency():
+        """Test that durations are counted in the right histogram buckets."""
+        latency = worker_stats.StageLatency(buckets=(0.1, 1))
+        for seconds in (0.05, 0.5, 0.7, 5):
+            latency.add(seconds)
+        assert latency.count == 4
+        assert latency.histogram() == "<=0.1s:1 <=1s:2 >1s:1"
+
+    @staticmethod
+    def test_stats_file():
+        """Test that the stats file holds the statistics recorded so far."""
+        with tempfile.TemporaryDirectory(suffix="worker_stats_test") as tmp_dir:
+            stats_file = Path(tmp_dir) / worker_stats.STATS_FILENAME
+            with worker_stats.WorkerStats(stats_file, level_names=["fine", "new assert or crash"]) as stats:
+                stats.record_run(0, False, False, False)
+                stats.record_run(0, True, False, False)
+                stats.record_run(1, False, True, True)
+                stats.add_time("wait", 2)
+                with stats.stage("cleanup"):
+                    pass
+
+            with io.open(str(stats_file), "r", encoding="utf-8", errors="replace") as f:
+                contents = dict(line.split(":", 1) for line in f)
+            contents = {key.strip(): value.strip() for key, value in contents.items()}
+            assert contents["execs_done"] == "3"
+            assert contents["timeout_ratio"] == contents["oom_ratio"] == "0.3333"
+            assert contents["interesting"] == "1"
+            assert contents["found_new_assert_or_crash"] == "1"
+            assert contents["stage_wait_count"] == "1"
+            assert contents["stage_cleanup_count"] == "1"
+            assert [x.name for x in Path(tmp_dir).iterdir()] == [worker_stats.STATS_FILENAME]
+
+    @staticmethod
+    def test_recent_peak_rss():
+        """Test that the recent peak RSS only covers the latest runs, and leaves out the highest few of them."""
+        stats = worker_stats.WorkerStats(Path("unused"))
+        assert stats.recent_peak_rss() == 0
+        stats.record_run(0, False, False, False, {"max_rss": 10 * 2 ** 30, "user_time": 0, "sys_time": 0})
+        for i in range(worker_stats.RECENT_RUNS):
+            stats.record_run(0, False, False, False, {"max_rss": (i + 1) * 2 ** 20, "user_time": 0, "sys_time": 0})
+        assert stats.peak_rss == 10 * 2 ** 30
+        assert stats.recent_peak_rss() == 95 * 2 ** 20
+        assert stats.snapshot()["recent_peak_rss_mb"] == 95.0
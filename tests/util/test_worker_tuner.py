@@ -0,0 +1,74 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Test the worker_tuner.py file."""
+
+import logging
+from pathlib import Path
+import tempfile
+import unittest
+
+from funfuzz.util import worker_tuner
+
+FUNFUZZ_TEST_LOG = logging.getLogger("funfuzz_test")
+logging.basicConfig(level=logging.DEBUG)
+logging.getLogger("flake8").setLevel(logging.WARNING)
+
+
+class WorkerTunerTests(unittest.TestCase):
+    """"TestCase class for functions in worker_tuner.py"""
+    @staticmethod
+    def test_read_progress_and_throughput():
+        """Test that progress is read per worker of a build, and that workers started in between count from zero."""
+        with tempfile.TemporaryDirectory(suffix="worker_tuner_test") as tmp_dir:
+            stats_files = [Path(tmp_dir) / "a", Path(tmp_dir) / "b", Path(tmp_dir) / "absent"]
+            stats_files[0].write_text("fuzzer_pid : 10\nbuild : js-dbg\nexecs_done : 100\ninteresting : 1\n"
+                                      "start_time : 900\nlast_update : 1000\n", encoding="utf-8")
+            stats_files[1].write_text("fuzzer_pid : 11\nbuild : js-opt\nexecs_done : 50\ninteresting : 0\n"
+                                      "start_time : 900\nlast_update : 1000\n", encoding="utf-8")
+            assert worker_tuner.read_progress(stats_files, "js-dbg") == {10: (100, 1, 900, 1000)}
+
+        # Rates are computed between the updates of each stats file, however stale they were when read
+        before = {10: (100, 1, 900, 1000), 11: (0, 0, 900, 990)}
+        after = {10: (400, 2, 900, 1100), 11: (300, 2, 900, 1040), 12: (100, 0, 1050, 1100)}
+        execs_per_sec, interesting_per_hour = worker_tuner.throughput(before, after, 100)
+        assert execs_per_sec == 3 + 6 + 2 * 0.5  # Worker 12 only ran for half of the period
+        assert interesting_per_hour == (1 / 100 + 2 / 50) * 3600
+        assert worker_tuner.throughput(before, {10: before[10]}, 100) == (0, 0)
+
+    @staticmethod
+    def test_hill_climbing():
+        """Test that neighbouring numbers of workers are tried until the best one is found, and that it is kept."""
+        with tempfile.TemporaryDirectory(suffix="worker_tuner_test") as tmp_dir:
+            state_file = Path(tmp_dir) / worker_tuner.WORKER_TUNING_FILENAME
+            tuner = worker_tuner.WorkerTuner(state_file, "dbg-64", "js-dbg", lambda running: 8)
+            now = 1e9
+            assert tuner.next_count(8, now) == 8  # Nothing measured yet, so start from as many workers as fit
+
+            tuner.count = 8
+            tuner.scores = {"8": [10.0, 0.0, now]}
+            assert tuner.next_count(8, now) == 7  # 9 workers would not fit
+            tuner.scores["7"] = [12.0, 0.0, now]
+            tuner.count = 7
+            assert tuner.next_count(8, now) == 6
+            tuner.scores["6"] = [12.1, 0.0, now]  # Within noise of 7 workers, so the current number is kept
+            tuner.count = 6
+            assert tuner.next_count(8, now) == 5
+            tuner.scores["5"] = [11.0, 0.0, now]
+            tuner.count = 5
+            assert tuner.next_count(8, now) == 6  # Neither neighbour does better, so settle on 6 workers
+            tuner.count = 6
+            assert tuner.next_count(8, now) == 6
+            assert tuner.best_count(dict(tuner.scores, **{"7": [12.0, 3.0, now]})) == 7  # Ties go to more results
+            assert tuner.next_count(5, now) == 4  # Running short of memory, the best that fits has an untried neighbour
+            # Once measurements go stale, neighbours are tried again
+            tuner.scores["6"][2] = now + worker_tuner.REEVALUATE_INTERVAL
+            assert tuner.next_count(8, now + worker_tuner.REEVALUATE_INTERVAL) == 7
+
+            tuner.save()
+            reloaded = worker_tuner.WorkerTuner(state_file, "dbg-64", "js-dbg", lambda running: 8)
+            assert reloaded.scores == tuner.scores
+            assert not worker_tuner.WorkerTuner(state_file, "opt-64", "js-opt", lambda running: 8).scores